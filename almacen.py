@@ -0,0 +1,799 @@
+import ast
+import json
+from abc import ABC, abstractmethod
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import datos_supabase as db
+from esquema import (LLAVE_COMPACTA, TEMA_ID, Catalogo, codificar, decodificar, decodificar_registro,
+                     columnas_compactas)
+from matriz import MatrizCalificaciones
+from metricas import contar, medir
+from puntajes import LLAVE_CALIFICACION, a_booleano, validar_calificaciones
+from ranking import ranking_desde_totales
+
+# Columnas normalizadas que regresan todos los almacenes
+COLUMNAS = LLAVE_CALIFICACION + ('cumple', 'puntos')
+
+# El nombre del evento termina en nombres de tablas y particiones
+_NOMBRE_EVENTO = re.compile(r'^[A-Za-z0-9_]+$')
+
+
+def validar_evento(evento):
+    if evento is not None and not _NOMBRE_EVENTO.match(str(evento)):
+        raise ValueError(f"Nombre de evento inválido: {evento!r} (solo letras, números y _)")
+    return evento
+
+
+def _resultado():
+    # reintentar: el error fue de red o del backend y el mismo lote puede pasar después;
+    # los errores de validación se quedan en False
+    return {'ok': False, 'guardadas': 0, 'errores': [], 'latencia_ms': 0.0, 'reintentar': False}
+
+
+def _filtrar(df, tema=None, equipo=None, juez=None, columnas=None):
+    # Para los almacenes que no filtran del lado del servidor
+    for campo, valor in (('tema', tema), ('equipo', equipo), ('juez', juez)):
+        if valor is not None and not df.empty:
+            df = df[df[campo] == valor]
+    if columnas:
+        df = df.reindex(columns=list(columnas))
+    return df.reset_index(drop=True)
+
+
+class ScoreStore(ABC):
+    """Interfaz común de almacenamiento de calificaciones.
+
+    Todas las implementaciones regresan DataFrames con las columnas de
+    COLUMNAS en minúsculas, validan con validar_calificaciones antes de
+    escribir y reportan el guardado con el mismo dict de resultado.
+    """
+
+    @abstractmethod
+    def guardar_lote(self, calificaciones):
+        ...
+
+    @abstractmethod
+    def consultar(self, tema=None, equipo=None, juez=None, columnas=None):
+        ...
+
+    # True cuando totales() agrega en la base de datos y solo viaja una fila por (equipo, juez)
+    totales_en_servidor = False
+
+    def totales(self, tema):
+        # Suma de puntos por (equipo, juez) del tema: columnas equipo, juez, puntos
+        df = self.consultar(tema=tema, columnas=('equipo', 'juez', 'puntos'))
+        return df.groupby(['equipo', 'juez'], observed=True)['puntos'].sum().reset_index()
+
+    def ranking(self, tema, equipos=None, jueces=None, k=None, inicio=0, incluir=()):
+        # Con k solo los lugares inicio+1 .. inicio+k y los equipos de incluir (ver ranking.seleccionar_top)
+        return ranking_desde_totales(self.totales(tema), equipos, jueces, k, inicio, incluir)
+
+    def contar_ranking(self, tema):
+        # Filas que regresa ranking(tema); las vistas lo usan para paginar
+        totales = self.totales(tema)
+        return totales['equipo'].nunique() if not totales.empty else 0
+
+    @abstractmethod
+    def version_config(self):
+        ...
+
+    @abstractmethod
+    def cargar_config(self, version=None):
+        ...
+
+    @abstractmethod
+    def guardar_config(self, jueces, equipos_por_tema):
+        ...
+
+    @abstractmethod
+    def borrar_todo(self):
+        ...
+
+    # Evento activo (un challenge); None es el esquema de un solo evento
+    evento = None
+
+    def eventos(self):
+        # [{'evento', 'archivado'}] en orden de creación; los almacenes de un solo evento no tienen
+        return []
+
+    def archivar_evento(self, evento):
+        # Sin eventos no hay nada que archivar
+        pass
+
+    # Tabla que hay que escuchar en Realtime y cómo leer sus registros
+    tabla_cambios = 'calificaciones'
+
+    def registro_de_cambio(self, registro):
+        return registro
+
+
+class SupabaseStore(ScoreStore):
+    """Almacén en Supabase.
+
+    Con compacto=True usa las tablas puntajes y nombres (ids enteros y
+    medios puntos, ver esquema.py) en lugar de la tabla calificaciones.
+    Con totales_en_servidor=True el ranking se lee de las vistas
+    totales_calificaciones / totales_puntajes (ver README), que agregan en
+    Postgres.
+
+    Con evento, cada fila y cada configuración llevan ese evento y todas las
+    lecturas filtran por él; en Postgres las tablas están particionadas por
+    evento, así que solo se lee la partición del evento activo.
+    """
+
+    def __init__(self, client, compacto=False, totales_en_servidor=False, evento=None):
+        self.client = client
+        self.compacto = compacto
+        self.totales_en_servidor = totales_en_servidor
+        self.evento = validar_evento(evento)
+        if compacto:
+            self.tabla_cambios = 'puntajes'
+        self._catalogo = None
+        self._lock_catalogo = threading.Lock()
+
+    def catalogo(self, recargar=False):
+        with self._lock_catalogo:
+            if self._catalogo is None or recargar:
+                self._catalogo = Catalogo(db.cargar_nombres(self.client))
+            return self._catalogo
+
+    def _codificar(self, calificaciones):
+        filas, errores = codificar(calificaciones, self.catalogo())
+        if any(e['error'].endswith('no registrado') for e in errores):
+            # Otra réplica pudo registrar el nombre después de que se cargó el catálogo
+            filas, errores = codificar(calificaciones, self.catalogo(recargar=True))
+        return filas, errores
+
+    def _preparar(self, calificaciones):
+        filas, errores = self._codificar(calificaciones) if self.compacto else validar_calificaciones(calificaciones)
+        if self.evento is not None:
+            filas = [dict(f, evento=self.evento) for f in filas]
+        return filas, errores
+
+    def guardar_lote(self, calificaciones):
+        llave = LLAVE_COMPACTA if self.compacto else LLAVE_CALIFICACION
+        if self.evento is not None:
+            llave = ('evento',) + llave
+        return db.guardar_calificaciones_batch(self.client, calificaciones,
+                                               tabla='puntajes' if self.compacto else 'calificaciones',
+                                               on_conflict=','.join(llave), preparar=self._preparar)
+
+    def consultar(self, tema=None, equipo=None, juez=None, columnas=None):
+        if not self.compacto:
+            datos = db.consultar_calificaciones(self.client, tema=tema, equipo=equipo, juez=juez, columnas=columnas,
+                                                filtros={'evento': self.evento})
+            return pd.DataFrame(datos, columns=list(columnas) if columnas else None)
+
+        catalogo = self.catalogo()
+        # Un nombre desconocido no puede tener filas: id -1
+        filtros = {
+            'evento': self.evento,
+            'tema_id': None if tema is None else TEMA_ID.get(tema, -1),
+            'equipo_id': None if equipo is None else catalogo.id('equipo', equipo) or -1,
+            'juez_id': None if juez is None else catalogo.id('juez', juez) or -1
+        }
+        compactas = columnas_compactas(columnas)
+        df = pd.DataFrame(
+            db.consultar_calificaciones(self.client, columnas=compactas, tabla='puntajes', filtros=filtros),
+            columns=compactas
+        )
+        for tipo in ('equipo', 'juez'):
+            campo = f'{tipo}_id'
+            if campo in df and not set(df[campo]) <= set(catalogo._nombres[tipo]):
+                catalogo = self.catalogo(recargar=True)
+        return decodificar(df, catalogo, columnas)
+
+    def totales(self, tema):
+        if not self.totales_en_servidor:
+            return super().totales(tema)
+        if not self.compacto:
+            datos = db.consultar_calificaciones(self.client, tema=tema, columnas=['equipo', 'juez', 'puntos'],
+                                                tabla=db.VISTA_TOTALES, filtros={'evento': self.evento},
+                                                orden=('equipo', 'juez'))
+            return pd.DataFrame(datos, columns=['equipo', 'juez', 'puntos'])
+        columnas = ['equipo_id', 'juez_id', 'medios']
+        df = pd.DataFrame(
+            db.consultar_calificaciones(self.client, columnas=columnas, tabla=db.VISTA_TOTALES_COMPACTA,
+                                        filtros={'evento': self.evento, 'tema_id': TEMA_ID.get(tema, -1)},
+                                        orden=('equipo_id', 'juez_id')),
+            columns=columnas
+        )
+        catalogo = self.catalogo()
+        if not (set(df['equipo_id']) <= set(catalogo._nombres['equipo'])
+                and set(df['juez_id']) <= set(catalogo._nombres['juez'])):
+            catalogo = self.catalogo(recargar=True)
+        # medios llega como la suma de enteros de la vista
+        return pd.DataFrame({
+            'equipo': [catalogo.nombre('equipo', i) for i in df['equipo_id']],
+            'juez': [catalogo.nombre('juez', i) for i in df['juez_id']],
+            'puntos': df['medios'].astype(float) / 2
+        }, columns=['equipo', 'juez', 'puntos'])
+
+    def registro_de_cambio(self, registro):
+        return decodificar_registro(registro, self.catalogo()) if self.compacto else registro
+
+    def version_config(self):
+        return db.version_config(self.client, self.evento)
+
+    def cargar_config(self, version=None):
+        if version is None:
+            version = self.version_config()
+        return db.cargar_config(self.client, version) if version is not None else None
+
+    def guardar_config(self, jueces, equipos_por_tema):
+        if self.compacto:
+            # Los ids de equipos y jueces nacen con la configuración
+            catalogo = self.catalogo(recargar=True)
+            equipos = [equipo for lista in equipos_por_tema.values() for equipo in lista]
+            db.registrar_nombres(self.client, catalogo.faltantes('juez', jueces) + catalogo.faltantes('equipo', equipos))
+            self.catalogo(recargar=True)
+        if self.evento is not None:
+            # Crea las particiones del evento si aún no existen
+            db.crear_evento(self.client, self.evento)
+        db.guardar_config(self.client, jueces, equipos_por_tema, self.evento)
+
+    def borrar_todo(self):
+        if self.evento is not None:
+            # TRUNCATE de las particiones del evento; los demás eventos no se tocan
+            db.vaciar_evento(self.client, self.evento)
+            return
+        self.client.table('config').delete().neq('id', 0).execute()
+        self.client.table('puntajes' if self.compacto else 'calificaciones').delete().neq('id', 0).execute()
+
+    def eventos(self):
+        return db.cargar_eventos(self.client)
+
+    def archivar_evento(self, evento):
+        if evento == self.evento:
+            raise ValueError("No se puede archivar el evento activo")
+        db.archivar_evento(self.client, validar_evento(evento))
+
+
+class SheetsStore(ScoreStore):
+    # Encabezados de la hoja Calificaciones -> columnas normalizadas
+    COLUMNAS_HOJA = {
+        'Tema': 'tema', 'Equipo': 'equipo', 'Juez': 'juez', 'Categoria': 'categoria',
+        'Criterio': 'criterio', 'Cumple': 'cumple', 'Puntos': 'puntos', 'Timestamp': 'timestamp'
+    }
+
+    def __init__(self, obtener_hojas, resync_cada=120):
+        # obtener_hojas() -> (config_sheet, calif_sheet); así se respeta el cache de la app
+        self.obtener_hojas = obtener_hojas
+        self.resync_cada = resync_cada
+        self._lock = threading.Lock()
+        self._filas = []        # filas crudas ya consumidas, sin el encabezado
+        self._df = None         # las mismas filas ya normalizadas
+        self._vigentes = None   # solo la última fila de cada llave
+        self._ultima_resync = None
+        self._compactador = None
+
+    def guardar_lote(self, calificaciones):
+        resultado = _resultado()
+        filas, resultado['errores'] = validar_calificaciones(calificaciones)
+        if resultado['errores'] or not filas:
+            return resultado
+        _, calif_sheet = self.obtener_hojas()
+        timestamp = str(datetime.now())
+        inicio = time.perf_counter()
+        try:
+            with medir('gspread.append_rows'):
+                calif_sheet.append_rows([
+                    [f['tema'], f['equipo'], f['juez'], f['categoria'], f['criterio'], f['cumple'], f['puntos'], timestamp]
+                    for f in filas
+                ])
+        except Exception as e:
+            resultado['errores'] = [{'fila': i, 'criterio': f['criterio'], 'error': str(e)} for i, f in enumerate(filas)]
+            resultado['reintentar'] = True
+        else:
+            resultado['ok'] = True
+            resultado['guardadas'] = len(filas)
+        resultado['latencia_ms'] = (time.perf_counter() - inicio) * 1000
+        return resultado
+
+    def normalizar(self, df):
+        df = df.rename(columns=self.COLUMNAS_HOJA)
+        if not df.empty:
+            df['cumple'] = df['cumple'].map(a_booleano)
+            df['puntos'] = pd.to_numeric(df['puntos'], errors='coerce').fillna(0.0)
+        return df
+
+    def _leer_desde(self, calif_sheet, fila):
+        # UNFORMATTED_VALUE: Cumple y Puntos llegan como bool y número, no como texto con formato
+        with medir('gspread.get'):
+            valores = calif_sheet.get(f"A{fila}:H", value_render_option='UNFORMATTED_VALUE')
+        if valores == [[]]:
+            return []
+        ancho = len(self.COLUMNAS_HOJA)
+        return [(list(v) + [''] * ancho)[:ancho] for v in valores]
+
+    def _a_dataframe(self, filas):
+        df = pd.DataFrame(filas, columns=list(self.COLUMNAS_HOJA))
+        # Las filas vacías cuentan para la posición en la hoja pero no son calificaciones
+        return self.normalizar(df[df['Tema'] != ''] if not df.empty else df)
+
+    def leer_calificaciones(self):
+        """Regresa la hoja completa como DataFrame leyendo solo las filas nuevas.
+
+        La hoja solo crece con append_rows, así que basta pedir el rango desde
+        la última fila consumida. Esa fila se vuelve a pedir para comprobar que
+        sigue igual; si cambió o la hoja se achicó, se relee completa. Cada
+        resync_cada segundos también se relee completa, para detectar
+        ediciones a mano en medio de la hoja.
+        """
+        _, calif_sheet = self.obtener_hojas()
+        with self._lock:
+            vencida = self._ultima_resync is None or time.monotonic() - self._ultima_resync >= self.resync_cada
+            if not vencida and self._filas:
+                # La fila 1 es el encabezado: la última consumida está en len + 1
+                nuevas = self._leer_desde(calif_sheet, len(self._filas) + 1)
+                if nuevas and nuevas[0] == self._filas[-1]:
+                    if len(nuevas) > 1:
+                        self._filas.extend(nuevas[1:])
+                        self._df = pd.concat([self._df, self._a_dataframe(nuevas[1:])], ignore_index=True)
+                        self._vigentes = None
+                    return self._calificaciones_vigentes()
+                contar('sheets_resync')
+            self._filas = self._leer_desde(calif_sheet, 2)
+            self._df = self._a_dataframe(self._filas)
+            self._vigentes = None
+            self._ultima_resync = time.monotonic()
+            return self._calificaciones_vigentes()
+
+    def _calificaciones_vigentes(self):
+        # Cada guardado agrega filas nuevas; solo cuenta la más reciente de cada criterio
+        if self._vigentes is None:
+            self._vigentes = _ultima_por_llave(self._df).reset_index(drop=True)
+        return self._vigentes
+
+    def compactar(self, min_duplicadas=1):
+        """Reescribe la hoja dejando solo la última fila de cada llave.
+
+        Todo va en un solo batch_update sobre el rango que se leyó: arriba las
+        filas vigentes y abajo celdas vacías. Las filas que otro juez agregue
+        mientras tanto quedan después de ese rango y no se tocan. Regresa el
+        número de filas eliminadas.
+        """
+        _, calif_sheet = self.obtener_hojas()
+        with self._lock:
+            filas = self._leer_desde(calif_sheet, 2)
+            vigentes = _ultima_por_llave(self._a_dataframe(filas))
+            eliminadas = len(filas) - len(vigentes)
+            if eliminadas >= min_duplicadas and eliminadas > 0:
+                compactas = [filas[i] for i in vigentes.index]
+                vacias = [[''] * len(self.COLUMNAS_HOJA)] * eliminadas
+                with medir('gspread.batch_update'):
+                    calif_sheet.batch_update([{'range': f"A2:H{len(filas) + 1}", 'values': compactas + vacias}])
+                contar('sheets_filas_compactadas', eliminadas)
+                filas = compactas
+            self._filas = filas
+            self._df = self._a_dataframe(filas)
+            self._vigentes = None
+            self._ultima_resync = time.monotonic()
+        return max(eliminadas, 0)
+
+    def iniciar_compactacion(self, cada=300, min_duplicadas=50):
+        # Hilo daemon que compacta la hoja cada cierto tiempo mientras viva el proceso
+        if self._compactador is not None:
+            return
+
+        def ciclo():
+            while True:
+                time.sleep(cada)
+                try:
+                    self.compactar(min_duplicadas)
+                except Exception:
+                    # Cuota de la API o error de red: se intenta en el siguiente ciclo
+                    contar('sheets_compactacion_fallida')
+
+        self._compactador = threading.Thread(target=ciclo, daemon=True)
+        self._compactador.start()
+
+    def consultar(self, tema=None, equipo=None, juez=None, columnas=None):
+        return _filtrar(self.leer_calificaciones(), tema, equipo, juez, columnas)
+
+    def version_config(self):
+        # Número de filas y timestamp de la última; solo baja la columna A
+        config_sheet, _ = self.obtener_hojas()
+        with medir('gspread.col_values'):
+            timestamps = config_sheet.col_values(1)
+        if len(timestamps) <= 1:
+            return None
+        return len(timestamps), timestamps[-1]
+
+    def cargar_config(self, version=None):
+        if version is None:
+            version = self.version_config()
+            if version is None:
+                return None
+        config_sheet, _ = self.obtener_hojas()
+        with medir('gspread.row_values'):
+            fila = config_sheet.row_values(version[0])
+        return {
+            'jueces': _leer_valor_config(fila[1]),
+            'equipos_por_tema': _leer_valor_config(fila[2])
+        }
+
+    def guardar_config(self, jueces, equipos_por_tema):
+        config_sheet, _ = self.obtener_hojas()
+        with medir('gspread.append_row'):
+            config_sheet.append_row([str(datetime.now()), json.dumps(jueces), json.dumps(equipos_por_tema)])
+
+    def borrar_todo(self):
+        config_sheet, calif_sheet = self.obtener_hojas()
+        with medir('gspread.batch_clear'):
+            config_sheet.batch_clear(['A2:C'])
+            calif_sheet.batch_clear(['A2:H'])
+        with self._lock:
+            self._ultima_resync = None
+
+
+def _ultima_por_llave(df):
+    # Last-write-wins: por Timestamp y, en empate, la que está más abajo en la hoja.
+    # Conserva el índice (posición en la hoja) para poder reescribir las filas crudas.
+    if df.empty:
+        return df
+    orden = pd.to_datetime(df['timestamp'], errors='coerce', format='mixed')
+    df = df.assign(_orden=orden).sort_values('_orden', kind='stable', na_position='first')
+    return df.drop_duplicates(list(LLAVE_CALIFICACION), keep='last').drop(columns='_orden').sort_index()
+
+
+def _leer_valor_config(texto):
+    # Las versiones nuevas se guardan como JSON; las viejas con str() de Python
+    try:
+        return json.loads(texto)
+    except ValueError:
+        return ast.literal_eval(texto)
+
+
+class SessionStateStore(ScoreStore):
+    """Adaptador para app.py, que guarda todo en st.session_state.
+
+    estado debe tener 'jueces', 'equipos_por_tema' y 'matriz', una
+    MatrizCalificaciones con los puntajes como arreglos [tema, equipo, juez, criterio].
+    """
+
+    def __init__(self, estado):
+        self.estado = estado
+
+    @property
+    def matriz(self):
+        return self.estado['matriz']
+
+    def guardar_lote(self, calificaciones):
+        resultado = _resultado()
+        filas, resultado['errores'] = validar_calificaciones(calificaciones)
+        if resultado['errores'] or not filas:
+            return resultado
+        fuera = self.matriz.asignar(filas)
+        if fuera:
+            # La matriz solo tiene lugar para los equipos y jueces configurados
+            resultado['errores'] = [
+                {'fila': i, 'criterio': filas[i]['criterio'], 'error': "Equipo o juez fuera de la configuración"}
+                for i in fuera
+            ]
+            return resultado
+        resultado['ok'] = True
+        resultado['guardadas'] = len(filas)
+        return resultado
+
+    def consultar(self, tema=None, equipo=None, juez=None, columnas=None):
+        return _filtrar(self.matriz.filas(), tema=tema, equipo=equipo, juez=juez, columnas=columnas)
+
+    def ranking(self, tema, equipos=None, jueces=None, k=None, inicio=0, incluir=()):
+        # Directo de la matriz, que ya incluye a todos los equipos y jueces configurados
+        if equipos is None and jueces is None:
+            return self.matriz.ranking(tema, k=k, inicio=inicio, incluir=incluir)
+        return super().ranking(tema, equipos, jueces, k, inicio, incluir)
+
+    def contar_ranking(self, tema):
+        # La matriz incluye a todos los equipos configurados del tema
+        return len(self.matriz.equipos_por_tema.get(tema, []))
+
+    def rankings(self):
+        return self.matriz.rankings()
+
+    def version_config(self):
+        return 1 if self.estado.get('config_done') else None
+
+    def cargar_config(self, version=None):
+        if not self.estado.get('config_done'):
+            return None
+        return {'jueces': self.estado['jueces'], 'equipos_por_tema': self.estado['equipos_por_tema']}
+
+    def guardar_config(self, jueces, equipos_por_tema):
+        self.estado['jueces'] = jueces
+        self.estado['equipos_por_tema'] = equipos_por_tema
+        matriz = MatrizCalificaciones(jueces, equipos_por_tema)
+        if self.estado.get('matriz') is not None:
+            # Cambiar la configuración no borra lo ya calificado de los equipos y jueces que siguen
+            matriz.copiar_de(self.estado['matriz'])
+        self.estado['matriz'] = matriz
+        self.estado['config_done'] = True
+
+    def borrar_todo(self):
+        self.matriz.limpiar()
+
+
+class SQLiteStore(ScoreStore):
+    """Motor local en SQLite (modo WAL) para sedes sin buena conexión y para benchmarks.
+
+    Usa el esquema compacto de esquema.py: la llave primaria
+    (tema_id, equipo_id, juez_id, criterio_id) sirve también de índice para
+    los filtros por tema / tema+equipo / tema+equipo+juez, y el ranking se
+    agrega con GROUP BY sobre enteros dentro de SQLite (vista totales_puntajes).
+
+    Con evento, los puntajes van en su propia tabla puntajes_<evento> (con
+    su llave, índice y vista de totales), que hace de partición: las
+    consultas del evento activo nunca recorren las filas de otros eventos,
+    borrar es un DELETE sin WHERE (SQLite lo trunca) y archivar solo
+    renombra la tabla.
+    """
+
+    ESQUEMA_PUNTAJES = """
+        CREATE TABLE IF NOT EXISTS {tabla} (
+            tema_id INTEGER NOT NULL,
+            equipo_id INTEGER NOT NULL,
+            juez_id INTEGER NOT NULL,
+            criterio_id INTEGER NOT NULL,
+            cumple INTEGER NOT NULL DEFAULT 0,
+            medios INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tema_id, equipo_id, juez_id, criterio_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_{tabla}_juez ON {tabla} (juez_id);
+        -- Misma vista que en Postgres; el filtro por tema_id entra al GROUP BY y usa la llave primaria
+        CREATE VIEW IF NOT EXISTS totales_{tabla} AS
+            SELECT tema_id, equipo_id, juez_id, SUM(medios) AS medios
+            FROM {tabla} GROUP BY tema_id, equipo_id, juez_id;
+    """
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS nombres (
+            tipo TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            nombre TEXT NOT NULL,
+            PRIMARY KEY (tipo, id),
+            UNIQUE (tipo, nombre)
+        );
+        CREATE TABLE IF NOT EXISTS config (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            jueces TEXT NOT NULL,
+            equipos_por_tema TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS eventos (
+            evento TEXT PRIMARY KEY,
+            archivado INTEGER NOT NULL DEFAULT 0,
+            creado TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, ruta, evento=None):
+        self.ruta = ruta
+        self.evento = validar_evento(evento)
+        # SQLite no distingue mayúsculas en nombres de tablas: 'Final' y 'final' serían la misma
+        self.tabla = 'puntajes' if evento is None else f'puntajes_{evento.lower()}'
+        self._local = threading.local()
+        # Con ':memory:' cada conexión sería una base distinta: se comparte una sola
+        self._compartida = None
+        self._lock = threading.Lock()
+        if ruta == ':memory:':
+            self._compartida = self._abrir()
+        with self._transaccion() as con:
+            con.executescript(self.ESQUEMA)
+            self._migrar(con)
+            self._revisar_evento(con)
+            con.executescript(self.ESQUEMA_PUNTAJES.format(tabla=self.tabla))
+            self._migrar_calificaciones(con)
+
+    def _abrir(self):
+        con = sqlite3.connect(self.ruta, timeout=10, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    def _conexion(self):
+        if self._compartida is not None:
+            return self._compartida
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._abrir()
+            self._local.con = con
+        return con
+
+    def _transaccion(self):
+        return _Transaccion(self._conexion(), self._lock if self._compartida is not None else None)
+
+    def _migrar(self, con):
+        # Bases de antes de los eventos: config sin columna evento
+        columnas = [fila[1] for fila in con.execute("PRAGMA table_info(config)")]
+        if 'evento' not in columnas:
+            con.execute("ALTER TABLE config ADD COLUMN evento TEXT")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_config_evento ON config (evento, id)")
+
+    def _migrar_calificaciones(self, con):
+        # Bases creadas con el esquema de texto: se pasan a puntajes y se borra la tabla vieja
+        existe = con.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'calificaciones'"
+        ).fetchone()
+        if not existe:
+            return
+        filas = [
+            dict(zip(COLUMNAS, fila))
+            for fila in con.execute(f"SELECT {', '.join(COLUMNAS)} FROM calificaciones ORDER BY id")
+        ]
+        self._escribir(con, filas)
+        con.execute("DROP TABLE calificaciones")
+
+    def _revisar_evento(self, con):
+        # Un evento que solo cambia en mayúsculas usaría la tabla de otro
+        if self.evento is None:
+            return
+        otro = con.execute(
+            "SELECT evento FROM eventos WHERE lower(evento) = lower(?) AND evento != ?", (self.evento, self.evento)
+        ).fetchone()
+        if otro:
+            raise ValueError(f"El evento {self.evento!r} choca con {otro[0]!r} (solo cambian mayúsculas)")
+
+    def _catalogo(self, con):
+        return Catalogo(con.execute("SELECT tipo, id, nombre FROM nombres").fetchall())
+
+    def _registrar(self, con, tipo, nombres):
+        # Dentro de la transacción de escritura, así el siguiente id no choca con otro proceso
+        for nombre in dict.fromkeys(nombres):
+            con.execute(
+                "INSERT OR IGNORE INTO nombres (tipo, id, nombre) "
+                "SELECT ?, COALESCE(MAX(id), 0) + 1, ? FROM nombres WHERE tipo = ?",
+                (tipo, nombre, tipo)
+            )
+
+    def _escribir(self, con, filas):
+        # filas ya validadas; los equipos y jueces nuevos se registran al vuelo
+        self._registrar(con, 'equipo', [f['equipo'] for f in filas])
+        self._registrar(con, 'juez', [f['juez'] for f in filas])
+        catalogo = self._catalogo(con)
+        compactas, errores = codificar(filas, catalogo)
+        if errores:
+            raise sqlite3.IntegrityError(errores[0]['error'])
+        con.executemany(
+            f"INSERT INTO {self.tabla} (tema_id, equipo_id, juez_id, criterio_id, cumple, medios) "
+            "VALUES (:tema_id, :equipo_id, :juez_id, :criterio_id, :cumple, :medios) "
+            "ON CONFLICT (tema_id, equipo_id, juez_id, criterio_id) "
+            "DO UPDATE SET cumple = excluded.cumple, medios = excluded.medios",
+            compactas
+        )
+
+    def guardar_lote(self, calificaciones):
+        resultado = _resultado()
+        filas, resultado['errores'] = validar_calificaciones(calificaciones)
+        if resultado['errores'] or not filas:
+            return resultado
+        inicio = time.perf_counter()
+        try:
+            with self._transaccion() as con:
+                self._escribir(con, filas)
+        except sqlite3.Error as e:
+            resultado['errores'] = [{'fila': i, 'criterio': f['criterio'], 'error': str(e)} for i, f in enumerate(filas)]
+            resultado['reintentar'] = not isinstance(e, sqlite3.IntegrityError)
+        else:
+            resultado['ok'] = True
+            resultado['guardadas'] = len(filas)
+        resultado['latencia_ms'] = (time.perf_counter() - inicio) * 1000
+        return resultado
+
+    def consultar(self, tema=None, equipo=None, juez=None, columnas=None):
+        for columna in columnas or ():
+            if columna not in COLUMNAS + ('medios',):
+                raise ValueError(f"Columna desconocida: {columna}")
+        compactas = columnas_compactas(columnas)
+        with self._transaccion() as con:
+            catalogo = self._catalogo(con)
+            condiciones, parametros = [], []
+            for campo, valor in (('tema_id', None if tema is None else TEMA_ID.get(tema, -1)),
+                                 ('equipo_id', None if equipo is None else catalogo.id('equipo', equipo) or -1),
+                                 ('juez_id', None if juez is None else catalogo.id('juez', juez) or -1)):
+                if valor is not None:
+                    condiciones.append(f"{campo} = ?")
+                    parametros.append(valor)
+            sql = f"SELECT {', '.join(compactas)} FROM {self.tabla}"
+            if condiciones:
+                sql += " WHERE " + " AND ".join(condiciones)
+            filas = con.execute(sql + " ORDER BY rowid", parametros).fetchall()
+        return decodificar(pd.DataFrame(filas, columns=compactas), catalogo, columnas)
+
+    totales_en_servidor = True
+
+    def totales(self, tema):
+        # La suma por (equipo, juez) la hace la vista de totales sobre enteros;
+        # pandas solo pivotea el resultado chico
+        with self._transaccion() as con:
+            catalogo = self._catalogo(con)
+            filas = con.execute(
+                f"SELECT equipo_id, juez_id, medios FROM totales_{self.tabla} WHERE tema_id = ?",
+                (TEMA_ID.get(tema, -1),)
+            ).fetchall()
+        return pd.DataFrame(
+            [(catalogo.nombre('equipo', e), catalogo.nombre('juez', j), medios / 2) for e, j, medios in filas],
+            columns=['equipo', 'juez', 'puntos']
+        )
+
+    def version_config(self):
+        with self._transaccion() as con:
+            fila = con.execute("SELECT MAX(id) FROM config WHERE evento IS ?", (self.evento,)).fetchone()
+        return fila[0]
+
+    def cargar_config(self, version=None):
+        if version is None:
+            version = self.version_config()
+            if version is None:
+                return None
+        with self._transaccion() as con:
+            fila = con.execute("SELECT jueces, equipos_por_tema FROM config WHERE id = ?", (version,)).fetchone()
+        if fila is None:
+            return None
+        return {'jueces': json.loads(fila[0]), 'equipos_por_tema': json.loads(fila[1])}
+
+    def guardar_config(self, jueces, equipos_por_tema):
+        with self._transaccion() as con:
+            self._registrar(con, 'juez', jueces)
+            self._registrar(con, 'equipo', [equipo for lista in equipos_por_tema.values() for equipo in lista])
+            ahora = datetime.now().isoformat()
+            con.execute(
+                "INSERT INTO config (jueces, equipos_por_tema, created_at, evento) VALUES (?, ?, ?, ?)",
+                (json.dumps(jueces), json.dumps(equipos_por_tema), ahora, self.evento)
+            )
+            if self.evento is not None:
+                self._revisar_evento(con)
+                con.execute("INSERT OR IGNORE INTO eventos (evento, creado) VALUES (?, ?)", (self.evento, ahora))
+
+    def borrar_todo(self):
+        with self._transaccion() as con:
+            con.execute(f"DELETE FROM {self.tabla}")
+            con.execute("DELETE FROM config WHERE evento IS ?", (self.evento,))
+
+    def eventos(self):
+        with self._transaccion() as con:
+            filas = con.execute("SELECT evento, archivado FROM eventos ORDER BY creado").fetchall()
+        return [{'evento': evento, 'archivado': bool(archivado)} for evento, archivado in filas]
+
+    def archivar_evento(self, evento):
+        # Solo renombra la tabla del evento: no copia ni borra filas
+        if evento == self.evento:
+            raise ValueError("No se puede archivar el evento activo")
+        tabla = f'puntajes_{validar_evento(evento).lower()}'
+        with self._transaccion() as con:
+            existe = con.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,)
+            ).fetchone()
+            if existe:
+                con.execute(f"DROP VIEW IF EXISTS totales_{tabla}")
+                con.execute(f"ALTER TABLE {tabla} RENAME TO archivo_{tabla}")
+            con.execute("UPDATE eventos SET archivado = 1 WHERE evento = ?", (evento,))
+
+
+class _Transaccion:
+    # Commit al salir sin error, rollback si hubo excepción
+    def __init__(self, con, lock=None):
+        self.con = con
+        self.lock = lock
+
+    def __enter__(self):
+        if self.lock:
+            self.lock.acquire()
+        return self.con
+
+    def __exit__(self, tipo, valor, traza):
+        try:
+            if tipo is None:
+                self.con.commit()
+            else:
+                self.con.rollback()
+        finally:
+            if self.lock:
+                self.lock.release()
+        return False
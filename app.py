@@ -1,103 +1,35 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from io import BytesIO
-import plotly.graph_objects as go
-import plotly.express as px
+from rubrica import TEMAS, CRITERIOS, MAX_EQUIPOS, EQUIPOS_EN_CAMPOS
+from almacen import SessionStateStore
+from ranking import TOP_GRAFICA, TAMANO_PAGINA
+from exportar import version_datos
 
 # Configuración de la página
 st.set_page_config(page_title="Sistema de Calificación -Solution Challenge",page_icon="🏆", layout="wide")
 
-# Temas del challenge
-TEMAS = [
-    "1. SOP - Síndrome de Ovario Poliquístico",
-    "2. Interfaz IA El Castillo de Tequila",
-    "3. Pronóstico de Demanda Grupo Collins",
-    "4. Conflicto Vial López Mateos"
-]
-
-# Criterios de evaluación
-CRITERIOS = {
-    "FORMALIDAD DE LA PRESENTACIÓN": [
-        "Se presentó el día y la hora establecidos",
-        "Se respetó el tiempo de duración de la exposición",
-        "La vestimenta es casual formal"
-    ],
-    "HABILIDADES COMUNICATIVAS": [
-        "Habla de forma natural, sin titubeos, haciendo fluido el mensaje",
-        "Utiliza una postura corporal con la que muestra seguridad de lo que está hablando",
-        "La transmisión del mensaje es efectiva"
-    ],
-    "DOMINIO DEL TEMA": [
-        "Muestra excelente dominio del tema",
-        "Puede contestar con precisión todas las preguntas planteadas"
-    ],
-    "SOLUTION VALUE": [
-        "Identificó con precisión las variables",
-        "El método es claro y consiso",
-        "El razonamiento matemático es claro y congruente",
-        "La interpretación matemática es fiable",
-        "La solution aporta valor agregado, creatividad e innovación"
-    ]
-}
-
 # Función para generar Excel
 def generar_excel():
     output = BytesIO()
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Hoja de resumen general
-        resumen_general = []
-        for tema in TEMAS:
-            equipos_tema = st.session_state.equipos_por_tema[tema]
-            for equipo in equipos_tema:
-                key_calif = f"{tema}|{equipo}"
-                puntos_jueces = []
-                for juez in st.session_state.jueces:
-                    total = 0
-                    for categoria in CRITERIOS.keys():
-                        for criterio in CRITERIOS[categoria]:
-                            if criterio in st.session_state.calificaciones[key_calif]['jueces'][juez][categoria]:
-                                total += st.session_state.calificaciones[key_calif]['jueces'][juez][categoria][criterio].get('puntos', 0)
-                    puntos_jueces.append(total)
-                promedio = sum(puntos_jueces) / len(puntos_jueces) if puntos_jueces else 0
-                
-                fila = {'Tema': tema, 'Equipo': equipo}
-                for i, juez in enumerate(st.session_state.jueces):
-                    fila[juez] = puntos_jueces[i]
-                fila['Promedio'] = promedio
-                resumen_general.append(fila)
+        # Rankings de todos los temas con una sola reducción sobre la matriz
+        almacen = SessionStateStore(st.session_state)
+        rankings = {tema: df.rename(columns={'equipo': 'Equipo'}) for tema, df in almacen.rankings().items()}
         
-        df_resumen = pd.DataFrame(resumen_general)
+        # Hoja de resumen general
+        columnas = ['Equipo'] + st.session_state.jueces + ['Promedio']
+        df_resumen = pd.concat(
+            [df[columnas].assign(Tema=tema) for tema, df in rankings.items() if not df.empty]
+            or [pd.DataFrame(columns=columnas + ['Tema'])]
+        )
+        df_resumen = df_resumen[['Tema'] + columnas]
         df_resumen.to_excel(writer, sheet_name='Resumen General', index=False)
         
         # Hoja por cada tema con ranking
-        for tema in TEMAS:
-            equipos_tema = st.session_state.equipos_por_tema[tema]
-            resultados_tema = []
-            
-            for equipo in equipos_tema:
-                key_calif = f"{tema}|{equipo}"
-                puntos_jueces = []
-                for juez in st.session_state.jueces:
-                    total = 0
-                    for categoria in CRITERIOS.keys():
-                        for criterio in CRITERIOS[categoria]:
-                            if criterio in st.session_state.calificaciones[key_calif]['jueces'][juez][categoria]:
-                                total += st.session_state.calificaciones[key_calif]['jueces'][juez][categoria][criterio].get('puntos', 0)
-                    puntos_jueces.append(total)
-                promedio = sum(puntos_jueces) / len(puntos_jueces) if puntos_jueces else 0
-                
-                resultado = {'Equipo': equipo}
-                for i, juez in enumerate(st.session_state.jueces):
-                    resultado[juez] = puntos_jueces[i]
-                resultado['Promedio'] = promedio
-                resultados_tema.append(resultado)
-            
-            resultados_tema = sorted(resultados_tema, key=lambda x: x['Promedio'], reverse=True)
-            for i, res in enumerate(resultados_tema):
-                res['Posición'] = i + 1
-            
-            df_tema = pd.DataFrame(resultados_tema)
+        for tema, df_tema in rankings.items():
             if not df_tema.empty:
                 columnas = ['Posición', 'Equipo'] + st.session_state.jueces + ['Promedio']
                 df_tema = df_tema[columnas]
@@ -106,34 +38,139 @@ def generar_excel():
                 sheet_name = tema.split('.')[1].strip()[:31]
                 df_tema.to_excel(writer, sheet_name=sheet_name, index=False)
         
-        # Hoja detallada con criterios
-        detalles_completos = []
-        for tema in TEMAS:
-            equipos_tema = st.session_state.equipos_por_tema[tema]
-            for equipo in equipos_tema:
-                key_calif = f"{tema}|{equipo}"
-                for juez in st.session_state.jueces:
-                    for categoria in CRITERIOS.keys():
-                        for criterio in CRITERIOS[categoria]:
-                            if criterio in st.session_state.calificaciones[key_calif]['jueces'][juez][categoria]:
-                                datos = st.session_state.calificaciones[key_calif]['jueces'][juez][categoria][criterio]
-                                detalles_completos.append({
-                                    'Tema': tema,
-                                    'Equipo': equipo,
-                                    'Juez': juez,
-                                    'Categoría': categoria,
-                                    'Criterio': criterio,
-                                    'Cumple': 'Sí' if datos.get('cumple', False) else 'No',
-                                    'Puntos': datos.get('puntos', 0)
-                                })
-        
-        if detalles_completos:
-            df_detalle = pd.DataFrame(detalles_completos)
+        # Hoja detallada con criterios, con los puntos tal cual se guardaron
+        df_detalle = almacen.matriz.filas(puntos_guardados=True)
+        if not df_detalle.empty:
+            df_detalle['cumple'] = np.where(df_detalle['cumple'], 'Sí', 'No')
+            df_detalle = df_detalle.rename(columns={
+                'tema': 'Tema', 'equipo': 'Equipo', 'juez': 'Juez', 'categoria': 'Categoría',
+                'criterio': 'Criterio', 'cumple': 'Cumple', 'puntos': 'Puntos'
+            })
             df_detalle.to_excel(writer, sheet_name='Detalle Completo', index=False)
     
     output.seek(0)
     return output
 
+# Gráfica de barras del ranking como dict de Plotly, memorizada por el contenido
+# del ranking para no rearmarla (ni mandar otra figura) en cada rerun
+@st.cache_data(max_entries=20)
+def figura_ranking(version, _df_ranking, destacado):
+    # Plotly solo se importa cuando hay gráfica que armar
+    import plotly.graph_objects as go
+    df_ranking = _df_ranking
+    # Gráfico de barras horizontal con colores degradados
+    fig_bar = go.Figure()
+
+    fig_bar.add_trace(go.Bar(
+        y=df_ranking['Equipo'],
+        x=df_ranking['Promedio'],
+        orientation='h',
+        marker=dict(
+            color=df_ranking['Promedio'],
+            colorscale='Viridis',
+            showscale=False,
+            # Borde dorado en el equipo resaltado
+            line=dict(color=['gold' if e == destacado else 'white' for e in df_ranking['Equipo']], width=2)
+        ),
+        text=df_ranking['Promedio'].round(2),
+        textposition='outside',
+        textfont=dict(size=14, color='white'),
+        hovertemplate='<b>%{y}</b><br>Promedio: %{x:.2f}<extra></extra>'
+    ))
+
+    # Sin equipos (o todos en cero) el eje va de 0 a 1 en lugar de fallar
+    maximo = (df_ranking['Promedio'].max() if len(df_ranking) else 0) or 1
+
+    fig_bar.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white', size=12),
+        xaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(255,255,255,0.1)',
+            title='Puntos',
+            range=[0, maximo * 1.15]
+        ),
+        yaxis=dict(
+            showgrid=False,
+            categoryorder='total ascending',
+            title=''
+        ),
+        height=max(300, len(df_ranking) * 50),
+        margin=dict(l=10, r=10, t=10, b=10)
+    )
+
+    return fig_bar.to_dict()
+
+# Rúbrica como fragmento: cada casilla solo vuelve a dibujar la rúbrica y su total
+@st.fragment
+def formulario_rubrica(tema, equipo, juez):
+    key_calif = f"{tema}|{equipo}"
+    matriz = st.session_state.matriz
+    total_puntos = 0
+    filas_rubrica = []
+    
+    for categoria, criterios in CRITERIOS.items():
+        st.markdown(f"### 📋 {categoria}")
+        
+        for criterio in criterios:
+            cumple_previo, puntos_previos = matriz.valor(tema, equipo, juez, categoria, criterio)
+            col1, col2, col3 = st.columns([4, 1, 1.5])
+            
+            with col1:
+                st.write(f"• {criterio}")
+            
+            with col2:
+                cumple = st.checkbox(
+                    "✓ C",
+                    key=f"{juez}_{key_calif}_{categoria}_{criterio}_cumple",
+                    value=cumple_previo
+                )
+            
+            with col3:
+                if cumple:
+                    puntos = st.number_input(
+                        "Puntos (0-10)",
+                        min_value=0.0,
+                        max_value=10.0,
+                        step=0.5,
+                        key=f"{juez}_{key_calif}_{categoria}_{criterio}_puntos",
+                        value=puntos_previos
+                    )
+                    total_puntos += puntos
+                else:
+                    puntos = 10.0
+                    st.write("—")
+            
+            filas_rubrica.append({
+                'tema': tema, 'equipo': equipo, 'juez': juez,
+                'categoria': categoria, 'criterio': criterio, 'cumple': cumple, 'puntos': puntos
+            })
+        
+        st.markdown("---")
+    
+    # Guardar en session_state con una sola asignación sobre la matriz
+    SessionStateStore(st.session_state).guardar_lote(filas_rubrica)
+    
+    # Mostrar total
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        st.metric("🎯 TOTAL DE PUNTOS", f"{total_puntos:.1f}", delta=None)
+    
+    # Observaciones
+    st.markdown("---")
+    st.subheader("📝 Observaciones (Opcional)")
+    observaciones = st.text_area(
+        "Comentarios adicionales:",
+        key=f"obs_{juez}_{key_calif}",
+        height=100,
+        placeholder="Escribe aquí cualquier observación relevante sobre la presentación..."
+    )
+    
+    if st.button("💾 Guardar Calificación", type="primary", use_container_width=True):
+        st.success(f"✅ Calificación guardada para **{equipo}** por **{juez}**")
+        st.balloons()
+
 # Inicializar session_state
 if 'equipos_por_tema' not in st.session_state:
     st.session_state.equipos_por_tema = {tema: [] for tema in TEMAS}
@@ -141,9 +178,6 @@ if 'equipos_por_tema' not in st.session_state:
 if 'jueces' not in st.session_state:
     st.session_state.jueces = []
     
-if 'calificaciones' not in st.session_state:
-    st.session_state.calificaciones = {}
-    
 if 'config_done' not in st.session_state:
     st.session_state.config_done = False
 
@@ -180,43 +214,40 @@ if not st.session_state.config_done:
             num_equipos = st.number_input(
                 f"Número de equipos para este tema", 
                 min_value=1, 
-                max_value=12, 
+                max_value=MAX_EQUIPOS, 
                 value=2,
                 key=f"num_{tema}"
             )
             
-            equipos_tema = []
-            cols = st.columns(min(3, num_equipos))
-            
-            for i in range(num_equipos):
-                with cols[i % 3]:
-                    nombre_equipo = st.text_input(
-                        f"Equipo {i+1}",
-                        value=f"Equipo {i+1}",
-                        key=f"equipo_{tema}_{i}"
-                    )
-                    equipos_tema.append(nombre_equipo)
+            if num_equipos > EQUIPOS_EN_CAMPOS:
+                # Con muchos equipos, una lista en lugar de cientos de campos
+                texto = st.text_area(
+                    "Equipos (uno por línea)",
+                    value="\n".join(f"Equipo {i+1}" for i in range(num_equipos)),
+                    height=300,
+                    key=f"lista_{tema}_{num_equipos}"
+                )
+                equipos_tema = [linea.strip() for linea in texto.splitlines() if linea.strip()]
+            else:
+                equipos_tema = []
+                cols = st.columns(min(3, num_equipos))
+                
+                for i in range(num_equipos):
+                    with cols[i % 3]:
+                        nombre_equipo = st.text_input(
+                            f"Equipo {i+1}",
+                            value=f"Equipo {i+1}",
+                            key=f"equipo_{tema}_{i}"
+                        )
+                        equipos_tema.append(nombre_equipo)
             
             equipos_data[tema] = equipos_tema
     
     st.markdown("---")
     
     if st.button("✅ Iniciar Competencia", type="primary", use_container_width=True):
-        st.session_state.equipos_por_tema = equipos_data
-        st.session_state.jueces = jueces_nombres
-        st.session_state.config_done = True
-        
-        # Inicializar estructura de calificaciones
-        for tema, equipos in equipos_data.items():
-            for equipo in equipos:
-                st.session_state.calificaciones[f"{tema}|{equipo}"] = {
-                    'tema': tema,
-                    'equipo': equipo,
-                    'jueces': {
-                        juez: {categoria: {} for categoria in CRITERIOS.keys()}
-                        for juez in jueces_nombres
-                    }
-                }
+        # Crea la matriz de calificaciones [tema, equipo, juez, criterio]
+        SessionStateStore(st.session_state).guardar_config(jueces_nombres, equipos_data)
         st.rerun()
 
 # SISTEMA DE CALIFICACIÓN
@@ -299,108 +330,35 @@ else:
         
         st.markdown("---")
         
+        # En el ranking se resalta el último equipo calificado en el tema
+        st.session_state.setdefault('equipo_calificado', {})[tema_seleccionado] = equipo_actual
+        
         # Formulario de calificación
         st.subheader(f"Evaluando: **{equipo_actual}** | Juez: **{juez_actual}**")
         
-        key_calif = f"{tema_seleccionado}|{equipo_actual}"
-        total_puntos = 0
-        
-        for categoria, criterios in CRITERIOS.items():
-            st.markdown(f"### 📋 {categoria}")
-            
-            for criterio in criterios:
-                col1, col2, col3 = st.columns([4, 1, 1.5])
-                
-                with col1:
-                    st.write(f"• {criterio}")
-                
-                with col2:
-                    cumple = st.checkbox(
-                        "✓ C",
-                        key=f"{juez_actual}_{key_calif}_{categoria}_{criterio}_cumple",
-                        value=st.session_state.calificaciones[key_calif]['jueces'][juez_actual][categoria].get(criterio, {}).get('cumple', False)
-                    )
-                
-                with col3:
-                    if cumple:
-                        puntos = st.number_input(
-                            "Puntos (0-10)",
-                            min_value=0.0,
-                            max_value=10.0,
-                            step=0.5,
-                            key=f"{juez_actual}_{key_calif}_{categoria}_{criterio}_puntos",
-                            value=st.session_state.calificaciones[key_calif]['jueces'][juez_actual][categoria].get(criterio, {}).get('puntos', 0.0)
-                        )
-                        total_puntos += puntos
-                    else:
-                        puntos = 10.0
-                        st.write("—")
-                
-                # Guardar en session_state
-                st.session_state.calificaciones[key_calif]['jueces'][juez_actual][categoria][criterio] = {
-                    'cumple': cumple,
-                    'puntos': puntos
-                }
-            
-            st.markdown("---")
-        
-        # Mostrar total
-        col1, col2, col3 = st.columns([1, 2, 1])
-        with col2:
-            st.metric("🎯 TOTAL DE PUNTOS", f"{total_puntos:.1f}", delta=None)
-        
-        # Observaciones
-        st.markdown("---")
-        st.subheader("📝 Observaciones (Opcional)")
-        observaciones = st.text_area(
-            "Comentarios adicionales:",
-            key=f"obs_{juez_actual}_{key_calif}",
-            height=100,
-            placeholder="Escribe aquí cualquier observación relevante sobre la presentación..."
-        )
-        
-        if st.button("💾 Guardar Calificación", type="primary", use_container_width=True):
-            st.success(f"✅ Calificación guardada para **{equipo_actual}** por **{juez_actual}**")
-            st.balloons()
+        # Marcar criterios solo vuelve a correr la rúbrica; la página completa corre al cambiar de equipo o juez
+        formulario_rubrica(tema_seleccionado, equipo_actual, juez_actual)
     
     # ========== MODO RANKING ==========
     else:
         st.header(f"📊 Ranking - {tema_seleccionado}")
         
-        # Calcular ranking solo para el tema actual
-        equipos_tema_actual = st.session_state.equipos_por_tema[tema_seleccionado]
-        resultados = []
-        
-        for equipo in equipos_tema_actual:
-            key_calif = f"{tema_seleccionado}|{equipo}"
-            puntos_por_juez = {}
-            
-            for juez in st.session_state.jueces:
-                total = 0
-                for categoria in CRITERIOS.keys():
-                    for criterio in CRITERIOS[categoria]:
-                        calif = st.session_state.calificaciones[key_calif]['jueces'][juez][categoria]
-                        if criterio in calif and calif[criterio].get('cumple', False):
-                            total += calif[criterio].get('puntos', 0)
-                puntos_por_juez[juez] = total
-            
-            promedio = sum(puntos_por_juez.values()) / len(puntos_por_juez) if puntos_por_juez else 0
-            
-            resultado = {
-                'Posición': 0,
-                'Equipo': equipo,
-                'Promedio': promedio,
-                **puntos_por_juez
-            }
-            
-            resultados.append(resultado)
-        
-        # Ordenar por promedio
-        resultados = sorted(resultados, key=lambda x: x['Promedio'], reverse=True)
+        almacen = SessionStateStore(st.session_state)
+        opciones = [None] + equipos_tema_actual
+        previo = st.session_state.get('equipo_calificado', {}).get(tema_seleccionado)
+        destacado = st.selectbox(
+            "⭐ Resaltar equipo:",
+            opciones,
+            index=opciones.index(previo) if previo in opciones else 0,
+            format_func=lambda e: e or "Ninguno",
+            key=f"destacado_{tema_seleccionado}"
+        )
         
-        # Asignar posiciones
-        for i, resultado in enumerate(resultados):
-            resultado['Posición'] = i + 1
+        # Podio y gráfica: solo el top del tema actual y el equipo resaltado
+        df_ranking = almacen.ranking(
+            tema_seleccionado, k=TOP_GRAFICA, incluir=(destacado,) if destacado else ()
+        ).rename(columns={'equipo': 'Equipo'})
+        resultados = df_ranking.to_dict('records')
         
         # Mostrar podio si hay al menos 3 equipos
         if len(resultados) >= 3:
@@ -424,9 +382,13 @@ else:
         
         st.markdown("---")
         
-        # Tabla completa
+        # Tabla completa, por páginas
         st.markdown("### 📋 Tabla Completa de Posiciones")
-        df = pd.DataFrame(resultados)
+        n_paginas = max(1, -(-almacen.contar_ranking(tema_seleccionado) // TAMANO_PAGINA))
+        pagina = st.number_input("Página", 1, n_paginas, 1, key="pagina_ranking") if n_paginas > 1 else 1
+        df = almacen.ranking(
+            tema_seleccionado, k=TAMANO_PAGINA, inicio=(pagina - 1) * TAMANO_PAGINA
+        ).rename(columns={'equipo': 'Equipo'})
         
         # Reordenar columnas
         columnas_ordenadas = ['Posición', 'Equipo'] + st.session_state.jueces + ['Promedio']
@@ -439,58 +401,17 @@ else:
                 **{juez: '{:.2f}' for juez in st.session_state.jueces}
             }),
             use_container_width=True,
-            height=min(400, len(resultados) * 50 + 100)
+            height=min(400, len(df) * 50 + 100)
         )
         
         st.markdown("---")
         
-        # Gráficos modernos con Plotly
         col_graph1, col_graph2 = st.columns(2)
         
         with col_graph1:
             st.markdown("### 📊 Promedio por Equipo")
-            # Gráfico de barras horizontal con colores degradados
-            fig_bar = go.Figure()
-            
-            colors = px.colors.sequential.Viridis
-            color_scale = [colors[int(i * (len(colors)-1) / (len(df)-1))] for i in range(len(df))]
-            
-            fig_bar.add_trace(go.Bar(
-                y=df['Equipo'],
-                x=df['Promedio'],
-                orientation='h',
-                marker=dict(
-                    color=df['Promedio'],
-                    colorscale='Viridis',
-                    showscale=False,
-                    line=dict(color='white', width=2)
-                ),
-                text=df['Promedio'].round(2),
-                textposition='outside',
-                textfont=dict(size=14, color='white'),
-                hovertemplate='<b>%{y}</b><br>Promedio: %{x:.2f}<extra></extra>'
-            ))
-            
-            fig_bar.update_layout(
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white', size=12),
-                xaxis=dict(
-                    showgrid=True,
-                    gridcolor='rgba(255,255,255,0.1)',
-                    title='Puntos',
-                    range=[0, max(df['Promedio']) * 1.15]
-                ),
-                yaxis=dict(
-                    showgrid=False,
-                    categoryorder='total ascending',
-                    title=''
-                ),
-                height=max(300, len(df) * 50),
-                margin=dict(l=10, r=10, t=10, b=10)
-            )
-            
-            st.plotly_chart(fig_bar, use_container_width=True)
+            # La figura solo se rearma cuando cambia el ranking
+            st.plotly_chart(figura_ranking(version_datos(df_ranking), df_ranking, destacado), use_container_width=True)
         
         # Ver ranking de otros temas
         st.markdown("---")
@@ -1,11 +1,23 @@
 import streamlit as st
-from supabase import create_client
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
 from datetime import datetime
-from io import BytesIO
-import json
+import logging
+import threading
 import time
-import altair as alt
+from concurrent.futures import ThreadPoolExecutor
+from almacen import SupabaseStore, SQLiteStore
+from rubrica import TEMAS, CRITERIOS, MAX_EQUIPOS, EQUIPOS_EN_CAMPOS
+import exportar
+from puntajes import LLAVE_CALIFICACION, indexar_calificaciones
+from ranking import MotorRanking, ranking_desde_totales, TOP_GRAFICA, TAMANO_PAGINA
+from notificaciones import Notificador, escuchar_supabase
+from cache_compartida import crear_cache, obtener_o_calcular
+from diario import DiarioEscrituras
+import metricas
+from metricas import medir
+
+inicio_rerun = time.perf_counter()
 
 st.set_page_config(page_title="Sistema de Calificación", page_icon="🏆", layout="wide")
 
@@ -40,110 +52,446 @@ st.markdown("""
 if 'mode' not in st.session_state:
     st.session_state.mode = 'juez'  # Por defecto modo juez
 
+# Cache compartido entre réplicas (opcional): secrets["cache_compartida"]
+@st.cache_resource
+def init_cache_compartida():
+    return crear_cache(st.secrets.get("cache_compartida"))
+
+# Cada evento tiene su propio espacio en el cache compartido
+def espacio_calificaciones():
+    return 'calificaciones' if almacen.evento is None else f'calificaciones:{almacen.evento}'
+
+def generacion_calificaciones():
+    cache = init_cache_compartida()
+    return cache.generacion(espacio_calificaciones()) if cache else 0
+
+# Versión de Realtime del tema (o de todos, sin tema): va en la llave de las lecturas
+# para que un cambio solo vuelva a leer las entradas de su tema, sin vaciar el cache
+def version_cambios(tema=None):
+    return init_notificador().version(tema)
+
+# Cada combinación de filtros/columnas tiene su propia entrada en el cache.
+# La generación compartida es parte de la llave: un guardado en otra réplica la invalida.
+def obtener_calificaciones(tema=None, equipo=None, juez=None, columnas=None):
+    metricas.registro.consulta_cache('calificaciones')
+    return _obtener_calificaciones(generacion_calificaciones(), version_cambios(tema), tema, equipo, juez, columnas)
+
+@st.cache_data(ttl=15)
+def _obtener_calificaciones(generacion, cambios, tema, equipo, juez, columnas):
+    metricas.registro.fallo_cache('calificaciones')
+    def consultar():
+        with medir('obtener_calificaciones'):
+            return almacen.consultar(tema=tema, equipo=equipo, juez=juez, columnas=columnas)
+    cache = init_cache_compartida()
+    if cache is None:
+        return consultar()
+    def consultar_sin_compartida():
+        # Solo cuenta como fallo del cache compartido si lo hay y no tenía la entrada
+        metricas.registro.fallo_cache('compartida')
+        return consultar()
+    metricas.registro.consulta_cache('compartida')
+    return obtener_o_calcular(cache, espacio_calificaciones(), (tema, equipo, juez, columnas),
+                              consultar_sin_compartida, ttl=15, generacion=generacion)
+
+# Índice (tema, equipo, juez, categoria, criterio) -> (cumple, puntos) del equipo
+def obtener_indice_calificaciones(tema, equipo):
+    metricas.registro.consulta_cache('indice')
+    indice = _obtener_indice_calificaciones(generacion_calificaciones(), version_cambios(tema), tema, equipo)
+    diario = init_diario()
+    pendientes = diario.filas_pendientes(tema, equipo) if diario else []
+    if pendientes:
+        # Lo que aún no sube al almacén manda sobre lo leído de la tabla
+        indice = {**indice, **indexar_calificaciones(pd.DataFrame(pendientes))}
+    return indice
+
 @st.cache_data(ttl=15)
-def obtener_calificaciones():
-    response = supabase.table('calificaciones').select("*").execute()
-    return pd.DataFrame(response.data)
+def _obtener_indice_calificaciones(generacion, cambios, tema, equipo):
+    metricas.registro.fallo_cache('indice')
+    df = obtener_calificaciones(tema=tema, equipo=equipo, columnas=LLAVE_CALIFICACION + ('cumple', 'puntos'))
+    return indexar_calificaciones(df)
+
+# Motor de ranking compartido por todas las sesiones del proceso
+@st.cache_resource
+def init_motor_ranking():
+    return MotorRanking()
+
+def limpiar_cache_calificaciones(compartida=False):
+    _obtener_calificaciones.clear()
+    _obtener_indice_calificaciones.clear()
+    _totales_en_servidor.clear()
+    # Quien escribe avisa a las demás réplicas subiendo la generación
+    cache = init_cache_compartida()
+    if compartida and cache:
+        cache.invalidar(espacio_calificaciones())
+
+def oyente_de_cambios(motor):
+    # Corre en el hilo de Realtime, así que no toca el cache de Streamlit (las lecturas
+    # cambian de llave con version_cambios); el motor solo recibe el delta
+    def al_cambiar_calificacion(evento, registro, anterior):
+        if evento == 'DELETE' or not registro:
+            motor.invalidar()
+        else:
+            motor.aplicar([registro])
+    return al_cambiar_calificacion
+
+@st.cache_resource
+def init_notificador():
+    notificador = Notificador(traducir=almacen.registro_de_cambio)
+    notificador.suscribir(oyente_de_cambios(init_motor_ranking()))
+    if isinstance(almacen, SupabaseStore):
+        try:
+            # No bloquea: mientras el canal se suscribe (o si nunca lo logra) las sesiones
+            # usan el refresco por intervalo
+            escuchar_supabase(notificador, st.secrets["supabase_url"], st.secrets["supabase_key"],
+                              tabla=almacen.tabla_cambios, evento=almacen.evento)
+        except Exception as e:
+            notificador.error = e
+    return notificador
+
+# Cada cuántos segundos revisa cada sesión si su tema cambió; es solo una comparación
+# de versiones en memoria, el rerun completo ocurre únicamente si hubo cambios
+INTERVALO_AVISOS = 3
+
+@st.fragment(run_every=INTERVALO_AVISOS)
+def esperar_cambios(tema, clave, intervalo):
+    # Fragmento ligero: solo compara versiones y re-ejecuta la app si hubo cambios en el tema
+    notificador = init_notificador()
+    if not notificador.escuchando:
+        # Realtime aún se está suscribiendo o no está disponible: refresco por intervalo
+        ultimo = st.session_state.get(f"{clave}_intervalo")
+        if ultimo is None or time.monotonic() - ultimo >= intervalo:
+            st.session_state[f"{clave}_intervalo"] = time.monotonic()
+            if ultimo is not None:
+                st.rerun()
+        return
+    version = (tema, notificador.version(tema))
+    anterior = st.session_state.get(clave)
+    st.session_state[clave] = version
+    if anterior is not None and anterior[0] == tema and anterior != version:
+        st.rerun()
 
 @st.cache_resource
 def init_supabase_v2():
+    # supabase tarda en importarse y con backend sqlite no se usa
+    from supabase import create_client
     return create_client(st.secrets["supabase_url"], st.secrets["supabase_key"])
 
-supabase = init_supabase_v2()
-
-TEMAS = [
-    "1. SOP - Síndrome de Ovario Poliquístico",
-    "2. Interfaz IA El Castillo de Tequila",
-    "3. Pronóstico de Demanda Grupo Collins",
-    "4. Conflicto Vial López Mateos"
-]
-
-CRITERIOS = {
-    "FORMALIDAD DE LA PRESENTACIÓN": [
-        "Se presentó el día y la hora establecidos",
-        "Se respetó el tiempo de duración de la exposición",
-        "La vestimenta es casual formal"
-    ],
-    "HABILIDADES COMUNICATIVAS": [
-        "Habla de forma natural, sin titubeos, haciendo fluido el mensaje",
-        "Utiliza una postura corporal con la que muestra seguridad de lo que está hablando",
-        "La transmisión del mensaje es efectiva"
-    ],
-    "DOMINIO DEL TEMA": [
-        "Muestra excelente dominio del tema",
-        "Puede contestar con precisión todas las preguntas planteadas"
-    ],
-    "SOLUTION VALUE": [
-        "Identificó con precisión las variables",
-        "El método es claro y consiso",
-        "El razonamiento matemático es claro y congruente",
-        "La interpretación matemática es fiable",
-        "La solution aporta valor agregado, creatividad e innovación"
-    ]
-}
+# Almacén de calificaciones: Supabase, o SQLite local con secrets["backend"] = "sqlite"
+# para sedes sin buena conexión. secrets["esquema"] = "compacto" usa las tablas
+# puntajes/nombres de Supabase (ids enteros y medios puntos) y
+# secrets["ranking_en_servidor"] = true lee el ranking de las vistas de totales.
+# secrets["evento"] separa configuración y calificaciones de cada challenge
+@st.cache_resource
+def init_almacen():
+    evento = st.secrets.get("evento")
+    if st.secrets.get("backend") == "sqlite":
+        return SQLiteStore(st.secrets.get("sqlite_path", "calificaciones.db"), evento=evento)
+    return SupabaseStore(init_supabase_v2(), compacto=st.secrets.get("esquema") == "compacto",
+                         totales_en_servidor=st.secrets.get("ranking_en_servidor", False), evento=evento)
+
+almacen = init_almacen()
+
+def al_sincronizar_diario(filas):
+    # Llega desde el hilo del diario cuando un lote ya está en Supabase
+    motor = init_motor_ranking()
+    motor.aplicar(filas)
+    limpiar_cache_calificaciones(compartida=True)
+    motor.generacion = generacion_calificaciones()
+
+# Con Supabase cada envío se escribe primero en un diario local (secrets["diario_path"])
+# y un hilo lo sube en segundo plano; así un corte de red no pierde la rúbrica
+@st.cache_resource
+def init_diario():
+    if not isinstance(almacen, SupabaseStore):
+        return None
+    diario = DiarioEscrituras(st.secrets.get("diario_path", "diario_calificaciones.db"))
+    diario.iniciar(almacen, al_sincronizar_diario)
+    return diario
+
+@st.fragment(run_every=2)
+def mostrar_pendientes(juez):
+    diario = init_diario()
+    if diario is None:
+        return
+    rechazados, error = diario.rechazados().get(juez, (0, None))
+    if rechazados:
+        st.error(f"❌ {rechazados} envío(s) rechazados, no se guardaron: {error}")
+    pendientes = diario.pendientes().get(juez, 0)
+    if pendientes:
+        st.warning(f"⏳ {pendientes} envío(s) pendientes de sincronizar")
+        if diario.ultimo_error:
+            st.caption(f"Reintentando: {diario.ultimo_error}")
+    else:
+        st.caption("✅ Todo sincronizado")
+
+# La configuración se cachea por versión (id) y solo se vuelve a leer
+# cuando guardar_config escribe una versión nueva
+@st.cache_data(ttl=5)
+def obtener_version_config():
+    metricas.registro.fallo_cache('config')
+    with medir('version_config'):
+        return almacen.version_config()
+
+@st.cache_data(max_entries=10)
+def cargar_config_version(version):
+    with medir('cargar_config'):
+        return almacen.cargar_config(version)
 
 def cargar_config():
-    response = supabase.table('config').select("*").order('id', desc=True).limit(1).execute()
-    if response.data:
-        return {
-            'jueces': json.loads(response.data[0]['jueces']),
-            'equipos_por_tema': json.loads(response.data[0]['equipos_por_tema'])
-        }
-    return None
+    metricas.registro.consulta_cache('config')
+    version = obtener_version_config()
+    if version is None:
+        return None
+    return cargar_config_version(version)
 
 def guardar_config(jueces, equipos_por_tema):
-    supabase.table('config').insert({
-        'jueces': json.dumps(jueces),
-        'equipos_por_tema': json.dumps(equipos_por_tema)
-    }).execute()
+    almacen.guardar_config(jueces, equipos_por_tema)
+    obtener_version_config.clear()
 
 def guardar_calificacion(tema, equipo, juez, categoria, criterio, cumple, puntos):
-    supabase.table('calificaciones').upsert({
-        'tema': tema,
-        'equipo': equipo,
-        'juez': juez,
-        'categoria': categoria,
-        'criterio': criterio,
-        'cumple': cumple,
-        'puntos': puntos
-    }, on_conflict='tema,equipo,juez,categoria,criterio').execute()
-
-def calcular_ranking(tema):
-    df = obtener_calificaciones()
-    if df.empty:
-        return pd.DataFrame()
+    return guardar_calificaciones_batch([{
+        'tema': tema, 'equipo': equipo, 'juez': juez, 'categoria': categoria,
+        'criterio': criterio, 'cumple': cumple, 'puntos': puntos
+    }])
+
+def guardar_calificaciones_batch(calificaciones):
+    diario = init_diario()
+    with medir('guardar_calificacion'):
+        if diario is not None:
+            # Se confirma en cuanto el envío está en disco; al_sincronizar_diario hace el resto
+            resultado = diario.anotar(calificaciones)
+        else:
+            resultado = almacen.guardar_lote(calificaciones)
+    metricas.contar('guardados', resultado='ok' if resultado['ok'] else 'error')
+    if resultado['ok'] and not resultado.get('pendiente'):
+        # El ranking de este proceso se actualiza con el delta, sin releer la tabla
+        motor = init_motor_ranking()
+        motor.aplicar(calificaciones)
+        limpiar_cache_calificaciones(compartida=True)
+        motor.generacion = generacion_calificaciones()
+    return resultado
+
+# Con un almacén que agrega en la base de datos solo viaja una fila por (equipo, juez).
+# Se cachean los totales y no cada página: todas las páginas salen de la misma lectura
+@st.cache_data(ttl=5)
+def _totales_en_servidor(generacion, cambios, tema):
+    metricas.registro.fallo_cache('ranking')
+    with medir('totales_servidor'):
+        return almacen.totales(tema)
+
+# Con k solo regresa los lugares inicio+1 .. inicio+k y los equipos de incluir,
+# así lo que se dibuja no crece con el número de equipos
+@metricas.medido('calcular_ranking')
+def calcular_ranking(tema, k=None, inicio=0, incluir=()):
+    if almacen.totales_en_servidor:
+        metricas.registro.consulta_cache('ranking')
+        return ranking_desde_totales(_totales_en_servidor(generacion_calificaciones(), version_cambios(tema), tema),
+                                     k=k, inicio=inicio, incluir=incluir)
+    motor = init_motor_ranking()
+    # Un guardado en otra réplica cambia la generación y obliga a sincronizar
+    generacion = generacion_calificaciones()
+    if motor.generacion != generacion:
+        motor.invalidar()
+        motor.generacion = generacion
+    # Solo se relee la tabla (y se aplican las diferencias) cuando vence el ttl
+    motor.refrescar(
+        lambda: obtener_calificaciones(columnas=LLAVE_CALIFICACION + ('puntos',)).to_dict('records'),
+        ttl=15
+    )
+    return motor.ranking(tema, k=k, inicio=inicio, incluir=incluir)
+
+def contar_ranking(tema):
+    # Filas del ranking (equipos ya calificados) para saber cuántas páginas hay;
+    # se llama después de calcular_ranking, que deja al día los totales o el motor
+    if almacen.totales_en_servidor:
+        totales = _totales_en_servidor(generacion_calificaciones(), version_cambios(tema), tema)
+        return totales['equipo'].nunique() if not totales.empty else 0
+    return init_motor_ranking().contar(tema)
+
+# Pool del proceso para las lecturas independientes de una misma página
+@st.cache_resource
+def init_pool_lecturas():
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix='lecturas')
+
+def en_paralelo(*llamadas):
+    # Lanza lecturas que no dependen entre sí a la vez y regresa sus resultados en orden:
+    # la página tarda lo que la más lenta en lugar de la suma
+    ctx = get_script_run_ctx()
+    def con_contexto(llamada):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return llamada()
+    futuros = [init_pool_lecturas().submit(con_contexto, llamada) for llamada in llamadas]
+    return [futuro.result() for futuro in futuros]
+
+def precargar_pagina_juez(modo, tema, equipo):
+    # Lo que la página del juez pidió en el rerun anterior; deja caliente el cache
+    if modo == 'calificar':
+        obtener_indice_calificaciones(tema, equipo)
+    else:
+        calcular_ranking(tema, k=TOP_GRAFICA)
+
+# Rúbrica del juez como fragmento: cada casilla solo vuelve a dibujar la rúbrica
+# y su total, con indice_prev del último rerun completo (sin releer el almacén)
+@st.fragment
+def formulario_rubrica(tema, equipo, juez, indice_prev):
+    total_puntos = 0
+    calificaciones_a_guardar = []
+    for categoria, criterios in CRITERIOS.items():
+        st.markdown(f"### {categoria}")
+        
+        for criterio in criterios:
+            col1, col2, col3 = st.columns([4, 1, 1.5])
+            
+            prev = indice_prev.get((tema, equipo, juez, categoria, criterio))
+            
+            if prev is not None:
+                cumple_prev, puntos_prev = prev
+                if cumple_prev and puntos_prev == 0:
+                    puntos_prev = 10.0
+            else:
+                cumple_prev = False
+                puntos_prev = 10.0
+            
+            with col1:
+                st.write(f"• {criterio}")
+            
+            with col2:
+                cumple = st.checkbox("✓", value=cumple_prev,
+                                     key=f"{tema}_{equipo}_{juez}_{categoria}_{criterio}")
+            
+            with col3:
+                if cumple:
+                    puntos = st.number_input("Pts", 0.0, 10.0, puntos_prev, 0.5,
+                                             key=f"{tema}_{equipo}_{juez}_{categoria}_{criterio}_pts")
+                    total_puntos += puntos
+                else:
+                    puntos = 0
+                    st.write("—")
+            
+            calificaciones_a_guardar.append({
+                'tema': tema,
+                'equipo': equipo,
+                'juez': juez,
+                'categoria': categoria,
+                'criterio': criterio,
+                'cumple': cumple,
+                'puntos': puntos
+            })
     
-    df_tema = df[df['tema'] == tema].copy()
-    if df_tema.empty:
-        return pd.DataFrame()
+    st.markdown("---")
+    col1, col2, col3 = st.columns([1,2,1])
+    with col2:
+        st.metric("🎯 TOTAL DE PUNTOS", f"{total_puntos:.1f}")
     
-    resumen = df_tema.groupby(['equipo', 'juez'])['puntos'].sum().reset_index()
-    pivot = resumen.pivot(index='equipo', columns='juez', values='puntos').fillna(0)
-    pivot['Promedio'] = pivot.mean(axis=1)
-    pivot = pivot.sort_values('Promedio', ascending=False)
-    pivot.insert(0, 'Posición', range(1, len(pivot) + 1))
-    return pivot.reset_index()
-
-def generar_excel():
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Resumen por tema
-        for tema in TEMAS:
-            df = calcular_ranking(tema)
-            if not df.empty:
-                sheet_name = tema.split('.')[1].strip()[:31]
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
+    if st.button("💾 Guardar Calificación", type="primary", use_container_width=True):
+        with st.spinner("Guardando..."):
+            # Un solo upsert con toda la rúbrica
+            resultado = guardar_calificaciones_batch(calificaciones_a_guardar)
         
-        # Detalle completo
-        df_all = obtener_calificaciones()
-        if not df_all.empty:
-            df_all.to_excel(writer, sheet_name='Detalle Completo', index=False)
+        if not resultado['ok']:
+            st.error("❌ No se guardó la calificación. Revisa los errores e intenta de nuevo.")
+            for err in resultado['errores']:
+                st.write(f"• {err['criterio']}: {err['error']}")
+            st.stop()
+            
+        # Mostrar resumen
+        st.success(f"""
+        ✅ **Calificación Guardada**
+        - Equipo: {equipo}
+        - Total: {total_puntos:.1f} pts
+        - Juez: {juez}
+        """)
+        st.caption(f"⏱️ Guardado en {resultado['latencia_ms']:.0f} ms")
+        if resultado.get('pendiente'):
+            st.caption("☁️ Se sincroniza con la base de datos en segundo plano")
+        st.balloons()
+        time.sleep(2)
+        st.rerun()
+
+# Calentamiento opcional (secrets["calentar"] = true): la primera sesión del
+# proceso, en un hilo aparte y sin esperarlo, crea el cliente y llena los caches
+# de configuración, calificaciones y ranking para los jueces que entran después
+@st.cache_resource
+def calentar_caches():
+    # Corre sin el contexto de la sesión para que los spinners de los caches no
+    # salgan en su página; se callan los avisos de "missing ScriptRunContext" del hilo
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(
+        lambda registro: registro.threadName != 'calentamiento'
+    )
+    def calentar():
+        with medir('calentamiento'):
+            config = cargar_config()
+            if config:
+                # Con el motor, el primer ranking ya carga todas las filas; con las vistas
+                # de totales se pide cada tema. Los índices son los del equipo que el
+                # selector de cada tema muestra primero
+                for tema in (TEMAS if almacen.totales_en_servidor else TEMAS[:1]):
+                    calcular_ranking(tema, k=TOP_GRAFICA)
+                for tema, equipos in config['equipos_por_tema'].items():
+                    if equipos:
+                        obtener_indice_calificaciones(tema, equipos[0])
+            import altair  # noqa: F401  (la primera vista de ranking ya no paga la importación)
+    hilo = threading.Thread(target=calentar, name='calentamiento', daemon=True)
+    hilo.start()
+    return hilo
+
+# El Excel se cachea por versión de los datos: sin calificaciones nuevas no se vuelve a generar
+@st.cache_data(max_entries=5)
+def generar_excel_version(version, _df):
+    metricas.registro.fallo_cache('excel')
+    with medir('generar_excel'):
+        return exportar.generar_excel(_df, TEMAS)
+
+# La gráfica se arma una vez por contenido del ranking: mientras no cambie se reusa
+# el mismo spec (sin importar altair ni generar nombres nuevos de parámetros),
+# así el navegador no recibe una gráfica distinta en cada refresco
+@st.cache_data(max_entries=20)
+def grafica_ranking(version, _df, tema, destacado):
+    metricas.registro.fallo_cache('grafica')
+    # Ordenar por promedio para que el degradado tenga sentido
+    df_ranking_sorted = _df.sort_values('Promedio', ascending=False).reset_index(drop=True)
     
-    output.seek(0)
-    return output
+    # altair solo se importa en las vistas con gráfica
+    import altair as alt
+
+    # Crear un campo para el color basado en la posición o el promedio
+    # Esto asignará un color desde el verde (más alto) hasta el rojo (más bajo)
+    chart = alt.Chart(df_ranking_sorted).mark_bar(stroke='black').encode(
+        # Convertimos 'equipo' a nominal para que cada equipo sea una barra separada
+        y=alt.Y('equipo:N', sort='-x', title='Equipo'), # Sort='-x' ordena por 'Promedio' descendente
+        x=alt.X('Promedio:Q', title='Puntuación Promedio'),
+        color=alt.Color(
+            'Promedio:Q', # Colorea basado en el promedio
+            scale=alt.Scale(range=['red', 'orange', 'green']), # Degradado de rojo a verde
+            legend=alt.Legend(title="Promedio") # Leyenda para la escala de color
+        ),
+        # Añadir texto con el promedio en cada barra para mayor claridad
+        text=alt.Text('Promedio:Q', format='.2f'),
+        # Borde en la barra del equipo resaltado
+        strokeWidth=alt.condition(alt.datum.equipo == destacado, alt.value(3), alt.value(0))
+    ).properties(
+        title=f"Promedio de Calificaciones por Equipo ({tema})"
+    ).interactive() # Permite zoom y pan, puedes quitar .interactive() si quieres que sea completamente estático
+    return chart.to_dict()
+
+def mostrar_grafica_ranking(df_ranking, tema, destacado):
+    metricas.registro.consulta_cache('grafica')
+    spec = grafica_ranking(exportar.version_datos(df_ranking), df_ranking, tema, destacado)
+    st.vega_lite_chart(spec, use_container_width=True)
+
+def generar_excel():
+    # Una sola foto de los datos para todas las hojas
+    metricas.registro.consulta_cache('excel')
+    df = obtener_calificaciones()
+    return generar_excel_version(exportar.version_datos(df), df)
+
+if st.secrets.get("calentar", False):
+    calentar_caches()
 
 # UI Principal
 st.title("🏆 Sistema de Calificación - Solution Challenge 2025B")
+if almacen.evento is not None:
+    st.caption(f"Evento: {almacen.evento}")
 
 # SELECTOR DE MODO EN SIDEBAR
 st.sidebar.title("🎯 Sistema de Calificación")
@@ -189,9 +537,13 @@ if st.session_state.mode == 'admin_login':
 elif st.session_state.mode == 'admin':
     st.header("⚙️ Panel de Administración")
     
-    config = cargar_config()
+    # La configuración y el ranking de la pestaña de rankings se piden a la vez
+    config, _ = en_paralelo(
+        cargar_config,
+        lambda: calcular_ranking(st.session_state.get("admin_tema_ranking", TEMAS[0]), k=TOP_GRAFICA)
+    )
     
-    tab1, tab2, tab3, tab4 = st.tabs(["📝 Configuración", "🗑️ Reiniciar Sistema", "📊 Exportar Datos","🏆 Visualizar Rankings"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📝 Configuración", "🗑️ Reiniciar Sistema", "📊 Exportar Datos","🏆 Visualizar Rankings", "📈 Métricas"])
     
     with tab1:
         st.subheader("Configuración del Sistema")
@@ -217,15 +569,20 @@ elif st.session_state.mode == 'admin':
         for tema in TEMAS:
             with st.expander(f"🎯 {tema}"):
                 default_num = 2 if not config else len(config['equipos_por_tema'].get(tema, ['', '']))
-                num_equipos = st.number_input(f"Equipos", 1, 12, default_num, key=f"n_{tema}")
-                equipos = []
-                cols = st.columns(min(3, num_equipos))
-                for i in range(num_equipos):
-                    with cols[i % 3]:
-                        default_equipo = f"Equipo {i+1}"
-                        if config and tema in config['equipos_por_tema'] and i < len(config['equipos_por_tema'][tema]):
-                            default_equipo = config['equipos_por_tema'][tema][i]
-                        equipos.append(st.text_input(f"Equipo {i+1}", default_equipo, key=f"e_{tema}_{i}"))
+                num_equipos = st.number_input(f"Equipos", 1, MAX_EQUIPOS, default_num, key=f"n_{tema}")
+                previos = config['equipos_por_tema'].get(tema, []) if config else []
+                defaults = [previos[i] if i < len(previos) else f"Equipo {i+1}" for i in range(num_equipos)]
+                if num_equipos > EQUIPOS_EN_CAMPOS:
+                    # Con muchos equipos, una lista en lugar de cientos de campos
+                    texto = st.text_area("Equipos (uno por línea)", "\n".join(defaults), height=300,
+                                         key=f"lista_{tema}_{num_equipos}")
+                    equipos = [linea.strip() for linea in texto.splitlines() if linea.strip()]
+                else:
+                    equipos = []
+                    cols = st.columns(min(3, num_equipos))
+                    for i in range(num_equipos):
+                        with cols[i % 3]:
+                            equipos.append(st.text_input(f"Equipo {i+1}", defaults[i], key=f"e_{tema}_{i}"))
                 equipos_por_tema[tema] = equipos
         
         if st.button("✅ Guardar Configuración", type="primary", use_container_width=True):
@@ -237,11 +594,29 @@ elif st.session_state.mode == 'admin':
         st.warning("⚠️ Esta acción borrará TODAS las calificaciones y configuraciones")
         if st.checkbox("Confirmo que quiero borrar todo"):
             if st.button("🗑️ BORRAR TODO", type="secondary"):
-                supabase.table('config').delete().neq('id', 0).execute()
-                supabase.table('calificaciones').delete().neq('id', 0).execute()
-                obtener_calificaciones.clear()
+                if init_diario() is not None:
+                    init_diario().descartar()
+                almacen.borrar_todo()
+                obtener_version_config.clear()
+                limpiar_cache_calificaciones(compartida=True)
+                init_motor_ranking().invalidar()
                 st.success("✅ Sistema reiniciado")
                 st.rerun()
+
+        if almacen.evento is not None:
+            st.divider()
+            st.subheader("🗄️ Archivar eventos anteriores")
+            st.caption("Archivar desprende las tablas del evento: sus calificaciones se conservan "
+                       "pero ya no se consultan.")
+            anteriores = [e['evento'] for e in almacen.eventos()
+                          if not e['archivado'] and e['evento'] != almacen.evento]
+            if not anteriores:
+                st.info("No hay eventos anteriores sin archivar")
+            for evento in anteriores:
+                if st.button(f"Archivar {evento}", key=f"archivar_{evento}"):
+                    almacen.archivar_evento(evento)
+                    st.success(f"✅ Evento {evento} archivado")
+                    st.rerun()
     # En el tab3 del admin:
     with tab3:
         st.subheader("📥 Exportar Resultados")
@@ -250,7 +625,7 @@ elif st.session_state.mode == 'admin':
             st.download_button(
                 "⬇️ Descargar Excel",
                 excel,
-                f"resultados_challenge_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
+                f"resultados_{almacen.evento or 'challenge'}_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
                 "application/vnd.ms-excel"
             )
 
@@ -259,15 +634,17 @@ elif st.session_state.mode == 'admin':
         
         # Selector de tema
         tema_mostrar = st.selectbox("Selecciona el tema:", TEMAS, index=0, key="admin_tema_ranking")
+        equipos_tema = config['equipos_por_tema'].get(tema_mostrar, []) if config else []
+        destacado = st.selectbox("⭐ Resaltar equipo:", [None] + equipos_tema,
+                                 format_func=lambda e: e or "Ninguno", key="admin_destacado")
         
         # Auto-refresh para proyección
-        auto_refresh = st.checkbox("🔄 Auto-actualizar cada 5 segundos", key="admin_refresh")
+        auto_refresh = st.checkbox("🔄 Auto-actualizar con cada calificación nueva", key="admin_refresh")
         if auto_refresh:
-            time.sleep(5)
-            st.rerun()
+            esperar_cambios(tema_mostrar, "version_admin", 5)
         
-        # Mostrar ranking grande para proyectar
-        df_ranking = calcular_ranking(tema_mostrar)
+        # Mostrar ranking grande para proyectar: podio y gráfica solo con el top y el equipo resaltado
+        df_ranking = calcular_ranking(tema_mostrar, k=TOP_GRAFICA, incluir=(destacado,) if destacado else ())
         
         if not df_ranking.empty:
             # Podio visual más grande
@@ -290,28 +667,8 @@ elif st.session_state.mode == 'admin':
             st.subheader("Gráfico de Promedios")
 
             if not df_ranking.empty:
-                # Ordenar por promedio para que el degradado tenga sentido
-                df_ranking_sorted = df_ranking.sort_values('Promedio', ascending=False).reset_index(drop=True)
-                
-                # Crear un campo para el color basado en la posición o el promedio
-                # Esto asignará un color desde el verde (más alto) hasta el rojo (más bajo)
-                chart = alt.Chart(df_ranking_sorted).mark_bar().encode(
-                    # Convertimos 'equipo' a nominal para que cada equipo sea una barra separada
-                    y=alt.Y('equipo:N', sort='-x', title='Equipo'), # Sort='-x' ordena por 'Promedio' descendente
-                    x=alt.X('Promedio:Q', title='Puntuación Promedio'),
-                    color=alt.Color(
-                        'Promedio:Q', # Colorea basado en el promedio
-                        scale=alt.Scale(range=['red', 'orange', 'green']), # Degradado de rojo a verde
-                        legend=alt.Legend(title="Promedio") # Leyenda para la escala de color
-                    ),
-                    # Añadir texto con el promedio en cada barra para mayor claridad
-                    text=alt.Text('Promedio:Q', format='.2f') 
-                ).properties(
-                    title=f"Promedio de Calificaciones por Equipo ({tema_mostrar})"
-                ).interactive() # Permite zoom y pan, puedes quitar .interactive() si quieres que sea completamente estático
-
-                # Mostrar la gráfica en Streamlit
-                st.altair_chart(chart, use_container_width=True)
+                # El spec se reusa mientras el ranking no cambie
+                mostrar_grafica_ranking(df_ranking, tema_mostrar, destacado)
 
             else:
                 st.warning("No hay calificaciones para mostrar en el gráfico.")
@@ -332,8 +689,11 @@ elif st.session_state.mode == 'admin':
             </style>
             """, unsafe_allow_html=True)
             
+            # Por páginas: al navegador solo viajan las filas de la página
+            n_paginas = max(1, -(-contar_ranking(tema_mostrar) // TAMANO_PAGINA))
+            pagina = st.number_input("Página", 1, n_paginas, 1, key="admin_pagina") if n_paginas > 1 else 1
             st.dataframe(
-                df_ranking, 
+                calcular_ranking(tema_mostrar, k=TAMANO_PAGINA, inicio=(pagina - 1) * TAMANO_PAGINA), 
                 use_container_width=True, 
                 hide_index=True,
                 height=600
@@ -344,10 +704,63 @@ elif st.session_state.mode == 'admin':
         else:
             st.warning("No hay calificaciones registradas para este tema")
 
+    with tab5:
+        st.subheader("📈 Métricas del Proceso")
+        st.caption("Tiempos de esta réplica desde " +
+                   datetime.fromtimestamp(metricas.registro.desde).strftime('%Y-%m-%d %H:%M:%S'))
+        tabla_metricas = metricas.registro.tabla()
+        if tabla_metricas:
+            st.dataframe(pd.DataFrame(tabla_metricas), use_container_width=True, hide_index=True)
+        else:
+            st.info("Aún no hay operaciones medidas")
+
+        diario = init_diario()
+        if diario is not None:
+            pendientes = diario.pendientes()
+            st.markdown(f"**Envíos pendientes de sincronizar:** {sum(pendientes.values())}")
+            if pendientes:
+                st.dataframe(pd.DataFrame([{'Juez': j, 'Pendientes': n} for j, n in pendientes.items()]),
+                             use_container_width=True, hide_index=True)
+            rechazados = diario.rechazados()
+            if rechazados:
+                st.markdown(f"**Envíos rechazados (no se reintentan):** {sum(n for n, _ in rechazados.values())}")
+                st.dataframe(pd.DataFrame([{'Juez': j, 'Rechazados': n, 'Último error': e}
+                                           for j, (n, e) in rechazados.items()]),
+                             use_container_width=True, hide_index=True)
+            if diario.fallos_al_sincronizar:
+                st.markdown(f"**Lotes sincronizados sin aplicar al cache:** {diario.fallos_al_sincronizar}")
+            if diario.ultimo_error:
+                st.warning(f"Último error de sincronización: {diario.ultimo_error}")
+
+        caches = metricas.registro.instantanea()['caches']
+        if caches:
+            st.markdown("**Cache**")
+            st.dataframe(
+                pd.DataFrame([{'Cache': nombre, **datos} for nombre, datos in caches.items()]),
+                use_container_width=True, hide_index=True
+            )
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.download_button("⬇️ JSON", metricas.registro.a_json(), "metricas.json", "application/json",
+                               use_container_width=True)
+        with col2:
+            st.download_button("⬇️ Prometheus", metricas.registro.a_prometheus(), "metricas.prom", "text/plain",
+                               use_container_width=True)
+        with col3:
+            if st.button("🔄 Reiniciar métricas", use_container_width=True):
+                metricas.registro.reiniciar()
+                st.rerun()
+
 # MODO JUEZ
 # MODO JUEZ
 elif st.session_state.mode == 'juez':
-    config = cargar_config()
+    ultima_pagina = st.session_state.get('ultima_pagina_juez')
+    if ultima_pagina and st.session_state.get('juez_autenticado', False):
+        # Casi siempre el rerun es sobre el mismo tema y equipo: sus datos se piden junto con la config
+        config, _ = en_paralelo(cargar_config, lambda: precargar_pagina_juez(*ultima_pagina))
+    else:
+        config = cargar_config()
     
     if not config:
         st.error("❌ No hay configuración inicial. Solicita al administrador que configure el sistema.")
@@ -405,6 +818,8 @@ elif st.session_state.mode == 'juez':
         # Panel de juez en sidebar
         st.sidebar.markdown("---")
         st.sidebar.subheader(f"👤 Juez: {juez_actual}")
+        with st.sidebar:
+            mostrar_pendientes(juez_actual)
         
         if st.sidebar.button("🔐 Cerrar Sesión", use_container_width=True):
             del st.session_state.juez_autenticado
@@ -417,11 +832,9 @@ elif st.session_state.mode == 'juez':
         modo = st.sidebar.radio("Modo:", ["📝 Calificar", "📊 Ver Ranking"])
         
         if modo == "📊 Ver Ranking":
-            auto_refresh = st.sidebar.checkbox("🔄 Auto-actualizar cada 3s")
+            auto_refresh = st.sidebar.checkbox("🔄 Auto-actualizar")
             if auto_refresh:
-                import time
-                time.sleep(3)
-                st.rerun()
+                esperar_cambios(tema_actual, "version_juez", 3)
         
         # --- (AQUÍ EMPIEZA TU CÓDIGO ORIGINAL) ---
         
@@ -431,23 +844,15 @@ elif st.session_state.mode == 'juez':
             st.info(f"**Juez:** {juez_actual}")
             
             equipo = st.selectbox("🎪 Equipo a calificar:", equipos_por_tema[tema_actual])
+            st.session_state.ultima_pagina_juez = ('calificar', tema_actual, equipo)
+            # En el ranking se resalta el último equipo que calificó en el tema
+            st.session_state.setdefault('equipo_calificado', {})[tema_actual] = equipo
             
             st.markdown("---")
-            total_puntos = 0
-            df_prev = obtener_calificaciones()
-            calificaciones_a_guardar = []
-             # NUEVA VERIFICACIÓN DE SEGURIDAD (Si df_prev NO está vacío):
-            if not df_prev.empty:
-                # Si el DF NO está vacío, entonces filtramos:
-                df_team = df_prev[
-                    (df_prev['tema'] == tema_actual) & 
-                    (df_prev['equipo'] == equipo)
-                ]
-            else:
-                # Si el DF está vacío, inicializamos df_team como vacío para evitar el KeyError
-                df_team = pd.DataFrame()
+            # Solo las filas del equipo actual, ya indexadas
+            indice_prev = obtener_indice_calificaciones(tema_actual, equipo)
 
-            jueces_calificaron = df_team['juez'].unique() if not df_team.empty else []
+            jueces_calificaron = {llave[2] for llave in indice_prev}
 
             col1, col2 = st.columns([3, 1])
             with col1:
@@ -460,94 +865,23 @@ elif st.session_state.mode == 'juez':
                 faltan = [j for j in jueces if j not in jueces_calificaron]
                 st.warning(f"⏳ Faltan: {', '.join(faltan)}")
             
-            for categoria, criterios in CRITERIOS.items():
-                st.markdown(f"### {categoria}")
-                
-                for criterio in criterios:
-                    col1, col2, col3 = st.columns([4, 1, 1.5])
-                    
-                    prev = df_prev[
-                        (df_prev['tema'] == tema_actual) &
-                        (df_prev['equipo'] == equipo) &
-                        (df_prev['juez'] == juez_actual) &
-                        (df_prev['categoria'] == categoria) &
-                        (df_prev['criterio'] == criterio)
-                    ] if not df_prev.empty else pd.DataFrame()
-                    
-                    if not prev.empty:
-                        cumple_str = str(prev.iloc[0]['cumple']).strip().upper()
-                        cumple_prev = (cumple_str == "TRUE")
-                        puntos_prev = float(prev.iloc[0]['puntos'])
-                        if cumple_prev and puntos_prev == 0:
-                            puntos_prev = 10.0
-                    else:
-                        cumple_prev = False
-                        puntos_prev = 10.0
-                    
-                    with col1:
-                        st.write(f"• {criterio}")
-                    
-                    with col2:
-                        cumple = st.checkbox("✓", value=cumple_prev, 
-                                           key=f"{tema_actual}_{equipo}_{juez_actual}_{categoria}_{criterio}")
-                    
-                    with col3:
-                        if cumple:
-                            puntos = st.number_input("Pts", 0.0, 10.0, puntos_prev, 0.5,
-                                                   key=f"{tema_actual}_{equipo}_{juez_actual}_{categoria}_{criterio}_pts")
-                            total_puntos += puntos
-                        else:
-                            puntos = 0
-                            st.write("—")
-                    
-                    calificaciones_a_guardar.append({
-                        'tema': tema_actual,
-                        'equipo': equipo,
-                        'juez': juez_actual,
-                        'categoria': categoria,
-                        'criterio': criterio,
-                        'cumple': cumple,
-                        'puntos': puntos
-                    })
-            
-            st.markdown("---")
-            col1, col2, col3 = st.columns([1,2,1])
-            with col2:
-                st.metric("🎯 TOTAL DE PUNTOS", f"{total_puntos:.1f}")
-            
-            if st.button("💾 Guardar Calificación", type="primary", use_container_width=True):
-                progress_bar = st.progress(0)
-                status = st.empty()
-                
-                with st.spinner("Guardando..."):
-                    total_items = len(calificaciones_a_guardar)
-                    for i, calif in enumerate(calificaciones_a_guardar):
-                        guardar_calificacion(
-                            calif['tema'], calif['equipo'], calif['juez'],
-                            calif['categoria'], calif['criterio'],
-                            calif['cumple'], calif['puntos']
-                        )
-                        progress_bar.progress((i + 1) / total_items)
-                    
-                    obtener_calificaciones.clear()
-                    progress_bar.empty()
-                    
-                # Mostrar resumen
-                st.success(f"""
-                ✅ **Calificación Guardada**
-                - Equipo: {equipo}
-                - Total: {total_puntos:.1f} pts
-                - Juez: {juez_actual}
-                """)
-                st.balloons()
-                time.sleep(2)
-                st.rerun()
+            # La página completa (y sus lecturas) corre al guardar o al cambiar de equipo
+            formulario_rubrica(tema_actual, equipo, juez_actual, indice_prev)
         
         # RANKING
         else:
             st.header(f"📊 Ranking - {tema_actual}")
+            st.session_state.ultima_pagina_juez = ('ranking', tema_actual, None)
+
+            equipos_tema = equipos_por_tema[tema_actual]
+            opciones = [None] + equipos_tema
+            previo = st.session_state.get('equipo_calificado', {}).get(tema_actual)
+            destacado = st.selectbox("⭐ Resaltar equipo:", opciones,
+                                     index=opciones.index(previo) if previo in opciones else 0,
+                                     format_func=lambda e: e or "Ninguno", key=f"destacado_{tema_actual}")
             
-            df_ranking = calcular_ranking(tema_actual)
+            # Podio y gráfica: el top y el equipo resaltado, sin importar cuántos equipos haya
+            df_ranking = calcular_ranking(tema_actual, k=TOP_GRAFICA, incluir=(destacado,) if destacado else ())
             
             if not df_ranking.empty:
                 if len(df_ranking) >= 3:
@@ -567,33 +901,19 @@ elif st.session_state.mode == 'juez':
                 st.subheader("Gráfico de Promedios")
 
                 if not df_ranking.empty:
-                    # Ordenar por promedio para que el degradado tenga sentido
-                    df_ranking_sorted = df_ranking.sort_values('Promedio', ascending=False).reset_index(drop=True)
-                    
-                    # Crear un campo para el color basado en la posición o el promedio
-                    # Esto asignará un color desde el verde (más alto) hasta el rojo (más bajo)
-                    chart = alt.Chart(df_ranking_sorted).mark_bar().encode(
-                        # Convertimos 'equipo' a nominal para que cada equipo sea una barra separada
-                        y=alt.Y('equipo:N', sort='-x', title='Equipo'), # Sort='-x' ordena por 'Promedio' descendente
-                        x=alt.X('Promedio:Q', title='Puntuación Promedio'),
-                        color=alt.Color(
-                            'Promedio:Q', # Colorea basado en el promedio
-                            scale=alt.Scale(range=['red', 'orange', 'green']), # Degradado de rojo a verde
-                            legend=alt.Legend(title="Promedio") # Leyenda para la escala de color
-                        ),
-                        # Añadir texto con el promedio en cada barra para mayor claridad
-                        text=alt.Text('Promedio:Q', format='.2f') 
-                    ).properties(
-                        title=f"Promedio de Calificaciones por Equipo ({tema_actual})"
-                    ).interactive() # Permite zoom y pan, puedes quitar .interactive() si quieres que sea completamente estático
-
-                    # Mostrar la gráfica en Streamlit
-                    st.altair_chart(chart, use_container_width=True)
+                    # El spec se reusa mientras el ranking no cambie
+                    mostrar_grafica_ranking(df_ranking, tema_actual, destacado)
 
                 else:
                     st.warning("No hay calificaciones para mostrar en el gráfico.")        
                 
                 st.markdown("---")
-                st.dataframe(df_ranking, use_container_width=True, hide_index=True)
+                n_paginas = max(1, -(-contar_ranking(tema_actual) // TAMANO_PAGINA))
+                pagina = st.number_input("Página", 1, n_paginas, 1, key="juez_pagina") if n_paginas > 1 else 1
+                st.dataframe(calcular_ranking(tema_actual, k=TAMANO_PAGINA, inicio=(pagina - 1) * TAMANO_PAGINA),
+                             use_container_width=True, hide_index=True)
             else:
-                st.warning("No hay calificaciones aún")
\ No newline at end of file
+                st.warning("No hay calificaciones aún")
+
+# Duración del rerun completo; los que terminan con st.stop() o st.rerun() no llegan aquí
+metricas.registro.observar('rerun', (time.perf_counter() - inicio_rerun) * 1000)
@@ -3,42 +3,21 @@ import gspread
 from google.oauth2.service_account import Credentials
 import pandas as pd
 from datetime import datetime
+import threading
 import time
+from almacen import SheetsStore
+from exportar import version_datos
+from puntajes import indexar_calificaciones
+from ranking import calcular_ranking_df, TAMANO_PAGINA
+from rubrica import TEMAS, CRITERIOS, MAX_EQUIPOS, EQUIPOS_EN_CAMPOS
+import metricas
+from metricas import medir
+
+inicio_rerun = time.perf_counter()
 
 # Configuración
 st.set_page_config(page_title="Sistema de Calificación", page_icon="🏆", layout="wide")
 
-TEMAS = [
-    "1. SOP - Síndrome de Ovario Poliquístico",
-    "2. Interfaz IA El Castillo de Tequila", 
-    "3. Pronóstico de Demanda Grupo Collins",
-    "4. Conflicto Vial López Mateos"
-]
-
-CRITERIOS = {
-    "FORMALIDAD DE LA PRESENTACIÓN": [
-        "Se presentó el día y la hora establecidos",
-        "Se respetó el tiempo de duración de la exposición",
-        "La vestimenta es casual formal"
-    ],
-    "HABILIDADES COMUNICATIVAS": [
-        "Habla de forma natural, sin titubeos, haciendo fluido el mensaje",
-        "Utiliza una postura corporal con la que muestra seguridad de lo que está hablando",
-        "La transmisión del mensaje es efectiva"
-    ],
-    "DOMINIO DEL TEMA": [
-        "Muestra excelente dominio del tema",
-        "Puede contestar con precisión todas las preguntas planteadas"
-    ],
-    "SOLUTION VALUE": [
-        "Identificó con precisión las variables",
-        "El método es claro y consiso",
-        "El razonamiento matemático es claro y congruente",
-        "La interpretación matemática es fiable",
-        "La solution aporta valor agregado, creatividad e innovación"
-    ]
-}
-
 # Cache de conexión
 @st.cache_resource
 def get_google_sheet():
@@ -50,124 +29,204 @@ def get_google_sheet():
         ]
     )
     gc = gspread.authorize(credentials)
-    return gc.open(st.secrets["sheet_name"])
+    with medir('gspread.open'):
+        return gc.open(st.secrets["sheet_name"])
 
+# Encabezados de cada hoja y filas con las que se crea si no existe
+HOJAS = {
+    "Config": (['Timestamp', 'Jueces', 'EquiposPorTema'], 100),
+    "Calificaciones": (['Tema', 'Equipo', 'Juez', 'Categoria', 'Criterio', 'Cumple', 'Puntos', 'Timestamp'], 10000),
+}
+
+# Un solo lock por proceso para que dos sesiones no creen la misma hoja
 @st.cache_resource
-def init_sheets():
-    spreadsheet = get_google_sheet()
-    
-    try:
-        config_sheet = spreadsheet.worksheet("Config")
-    except gspread.exceptions.WorksheetNotFound:
-        config_sheet = spreadsheet.add_worksheet("Config", rows=100, cols=10)
-        config_sheet.update('A1:C1', [['Timestamp', 'Jueces', 'EquiposPorTema']])
-    
+def lock_hojas():
+    return threading.Lock()
+
+def crear_hoja(spreadsheet, titulo):
+    encabezados, filas = HOJAS[titulo]
     try:
-        calif_sheet = spreadsheet.worksheet("Calificaciones")
-    except gspread.exceptions.WorksheetNotFound:
-        calif_sheet = spreadsheet.add_worksheet("Calificaciones", rows=10000, cols=10)
-        calif_sheet.update('A1:H1', [['Tema', 'Equipo', 'Juez', 'Categoria', 'Criterio', 'Cumple', 'Puntos', 'Timestamp']])
-    
-    return config_sheet, calif_sheet
+        hoja = spreadsheet.add_worksheet(titulo, rows=filas, cols=10)
+    except gspread.exceptions.APIError:
+        # Otra réplica la creó entre la lectura de metadatos y este intento
+        return spreadsheet.worksheet(titulo)
+    hoja.update(values=[encabezados], range_name=f"A1:{chr(ord('A') + len(encabezados) - 1)}1")
+    return hoja
 
-# Inicializar hojas
+# Handles de las hojas, resueltos una vez por proceso: una sola llamada de
+# metadatos en lugar de un worksheets() antes de cada lectura o escritura
+@st.cache_resource
 def init_sheets():
     spreadsheet = get_google_sheet()
-    
-    # Obtener lista de hojas existentes
-    existing_sheets = [sheet.title for sheet in spreadsheet.worksheets()]
-    
-    # Config
-    if "Config" not in existing_sheets:
-        config_sheet = spreadsheet.add_worksheet("Config", rows=100, cols=10)
-        config_sheet.update('A1:C1', [['Timestamp', 'Jueces', 'EquiposPorTema']])
-    else:
-        config_sheet = spreadsheet.worksheet("Config")
-    
-    # Calificaciones
-    if "Calificaciones" not in existing_sheets:
-        calif_sheet = spreadsheet.add_worksheet("Calificaciones", rows=10000, cols=10)
-        calif_sheet.update('A1:H1', [['Tema', 'Equipo', 'Juez', 'Categoria', 'Criterio', 'Cumple', 'Puntos', 'Timestamp']])
-    else:
-        calif_sheet = spreadsheet.worksheet("Calificaciones")
-    
+    with lock_hojas():
+        with medir('gspread.worksheets'):
+            existentes = {hoja.title: hoja for hoja in spreadsheet.worksheets()}
+        hojas = []
+        for titulo in ("Config", "Calificaciones"):
+            hoja = existentes.get(titulo)
+            hojas.append(hoja if hoja is not None else crear_hoja(spreadsheet, titulo))
+    config_sheet, calif_sheet = hojas
     return config_sheet, calif_sheet
 
+# Todas las lecturas y escrituras pasan por el almacén de Google Sheets.
+# Es un recurso del proceso para que las filas ya leídas sobrevivan a los reruns
+# y cada refresco solo baje las nuevas.
+# Cada compactar_cada segundos (secrets, 0 = nunca) un hilo reescribe la hoja
+# sin las calificaciones reemplazadas para que las lecturas sigan siendo chicas.
+@st.cache_resource
+def init_almacen():
+    almacen = SheetsStore(init_sheets)
+    cada = st.secrets.get("compactar_cada", 300)
+    if cada:
+        almacen.iniciar_compactacion(cada)
+    return almacen
+
+almacen = init_almacen()
+
 # Guardar configuración
 def guardar_config(jueces, equipos_por_tema):
-    config_sheet, _ = init_sheets()
-    config_sheet.append_row([
-        str(datetime.now()),
-        str(jueces),
-        str(equipos_por_tema)
-    ])
+    almacen.guardar_config(jueces, equipos_por_tema)
+    obtener_version_config.clear()
+
+# Versión de la configuración: número de filas y timestamp de la última.
+# Solo baja la columna A, no toda la hoja.
+@st.cache_data(ttl=5)
+def obtener_version_config():
+    metricas.registro.fallo_cache('config')
+    return almacen.version_config()
+
+# La fila de una versión se lee y se parsea una sola vez
+@st.cache_data(max_entries=10)
+def cargar_config_version(version):
+    with medir('cargar_config'):
+        return almacen.cargar_config(version)
 
 # Cargar configuración
 def cargar_config():
-    config_sheet, _ = init_sheets()
-    values = config_sheet.get_all_values()
-    if len(values) > 1:
-        last_config = values[-1]
-        return {
-            'jueces': eval(last_config[1]),
-            'equipos_por_tema': eval(last_config[2])
-        }
-    return None
+    metricas.registro.consulta_cache('config')
+    version = obtener_version_config()
+    if version is None:
+        return None
+    return cargar_config_version(version)
 
-# Guardar calificaciones por lote
+# Guardar calificaciones por lote (un solo append_rows)
 def guardar_calificaciones_batch(calificaciones):
-    _, calif_sheet = init_sheets()
-    # Convertir a lista de listas
-    rows = []
-    timestamp = str(datetime.now())
-    for calif in calificaciones:
-        rows.append([
-            calif['tema'],
-            calif['equipo'],
-            calif['juez'],
-            calif['categoria'],
-            calif['criterio'],
-            calif['cumple'],
-            calif['puntos'],
-            timestamp
-        ])
-    
-    # Guardar todas de una vez
-    if rows:
-        calif_sheet.append_rows(rows)
+    with medir('guardar_calificacion'):
+        resultado = almacen.guardar_lote(calificaciones)
+    metricas.contar('guardados', resultado='ok' if resultado['ok'] else 'error')
+    return resultado
 
 # Obtener calificaciones existentes
-@st.cache_data(ttl=5)
 def obtener_calificaciones():
-    _, calif_sheet = init_sheets()
-    values = calif_sheet.get_all_records()
-    if not values:  # Si está vacía
-        return pd.DataFrame(columns=['Tema', 'Equipo', 'Juez', 'Categoria', 'Criterio', 'Cumple', 'Puntos', 'Timestamp'])
-    return pd.DataFrame(values)
+    metricas.registro.consulta_cache('calificaciones')
+    return _obtener_calificaciones()
+
+@st.cache_data(ttl=5)
+def _obtener_calificaciones():
+    metricas.registro.fallo_cache('calificaciones')
+    with medir('obtener_calificaciones'):
+        return almacen.consultar()
+
+# Índice (tema, equipo, juez, categoria, criterio) -> (cumple, puntos)
+def obtener_indice_calificaciones():
+    metricas.registro.consulta_cache('indice')
+    return _obtener_indice_calificaciones()
 
-# Obtener ranking
+@st.cache_data(ttl=5)
+def _obtener_indice_calificaciones():
+    metricas.registro.fallo_cache('indice')
+    return indexar_calificaciones(obtener_calificaciones())
+
+def limpiar_cache_calificaciones():
+    _obtener_calificaciones.clear()
+    _obtener_indice_calificaciones.clear()
+
+# Obtener ranking: se calcula una vez por versión de los datos y el podio y
+# las páginas son rebanadas de ese mismo resultado
+@metricas.medido('calcular_ranking')
 def calcular_ranking(tema):
     df = obtener_calificaciones()
     if df.empty:
         return pd.DataFrame()
+    metricas.registro.consulta_cache('ranking')
+    return _calcular_ranking_version(version_datos(df), df, tema)
+
+@st.cache_data(max_entries=20)
+def _calcular_ranking_version(version, _df, tema):
+    metricas.registro.fallo_cache('ranking')
+    return calcular_ranking_df(_df, tema).rename(columns={'equipo': 'Equipo'})
+
+# Rúbrica como fragmento: cada casilla solo vuelve a dibujar la rúbrica y su
+# total, con el índice del último rerun completo (sin volver a leer la hoja)
+@st.fragment
+def formulario_rubrica(tema, equipo, juez, indice_previas):
+    total_puntos = 0
+    calificaciones_actuales = []
     
-    # Filtrar por tema
-    df_tema = df[df['Tema'] == tema].copy()
-    
-    # Calcular puntos por juez
-    resumen = df_tema.groupby(['Equipo', 'Juez'])['Puntos'].sum().reset_index()
-    
-    # Pivotar para tener jueces como columnas
-    pivot = resumen.pivot(index='Equipo', columns='Juez', values='Puntos').fillna(0)
-    
-    # Calcular promedio
-    pivot['Promedio'] = pivot.mean(axis=1)
+    for categoria, criterios in CRITERIOS.items():
+        st.markdown(f"### {categoria}")
+        
+        for criterio in criterios:
+            col1, col2, col3 = st.columns([4, 1, 1.5])
+            
+            # Buscar calificación previa
+            prev = indice_previas.get((tema, equipo, juez, categoria, criterio))
+            
+            if prev is not None:
+                cumple_prev, puntos_prev = prev
+                # Fix para datos malos
+                if cumple_prev and puntos_prev == 0.0:
+                    puntos_prev = 10.0
+            else:
+                cumple_prev = False
+                puntos_prev = 10.0
+            
+            with col1:
+                st.write(f"• {criterio}")
+            
+            with col2:
+                cumple = st.checkbox("✓", value=cumple_prev,
+                                     key=f"{tema}_{equipo}_{juez}_{categoria}_{criterio}")
+            
+            with col3:
+                if cumple:
+                    puntos = st.number_input("Pts", 0.0, 10.0, puntos_prev, 0.5,
+                                             key=f"{tema}_{equipo}_{juez}_{categoria}_{criterio}_pts")
+                    total_puntos += puntos
+                else:
+                    puntos = 0
+                    st.write("—")
+            
+            # Agregar a lista temporal
+            calificaciones_actuales.append({
+                'tema': tema,
+                'equipo': equipo,
+                'juez': juez,
+                'categoria': categoria,
+                'criterio': criterio,
+                'cumple': cumple,
+                'puntos': puntos
+            })
     
-    # Ordenar y agregar posición
-    pivot = pivot.sort_values('Promedio', ascending=False)
-    pivot.insert(0, 'Posición', range(1, len(pivot) + 1))
+    st.markdown("---")
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        st.metric("🎯 TOTAL", f"{total_puntos:.1f} pts")
     
-    return pivot.reset_index()
+    # Guardar
+    if st.button("💾 Guardar Calificación", type="primary", use_container_width=True):
+        with st.spinner("Guardando..."):
+            resultado = guardar_calificaciones_batch(calificaciones_actuales)
+        if not resultado['ok']:
+            st.error("❌ No se guardó la calificación. Intenta de nuevo.")
+            for err in resultado['errores']:
+                st.write(f"• {err['criterio']}: {err['error']}")
+            st.stop()
+        st.success(f"✅ Guardado: {equipo} por {juez}")
+        time.sleep(1)
+        # Limpiar cache
+        limpiar_cache_calificaciones()
+        st.rerun()
 
 # UI Principal
 st.title("🏆 Sistema de Calificación - Solution Challenge 2025B")
@@ -197,12 +256,18 @@ if not config:
     
     for tema in TEMAS:
         with st.expander(f"🎯 {tema}"):
-            num_equipos = st.number_input(f"Equipos", 1, 12, 2, key=f"n_{tema}")
-            equipos = []
-            cols = st.columns(min(3, num_equipos))
-            for i in range(num_equipos):
-                with cols[i % 3]:
-                    equipos.append(st.text_input(f"Equipo {i+1}", f"Equipo {i+1}", key=f"e_{tema}_{i}"))
+            num_equipos = st.number_input(f"Equipos", 1, MAX_EQUIPOS, 2, key=f"n_{tema}")
+            if num_equipos > EQUIPOS_EN_CAMPOS:
+                # Con muchos equipos, una lista en lugar de cientos de campos
+                texto = st.text_area("Equipos (uno por línea)", "\n".join(f"Equipo {i+1}" for i in range(num_equipos)),
+                                     height=300, key=f"lista_{tema}_{num_equipos}")
+                equipos = [linea.strip() for linea in texto.splitlines() if linea.strip()]
+            else:
+                equipos = []
+                cols = st.columns(min(3, num_equipos))
+                for i in range(num_equipos):
+                    with cols[i % 3]:
+                        equipos.append(st.text_input(f"Equipo {i+1}", f"Equipo {i+1}", key=f"e_{tema}_{i}"))
             equipos_por_tema[tema] = equipos
     
     if st.button("✅ Iniciar Competencia", type="primary", use_container_width=True):
@@ -230,6 +295,14 @@ else:
     # Botón para abrir Google Sheet
     st.sidebar.markdown("---")
     st.sidebar.markdown(f"[📊 Abrir Google Sheet](https://docs.google.com/spreadsheets/d/{st.secrets['sheet_id']})")
+
+    # Esta app no tiene panel de administración: las métricas van en la barra lateral
+    with st.sidebar.expander("📈 Métricas"):
+        tabla_metricas = metricas.registro.tabla()
+        if tabla_metricas:
+            st.dataframe(pd.DataFrame(tabla_metricas), hide_index=True)
+        st.download_button("⬇️ JSON", metricas.registro.a_json(), "metricas.json", "application/json")
+        st.download_button("⬇️ Prometheus", metricas.registro.a_prometheus(), "metricas.prom", "text/plain")
     
     # MODO CALIFICAR
     if modo == "📝 Calificar":
@@ -247,79 +320,11 @@ else:
         if 'temp_calif' not in st.session_state:
             st.session_state.temp_calif = []
         
-        total_puntos = 0
-        calificaciones_actuales = []
-        
         # Obtener calificaciones previas
-        df_previas = obtener_calificaciones()
+        indice_previas = obtener_indice_calificaciones()
         
-        for categoria, criterios in CRITERIOS.items():
-            st.markdown(f"### {categoria}")
-            
-            for criterio in criterios:
-                col1, col2, col3 = st.columns([4, 1, 1.5])
-                
-                # Buscar calificación previa
-                prev = df_previas[
-                    (df_previas['Tema'] == tema_actual) &
-                    (df_previas['Equipo'] == equipo) &
-                    (df_previas['Juez'] == juez) &
-                    (df_previas['Categoria'] == categoria) &
-                    (df_previas['Criterio'] == criterio)
-                ]
-                
-                if not prev.empty:
-                    cumple_prev = prev.iloc[0]['Cumple']
-                    puntos_prev = float(prev.iloc[0]['Puntos'])
-                    # Fix para datos malos
-                    if cumple_prev and puntos_prev == 0.0:
-                        puntos_prev = 10.0
-                else:
-                    cumple_prev = False
-                    puntos_prev = 10.0
-                
-                with col1:
-                    st.write(f"• {criterio}")
-                
-                with col2:
-                    cumple = st.checkbox("✓", value=cumple_prev, 
-                                       key=f"{tema_actual}_{equipo}_{juez}_{categoria}_{criterio}")
-                
-                with col3:
-                    if cumple:
-                        puntos = st.number_input("Pts", 0.0, 10.0, puntos_prev, 0.5,
-                                               key=f"{tema_actual}_{equipo}_{juez}_{categoria}_{criterio}_pts")
-                        total_puntos += puntos
-                    else:
-                        puntos = 0
-                        st.write("—")
-                
-                # Agregar a lista temporal
-                calificaciones_actuales.append({
-                    'tema': tema_actual,
-                    'equipo': equipo,
-                    'juez': juez,
-                    'categoria': categoria,
-                    'criterio': criterio,
-                    'cumple': cumple,
-                    'puntos': puntos
-                })
-        
-        st.markdown("---")
-        col1, col2, col3 = st.columns([1, 2, 1])
-        with col2:
-            st.metric("🎯 TOTAL", f"{total_puntos:.1f} pts")
-        
-        # Guardar
-        if st.button("💾 Guardar Calificación", type="primary", use_container_width=True):
-            with st.spinner("Guardando..."):
-                # Limpiar calificaciones previas del mismo juez/equipo/tema
-                guardar_calificaciones_batch(calificaciones_actuales)
-                st.success(f"✅ Guardado: {equipo} por {juez}")
-                time.sleep(1)
-                # Limpiar cache
-                obtener_calificaciones.clear()
-                st.rerun()
+        # La página completa (y sus lecturas) corre al guardar o al cambiar de equipo o juez
+        formulario_rubrica(tema_actual, equipo, juez, indice_previas)
         
         # Mostrar estado
         sync_status.info(f"✅ Conectado a Google Sheets")
@@ -328,6 +333,7 @@ else:
     else:
         st.header(f"📊 Ranking - {tema_actual}")
         
+        # Un solo cálculo por rerun: el podio usa los tres primeros y la tabla va por páginas
         df_ranking = calcular_ranking(tema_actual)
         
         if not df_ranking.empty:
@@ -348,9 +354,16 @@ else:
                     st.metric("", f"{df_ranking.iloc[2]['Promedio']:.2f}")
             
             st.markdown("---")
-            st.dataframe(df_ranking, use_container_width=True, hide_index=True)
+            n_paginas = max(1, -(-len(df_ranking) // TAMANO_PAGINA))
+            pagina = st.number_input("Página", 1, n_paginas, 1, key="pagina_ranking") if n_paginas > 1 else 1
+            inicio_pagina = (pagina - 1) * TAMANO_PAGINA
+            st.dataframe(df_ranking.iloc[inicio_pagina:inicio_pagina + TAMANO_PAGINA],
+                         use_container_width=True, hide_index=True)
             
             # Última actualización
             st.caption(f"Última actualización: {datetime.now().strftime('%H:%M:%S')}")
         else:
-            st.warning("No hay calificaciones registradas aún")
\ No newline at end of file
+            st.warning("No hay calificaciones registradas aún")
+
+# Duración del rerun completo; los que terminan con st.stop() o st.rerun() no llegan aquí
+metricas.registro.observar('rerun', (time.perf_counter() - inicio_rerun) * 1000)
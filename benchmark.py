@@ -0,0 +1,262 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import exportar
+from almacen import SupabaseStore
+from puntajes import LLAVE_CALIFICACION, indexar_calificaciones
+from ranking import MotorRanking, calcular_ranking_df, TOP_GRAFICA
+from rubrica import TEMAS, CRITERIOS
+from supabase_local import ClienteLocal
+
+# Prueba de carga sin red: N jueces guardan a la vez mientras P proyectores
+# refrescan el ranking, todo contra supabase_local.ClienteLocal con latencia
+# y max-rows configurables. Uso:
+#
+#     python benchmark.py --jueces 5 --equipos 10 --latencia-ms 40
+#
+# appsupabase.py no se puede importar fuera de `streamlit run`, así que
+# AppSimulada repite sus mismas llamadas (almacén, motor de ranking y
+# exportación) sin los decoradores de cache.
+
+PERCENTILES = (50, 95, 99)
+
+
+class AppSimulada:
+    def __init__(self, almacen, ttl_ranking=15):
+        self.almacen = almacen
+        self.motor = MotorRanking()
+        self.ttl_ranking = ttl_ranking
+        self.tiempos = {}  # operación -> [ms]
+        self.fallas = 0
+
+    def _medir(self, operacion, funcion, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            self.tiempos.setdefault(operacion, []).append((time.perf_counter() - inicio) * 1000)
+
+    def cargar_config(self):
+        return self._medir('cargar_config', self.almacen.cargar_config)
+
+    def obtener_calificaciones(self, tema=None, equipo=None, juez=None, columnas=None):
+        return self._medir('obtener_calificaciones', self.almacen.consultar,
+                           tema=tema, equipo=equipo, juez=juez, columnas=columnas)
+
+    def guardar_calificacion(self, tema, equipo, juez, categoria, criterio, cumple, puntos):
+        return self.guardar_calificaciones_batch([{
+            'tema': tema, 'equipo': equipo, 'juez': juez, 'categoria': categoria,
+            'criterio': criterio, 'cumple': cumple, 'puntos': puntos
+        }])
+
+    def guardar_calificaciones_batch(self, calificaciones):
+        resultado = self._medir('guardar_calificacion', self.almacen.guardar_lote, calificaciones)
+        if resultado['ok']:
+            self.motor.aplicar(calificaciones)
+        else:
+            self.fallas += 1
+        return resultado
+
+    def calcular_ranking(self, tema, k=None):
+        if self.almacen.totales_en_servidor:
+            return self._medir('calcular_ranking', self.almacen.ranking, tema, k=k)
+        def calcular():
+            self.motor.refrescar(
+                lambda: self.obtener_calificaciones(columnas=LLAVE_CALIFICACION + ('puntos',)).to_dict('records'),
+                ttl=self.ttl_ranking
+            )
+            return self.motor.ranking(tema, k=k)
+        return self._medir('calcular_ranking', calcular)
+
+    def verificar(self, filas):
+        # Temas cuyo ranking no coincide con un cálculo completo sobre filas
+        if not self.almacen.totales_en_servidor:
+            return self.motor.verificar(filas)
+        df = pd.DataFrame(filas, columns=list(LLAVE_CALIFICACION) + ['puntos'])
+        diferencias = []
+        for tema in TEMAS:
+            esperado = calcular_ranking_df(df, tema)
+            obtenido = self.almacen.ranking(tema)
+            if esperado.empty and obtenido.empty:
+                continue
+            if esperado.empty or obtenido.empty or list(esperado['equipo']) != list(obtenido['equipo']) or \
+                    not np.allclose(esperado['Promedio'], obtenido['Promedio']):
+                diferencias.append(tema)
+        return diferencias
+
+    def generar_excel(self):
+        def generar():
+            return exportar.generar_excel(self.obtener_calificaciones(), TEMAS)
+        return self._medir('generar_excel', generar)
+
+
+def _rubrica(tema, equipo, juez, azar):
+    calificaciones = []
+    for categoria, criterios in CRITERIOS.items():
+        for criterio in criterios:
+            cumple = azar.random() < 0.8
+            calificaciones.append({
+                'tema': tema, 'equipo': equipo, 'juez': juez, 'categoria': categoria, 'criterio': criterio,
+                'cumple': cumple, 'puntos': azar.randint(0, 20) / 2 if cumple else 0.0
+            })
+    return calificaciones
+
+
+def simular_juez(app, juez, equipos_por_tema, por_criterio, semilla):
+    azar = random.Random(semilla)
+    app.cargar_config()
+    for tema, equipos in equipos_por_tema.items():
+        for equipo in equipos:
+            # Como el formulario: primero lee lo ya guardado del equipo y luego guarda la rúbrica
+            indexar_calificaciones(app.obtener_calificaciones(
+                tema=tema, equipo=equipo, columnas=LLAVE_CALIFICACION + ('cumple', 'puntos')))
+            calificaciones = _rubrica(tema, equipo, juez, azar)
+            if por_criterio:
+                for calif in calificaciones:
+                    app.guardar_calificacion(**calif)
+            else:
+                app.guardar_calificaciones_batch(calificaciones)
+
+
+def simular_proyector(app, temas, intervalo, terminado):
+    i = 0
+    while not terminado.is_set():
+        # Como la vista de proyección: podio y gráfica con el top
+        app.calcular_ranking(temas[i % len(temas)], k=TOP_GRAFICA)
+        i += 1
+        terminado.wait(intervalo)
+
+
+def resumir(tiempos):
+    resumen = {}
+    for operacion, valores in sorted(tiempos.items()):
+        p = np.percentile(valores, PERCENTILES)
+        resumen[operacion] = {
+            'n': len(valores),
+            **{f'p{q}_ms': round(float(v), 2) for q, v in zip(PERCENTILES, p)},
+            'max_ms': round(float(max(valores)), 2)
+        }
+    return resumen
+
+
+def correr(jueces=5, equipos=10, temas=4, proyectores=3, latencia_ms=30.0, variacion_ms=20.0,
+           max_filas=1000, ttl_ranking=15.0, intervalo=0.2, exportaciones=3, por_criterio=False, semilla=0,
+           compacto=False, ranking_servidor=False, evento=None):
+    cliente = ClienteLocal(max_filas=max_filas, latencia=latencia_ms / 1000, variacion=variacion_ms / 1000)
+    almacen = SupabaseStore(cliente, compacto=compacto, totales_en_servidor=ranking_servidor, evento=evento)
+    app = AppSimulada(almacen, ttl_ranking=ttl_ranking)
+
+    nombres_jueces = [f"Juez {i + 1}" for i in range(jueces)]
+    equipos_por_tema = {tema: [f"Equipo {j + 1}" for j in range(equipos)] for tema in TEMAS[:temas]}
+    app.almacen.guardar_config(nombres_jueces, equipos_por_tema)
+
+    terminado = threading.Event()
+    hilos_proyector = [
+        threading.Thread(target=simular_proyector, args=(app, list(equipos_por_tema), intervalo, terminado))
+        for _ in range(proyectores)
+    ]
+    hilos_juez = [
+        threading.Thread(target=simular_juez, args=(app, juez, equipos_por_tema, por_criterio, semilla + i))
+        for i, juez in enumerate(nombres_jueces)
+    ]
+    inicio = time.perf_counter()
+    for hilo in hilos_proyector + hilos_juez:
+        hilo.start()
+    for hilo in hilos_juez:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+    terminado.set()
+    for hilo in hilos_proyector:
+        hilo.join()
+
+    for _ in range(exportaciones):
+        app.generar_excel()
+
+    # El ranking incremental debe coincidir con un cálculo completo sobre la tabla final
+    filas = app.almacen.consultar(columnas=LLAVE_CALIFICACION + ('puntos',)).to_dict('records')
+    esperadas = jueces * equipos * len(equipos_por_tema) * sum(len(c) for c in CRITERIOS.values())
+
+    return {
+        'parametros': {
+            'jueces': jueces, 'equipos': equipos, 'temas': len(equipos_por_tema), 'proyectores': proyectores,
+            'latencia_ms': latencia_ms, 'variacion_ms': variacion_ms, 'max_filas': max_filas,
+            'ttl_ranking': ttl_ranking, 'por_criterio': por_criterio, 'compacto': compacto,
+            'ranking_servidor': ranking_servidor, 'evento': evento
+        },
+        'duracion_s': round(duracion, 3),
+        'operaciones': resumir(app.tiempos),
+        'peticiones': {
+            'total': cliente.peticiones,
+            **{f"{tabla}.{operacion}": n for (tabla, operacion), n in sorted(cliente.peticiones_por_tipo.items())}
+        },
+        'filas': len(filas),
+        'filas_esperadas': esperadas,
+        'guardados_fallidos': app.fallas,
+        'temas_inconsistentes': app.verificar(filas)
+    }
+
+
+def imprimir(reporte):
+    print("Parámetros: " + ", ".join(f"{k}={v}" for k, v in reporte['parametros'].items()))
+    print(f"Duración de la ronda de jueces: {reporte['duracion_s']} s\n")
+    print(f"{'Operación':<24}{'n':>7}" + "".join(f"{'p' + str(q) + ' ms':>11}" for q in PERCENTILES) + f"{'máx ms':>11}")
+    for operacion, datos in reporte['operaciones'].items():
+        print(f"{operacion:<24}{datos['n']:>7}"
+              + "".join(f"{datos[f'p{q}_ms']:>11.2f}" for q in PERCENTILES)
+              + f"{datos['max_ms']:>11.2f}")
+    print("\nPeticiones a PostgREST:")
+    for tipo, n in reporte['peticiones'].items():
+        print(f"  {tipo:<30}{n:>7}")
+    print(f"\nFilas: {reporte['filas']} de {reporte['filas_esperadas']} esperadas, "
+          f"guardados fallidos: {reporte['guardados_fallidos']}, "
+          f"temas con ranking inconsistente: {reporte['temas_inconsistentes'] or 'ninguno'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de jueces concurrentes contra un Supabase local")
+    parser.add_argument('--jueces', type=int, default=5)
+    parser.add_argument('--equipos', type=int, default=10, help="equipos por tema")
+    parser.add_argument('--temas', type=int, default=len(TEMAS))
+    parser.add_argument('--proyectores', type=int, default=3, help="pantallas con auto-actualizar")
+    parser.add_argument('--latencia-ms', type=float, default=30.0)
+    parser.add_argument('--variacion-ms', type=float, default=20.0)
+    parser.add_argument('--max-filas', type=int, default=1000, help="max-rows de PostgREST")
+    parser.add_argument('--ttl-ranking', type=float, default=15.0)
+    parser.add_argument('--intervalo', type=float, default=0.2, help="segundos entre refrescos de cada proyector")
+    parser.add_argument('--exportaciones', type=int, default=3)
+    parser.add_argument('--por-criterio', action='store_true', help="un upsert por criterio en lugar de uno por rúbrica")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--compacto', action='store_true', help="esquema compacto (tablas puntajes/nombres)")
+    parser.add_argument('--ranking-servidor', action='store_true',
+                        help="ranking desde las vistas de totales en lugar del motor incremental")
+    parser.add_argument('--evento', help="guarda y lee todo dentro de este evento")
+    parser.add_argument('--json', help="además guarda el reporte en este archivo")
+    args = parser.parse_args(argv)
+
+    reporte = correr(
+        jueces=args.jueces, equipos=args.equipos, temas=args.temas, proyectores=args.proyectores,
+        latencia_ms=args.latencia_ms, variacion_ms=args.variacion_ms, max_filas=args.max_filas,
+        ttl_ranking=args.ttl_ranking, intervalo=args.intervalo, exportaciones=args.exportaciones,
+        por_criterio=args.por_criterio, semilla=args.semilla, compacto=args.compacto,
+        ranking_servidor=args.ranking_servidor, evento=args.evento
+    )
+    imprimir(reporte)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2)
+
+    # Código de salida distinto de cero para que CI marque la corrida como fallida
+    correcto = (not reporte['guardados_fallidos'] and not reporte['temas_inconsistentes']
+                and reporte['filas'] == reporte['filas_esperadas'])
+    return 0 if correcto else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
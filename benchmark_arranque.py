@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from almacen import SQLiteStore
+from rubrica import TEMAS, CRITERIOS
+
+# Tiempo de arranque en frío de appsupabase.py. Cada muestra es un proceso
+# nuevo (sin módulos importados ni caches) que corre la app con AppTest y el
+# backend SQLite:
+#
+#   1. la primera sesión abre la página de login del juez,
+#   2. espera unos segundos (lo que tarda un juez en escribir su contraseña),
+#   3. una segunda sesión entra directo a calificar y otra al ranking.
+#
+# Se corre con y sin secrets["calentar"] para ver cuánto le ahorra el
+# calentamiento al segundo juez. Uso:
+#
+#     python benchmark_arranque.py --muestras 5 --equipos 10
+
+PERCENTILES = (50, 95)
+# Librerías que solo deberían importarse en las vistas que las usan
+PESADAS = ('altair', 'plotly', 'openpyxl', 'supabase')
+
+
+def _preparar_datos(ruta, jueces, equipos):
+    almacen = SQLiteStore(ruta)
+    nombres_jueces = [f"Juez {i + 1}" for i in range(jueces)]
+    equipos_por_tema = {tema: [f"Equipo {j + 1}" for j in range(equipos)] for tema in TEMAS}
+    almacen.guardar_config(nombres_jueces, equipos_por_tema)
+    for tema, nombres_equipos in equipos_por_tema.items():
+        for equipo in nombres_equipos:
+            almacen.guardar_lote([
+                {'tema': tema, 'equipo': equipo, 'juez': juez, 'categoria': categoria, 'criterio': criterio,
+                 'cumple': True, 'puntos': 5.0}
+                for juez in nombres_jueces for categoria, criterios in CRITERIOS.items() for criterio in criterios
+            ])
+
+
+def muestra_hija(app, ruta, calentar, espera):
+    # Corre dentro del proceso nuevo; regresa los tiempos en ms
+    inicio = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    importar_ms = (time.perf_counter() - inicio) * 1000
+
+    def sesion(juez=None, modo_juez="📝 Calificar"):
+        at = AppTest.from_file(app, default_timeout=60)
+        at.secrets['backend'] = 'sqlite'
+        at.secrets['sqlite_path'] = ruta
+        at.secrets['calentar'] = calentar
+        at.secrets['diario_path'] = ruta + '.diario'
+        at.secrets['supabase_url'] = 'x'
+        at.secrets['supabase_key'] = 'y'
+        at.secrets['passwords'] = {'Juez 1': 'a'}
+        at.secrets['admin'] = {'password': 'p'}
+        if juez:
+            at.session_state['juez_autenticado'] = True
+            at.session_state['juez_actual'] = juez
+        at.run()
+        if modo_juez != "📝 Calificar":
+            at.sidebar.radio[0].set_value(modo_juez).run()
+        return at
+
+    def medir(**kwargs):
+        t = time.perf_counter()
+        at = sesion(**kwargs)
+        return (time.perf_counter() - t) * 1000, [str(e.value) for e in at.exception]
+
+    modulos_antes = [m for m in PESADAS if m in sys.modules]
+    primera_ms, errores = medir()
+    modulos_login = [m for m in PESADAS if m in sys.modules and m not in modulos_antes]
+    time.sleep(espera)
+    calificar_ms, errores_calificar = medir(juez='Juez 1')
+    ranking_ms, errores_ranking = medir(juez='Juez 1', modo_juez="📊 Ver Ranking")
+    return {
+        'importar_streamlit_ms': importar_ms,
+        'primera_sesion_ms': primera_ms,
+        'calificar_ms': calificar_ms,
+        'ranking_ms': ranking_ms,
+        'modulos_en_login': modulos_login,
+        'errores': errores + errores_calificar + errores_ranking
+    }
+
+
+def correr(muestras=5, jueces=3, equipos=10, espera=2.0, app='appsupabase.py'):
+    app = os.path.abspath(app)
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        for calentar in (False, True):
+            tiempos = {}
+            errores, modulos = [], set()
+            for i in range(muestras):
+                ruta = os.path.join(directorio, f"arranque_{int(calentar)}_{i}.db")
+                _preparar_datos(ruta, jueces, equipos)
+                salida = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--hijo', app, ruta, str(int(calentar)), str(espera)],
+                    capture_output=True, text=True, cwd=os.path.dirname(app)
+                )
+                if salida.returncode != 0:
+                    errores.append(salida.stderr.strip().splitlines()[-1] if salida.stderr.strip() else "Error desconocido")
+                    continue
+                datos = json.loads(salida.stdout.strip().splitlines()[-1])
+                errores += datos.pop('errores')
+                modulos.update(datos.pop('modulos_en_login'))
+                for campo, ms in datos.items():
+                    tiempos.setdefault(campo, []).append(ms)
+            resultados['con_calentamiento' if calentar else 'sin_calentamiento'] = {
+                'tiempos': {
+                    campo: {f'p{q}_ms': round(float(v), 1) for q, v in zip(PERCENTILES, np.percentile(valores, PERCENTILES))}
+                    for campo, valores in tiempos.items()
+                },
+                'modulos_en_login': sorted(modulos),
+                'errores': errores
+            }
+    return {
+        'parametros': {'muestras': muestras, 'jueces': jueces, 'equipos': equipos, 'espera_s': espera,
+                       'app': os.path.basename(app)},
+        'resultados': resultados
+    }
+
+
+def imprimir(reporte):
+    print("Parámetros: " + ", ".join(f"{k}={v}" for k, v in reporte['parametros'].items()))
+    for caso, datos in reporte['resultados'].items():
+        print(f"\n{caso}")
+        print(f"  {'Paso':<24}" + "".join(f"{'p' + str(q) + ' ms':>11}" for q in PERCENTILES))
+        for campo, p in datos['tiempos'].items():
+            print(f"  {campo:<24}" + "".join(f"{p[f'p{q}_ms']:>11.1f}" for q in PERCENTILES))
+        print(f"  Librerías pesadas importadas en el login: {', '.join(datos['modulos_en_login']) or 'ninguna'}")
+        if datos['errores']:
+            print(f"  Errores: {datos['errores'][:3]}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == '--hijo':
+        app, ruta, calentar, espera = argv[1:5]
+        print(json.dumps(muestra_hija(app, ruta, calentar == '1', float(espera))))
+        return 0
+
+    parser = argparse.ArgumentParser(description="Tiempo de arranque en frío de la app, con y sin calentamiento")
+    parser.add_argument('--muestras', type=int, default=5, help="procesos nuevos por caso")
+    parser.add_argument('--jueces', type=int, default=3)
+    parser.add_argument('--equipos', type=int, default=10, help="equipos por tema")
+    parser.add_argument('--espera', type=float, default=2.0, help="segundos entre la primera sesión y la del juez")
+    parser.add_argument('--app', default='appsupabase.py')
+    parser.add_argument('--json', help="además guarda el reporte en este archivo")
+    args = parser.parse_args(argv)
+
+    reporte = correr(muestras=args.muestras, jueces=args.jueces, equipos=args.equipos,
+                     espera=args.espera, app=args.app)
+    imprimir(reporte)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2)
+    return 1 if any(datos['errores'] for datos in reporte['resultados'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
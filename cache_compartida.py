@@ -0,0 +1,109 @@
+import pickle
+import sqlite3
+import threading
+import time
+
+# Cache compartido entre réplicas de Streamlit. Cada "espacio" (p. ej.
+# 'calificaciones') tiene un número de generación: al guardar, la réplica
+# que escribió lo incrementa y todas las demás dejan de ver las entradas
+# viejas, porque la generación forma parte de la llave.
+#
+# Los valores se guardan con pickle: el backend debe ser de confianza
+# (un archivo local o un Redis propio), nunca uno expuesto a terceros.
+
+
+class CacheSQLite:
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._escrituras = 0
+        with self._conexion() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS kv (clave TEXT PRIMARY KEY, valor BLOB, expira REAL)")
+            con.execute("CREATE TABLE IF NOT EXISTS generaciones (espacio TEXT PRIMARY KEY, valor INTEGER)")
+
+    def _conexion(self):
+        # sqlite3 no comparte conexiones entre hilos: una por hilo
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=5)
+            con.execute("PRAGMA journal_mode=WAL")
+            self._local.con = con
+        return con
+
+    def get(self, clave):
+        fila = self._conexion().execute(
+            "SELECT valor FROM kv WHERE clave = ? AND expira > ?", (clave, time.time())
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def set(self, clave, valor, ttl):
+        with self._conexion() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO kv (clave, valor, expira) VALUES (?, ?, ?)",
+                (clave, valor, time.time() + ttl)
+            )
+            self._escrituras += 1
+            if self._escrituras % 100 == 0:
+                con.execute("DELETE FROM kv WHERE expira <= ?", (time.time(),))
+
+    def generacion(self, espacio):
+        fila = self._conexion().execute(
+            "SELECT valor FROM generaciones WHERE espacio = ?", (espacio,)
+        ).fetchone()
+        return fila[0] if fila else 0
+
+    def invalidar(self, espacio):
+        with self._conexion() as con:
+            con.execute(
+                "INSERT INTO generaciones (espacio, valor) VALUES (?, 1) "
+                "ON CONFLICT(espacio) DO UPDATE SET valor = valor + 1",
+                (espacio,)
+            )
+
+
+class CacheRedis:
+    def __init__(self, url, prefijo='calificaciones'):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self.prefijo = prefijo
+
+    def get(self, clave):
+        return self._redis.get(f"{self.prefijo}:kv:{clave}")
+
+    def set(self, clave, valor, ttl):
+        self._redis.set(f"{self.prefijo}:kv:{clave}", valor, ex=max(1, int(ttl)))
+
+    def generacion(self, espacio):
+        valor = self._redis.get(f"{self.prefijo}:gen:{espacio}")
+        return int(valor) if valor else 0
+
+    def invalidar(self, espacio):
+        self._redis.incr(f"{self.prefijo}:gen:{espacio}")
+
+
+def crear_cache(url):
+    # "sqlite:///ruta/al/archivo.db" o "redis://host:puerto/0"; vacío = sin cache compartido
+    if not url:
+        return None
+    if url.startswith('sqlite:///'):
+        return CacheSQLite(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://')):
+        try:
+            return CacheRedis(url)
+        except ImportError as e:
+            # Un cache local no invalidaría a las demás réplicas: mejor fallar al arrancar
+            raise ImportError("cache_compartida apunta a Redis pero el paquete redis no está instalado "
+                              "(pip install redis)") from e
+    raise ValueError(f"Backend de cache no soportado: {url}")
+
+
+def obtener_o_calcular(cache, espacio, clave, calcular, ttl, generacion=None):
+    if generacion is None:
+        generacion = cache.generacion(espacio)
+    llave = f"{espacio}:{generacion}:{clave}"
+    guardado = cache.get(llave)
+    if guardado is not None:
+        return pickle.loads(guardado)
+    valor = calcular()
+    cache.set(llave, pickle.dumps(valor), ttl)
+    return valor
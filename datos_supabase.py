@@ -0,0 +1,163 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from puntajes import LLAVE_CALIFICACION, validar_calificaciones
+
+ON_CONFLICT = ','.join(LLAVE_CALIFICACION)
+
+# PostgREST corta cada respuesta en su max-rows (1000 por defecto),
+# así que las lecturas completas se hacen por páginas
+TAMANO_PAGINA = 1000
+MAX_HILOS = 4
+
+# Vistas con la suma de puntos por (tema, equipo, juez); ver el README
+VISTA_TOTALES = 'totales_calificaciones'
+VISTA_TOTALES_COMPACTA = 'totales_puntajes'
+
+
+def guardar_calificaciones_batch(client, calificaciones, tabla='calificaciones', on_conflict=ON_CONFLICT,
+                                 preparar=validar_calificaciones):
+    """Guarda toda la rúbrica de un juez en un solo upsert.
+
+    PostgREST ejecuta el upsert en una sola transacción, así que se guardan
+    todas las filas o ninguna. Regresa un resumen con las filas guardadas,
+    los errores por fila y la latencia medida del guardado. preparar valida
+    (y en el esquema compacto codifica) las filas antes de mandarlas.
+    reintentar es True solo si falló el upsert por algo distinto a los datos
+    (red, timeout, servidor); un lote inválido fallaría igual en cada intento.
+    """
+    resultado = {'ok': False, 'guardadas': 0, 'errores': [], 'latencia_ms': 0.0, 'reintentar': False}
+
+    filas, resultado['errores'] = preparar(calificaciones)
+
+    # Si alguna fila es inválida no se manda nada, para no dejar la rúbrica a medias
+    if resultado['errores'] or not filas:
+        return resultado
+
+    inicio = time.perf_counter()
+    try:
+        client.table(tabla).upsert(filas, on_conflict=on_conflict).execute()
+    except Exception as e:
+        resultado['errores'] = [
+            {'fila': i, 'criterio': calif.get('criterio'), 'error': str(e)}
+            for i, calif in enumerate(calificaciones)
+        ]
+        # Clases 22 (datos) y 23 (restricciones) de Postgres: el lote nunca va a pasar
+        resultado['reintentar'] = not str(getattr(e, 'code', None) or '').startswith(('22', '23'))
+    else:
+        resultado['ok'] = True
+        resultado['guardadas'] = len(filas)
+    finally:
+        resultado['latencia_ms'] = (time.perf_counter() - inicio) * 1000
+
+    return resultado
+
+
+def consultar_calificaciones(client, tema=None, equipo=None, juez=None, columnas=None,
+                             tamano_pagina=TAMANO_PAGINA, max_hilos=MAX_HILOS,
+                             tabla='calificaciones', filtros=None, orden=('id',)):
+    """Lee calificaciones aplicando los filtros y la proyección en PostgREST.
+
+    Solo viajan las filas y columnas pedidas; los filtros en None se omiten.
+    La tabla se lee en páginas con .range(): la primera trae el conteo total
+    y las demás se piden en paralelo, así el resultado nunca se trunca.
+    Las vistas no tienen id: se ordenan por sus columnas de agrupación.
+    """
+    seleccion = ','.join(columnas) if columnas else '*'
+    filtros = dict(filtros or {}, tema=tema, equipo=equipo, juez=juez)
+
+    def pagina(inicio, fin, contar=False):
+        if contar:
+            query = client.table(tabla).select(seleccion, count='exact')
+        else:
+            query = client.table(tabla).select(seleccion)
+        for campo, valor in filtros.items():
+            if valor is not None:
+                query = query.eq(campo, valor)
+        # Orden estable para que las páginas no se traslapen
+        for columna in orden:
+            query = query.order(columna)
+        return query.range(inicio, fin).execute()
+
+    primera = pagina(0, tamano_pagina - 1, contar=True)
+    filas = list(primera.data)
+    total = primera.count if primera.count is not None else len(filas)
+    if len(filas) >= total:
+        return filas
+
+    # Si el servidor tiene un max-rows menor que la página pedida, nos ajustamos a él
+    if 0 < len(filas) < tamano_pagina:
+        tamano_pagina = len(filas)
+    elif not filas:
+        return filas
+
+    rangos = [(inicio, inicio + tamano_pagina - 1)
+              for inicio in range(len(filas), total, tamano_pagina)]
+    with ThreadPoolExecutor(max_workers=min(max_hilos, len(rangos))) as pool:
+        for respuesta in pool.map(lambda r: pagina(*r), rangos):
+            filas.extend(respuesta.data)
+    return filas
+
+
+def version_config(client, evento=None):
+    # Consulta barata: solo el id de la configuración más reciente (del evento, si hay uno)
+    query = client.table('config').select('id')
+    if evento is not None:
+        query = query.eq('evento', evento)
+    response = query.order('id', desc=True).limit(1).execute()
+    return response.data[0]['id'] if response.data else None
+
+
+def cargar_config(client, version):
+    response = client.table('config').select("*").eq('id', version).execute()
+    if response.data:
+        return {
+            'jueces': json.loads(response.data[0]['jueces']),
+            'equipos_por_tema': json.loads(response.data[0]['equipos_por_tema'])
+        }
+    return None
+
+
+def guardar_config(client, jueces, equipos_por_tema, evento=None):
+    fila = {
+        'jueces': json.dumps(jueces),
+        'equipos_por_tema': json.dumps(equipos_por_tema)
+    }
+    if evento is not None:
+        fila['evento'] = evento
+    client.table('config').insert(fila).execute()
+
+
+# Eventos: cada uno tiene sus propias particiones de calificaciones y puntajes
+# (ver el README). Las funciones del servidor crean, vacían o desprenden esas
+# particiones, así nunca se borra fila por fila.
+def crear_evento(client, evento):
+    client.rpc('crear_evento', {'p_evento': evento}).execute()
+
+
+def vaciar_evento(client, evento):
+    client.rpc('vaciar_evento', {'p_evento': evento}).execute()
+
+
+def archivar_evento(client, evento):
+    client.rpc('archivar_evento', {'p_evento': evento}).execute()
+
+
+def cargar_eventos(client):
+    response = client.table('eventos').select('evento,archivado').order('creado').execute()
+    return [{'evento': fila['evento'], 'archivado': bool(fila['archivado'])} for fila in response.data]
+
+
+def cargar_nombres(client):
+    # Catálogo del esquema compacto: filas (tipo, id, nombre)
+    response = client.table('nombres').select('tipo,id,nombre').execute()
+    return [(fila['tipo'], fila['id'], fila['nombre']) for fila in response.data]
+
+
+def registrar_nombres(client, nombres):
+    if nombres:
+        client.table('nombres').upsert(
+            [{'tipo': tipo, 'id': id_nombre, 'nombre': nombre} for tipo, id_nombre, nombre in nombres],
+            on_conflict='tipo,nombre', ignore_duplicates=True
+        ).execute()
@@ -0,0 +1,251 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from puntajes import LLAVE_CALIFICACION, validar_calificaciones
+
+# Diario local de envíos (write-behind). Cada rúbrica se escribe primero en un
+# SQLite con synchronous=FULL y el juez recibe la confirmación en cuanto el
+# commit llega a disco. Un hilo de fondo sube los envíos pendientes al
+# almacén en lotes y los borra del diario solo cuando el upsert fue exitoso;
+# si la red falla, reintenta con espera exponencial. Un envío que el almacén
+# rechaza por sus datos no se reintenta: pasa a la tabla rechazados con su
+# error para que no detenga a los envíos de los demás jueces.
+#
+# Varios procesos (workers de Streamlit) pueden compartir el mismo archivo:
+# antes de subir, un proceso marca su lote como tomado y mientras tenga un
+# lote tomado nadie más sube, así los lotes llegan al almacén en orden y uno
+# viejo nunca pisa a uno más nuevo. Si el proceso muere, su marca vence a
+# los plazo_tomado segundos.
+
+
+class DiarioEscrituras:
+    def __init__(self, ruta, envios_por_lote=20, espera_max=60, plazo_tomado=300):
+        self.ruta = ruta
+        self.envios_por_lote = envios_por_lote
+        self.espera_max = espera_max
+        self.plazo_tomado = plazo_tomado
+        self._dueno = uuid.uuid4().hex
+        self.ultimo_error = None
+        self.ultima_sincronizacion = None
+        self.fallos_al_sincronizar = 0
+        self._local = threading.local()
+        self._hay_pendientes = threading.Event()
+        self._hilo = None
+        with self._conexion() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS envios ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, juez TEXT NOT NULL, filas TEXT NOT NULL, "
+                "creado REAL NOT NULL, intentos INTEGER NOT NULL DEFAULT 0, ultimo_error TEXT, "
+                "tomado TEXT, tomado_en REAL)"
+            )
+            # Diarios creados antes de que los lotes se marcaran como tomados
+            columnas = {fila[1] for fila in con.execute("PRAGMA table_info(envios)")}
+            if 'tomado' not in columnas:
+                con.execute("ALTER TABLE envios ADD COLUMN tomado TEXT")
+                con.execute("ALTER TABLE envios ADD COLUMN tomado_en REAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS rechazados ("
+                "id INTEGER PRIMARY KEY, juez TEXT NOT NULL, filas TEXT NOT NULL, "
+                "creado REAL NOT NULL, rechazado REAL NOT NULL, error TEXT NOT NULL)"
+            )
+
+    def _conexion(self):
+        # Una conexión por hilo: la app escribe y el hilo de fondo lee y borra
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=10)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=FULL")
+            self._local.con = con
+        return con
+
+    def anotar(self, calificaciones):
+        # Mismo dict de resultado que los almacenes, con 'pendiente' = True
+        resultado = {'ok': False, 'guardadas': 0, 'errores': [], 'latencia_ms': 0.0, 'pendiente': True}
+        filas, resultado['errores'] = validar_calificaciones(calificaciones)
+        if resultado['errores'] or not filas:
+            return resultado
+        inicio = time.perf_counter()
+        with self._conexion() as con:
+            con.execute(
+                "INSERT INTO envios (juez, filas, creado) VALUES (?, ?, ?)",
+                (filas[0]['juez'], json.dumps(filas), time.time())
+            )
+        resultado['latencia_ms'] = (time.perf_counter() - inicio) * 1000
+        resultado['ok'] = True
+        resultado['guardadas'] = len(filas)
+        self._hay_pendientes.set()
+        return resultado
+
+    def pendientes(self):
+        # juez -> envíos que aún no llegan al almacén
+        return dict(self._conexion().execute("SELECT juez, COUNT(*) FROM envios GROUP BY juez").fetchall())
+
+    def rechazados(self):
+        # juez -> (envíos rechazados, último error)
+        return {
+            juez: (n, error) for juez, n, error in self._conexion().execute(
+                "SELECT juez, COUNT(*), (SELECT error FROM rechazados r2 WHERE r2.juez = r.juez ORDER BY id DESC LIMIT 1) "
+                "FROM rechazados r GROUP BY juez"
+            )
+        }
+
+    def filas_pendientes(self, tema=None, equipo=None):
+        # Última versión de cada criterio todavía en el diario, para mostrarla en el formulario
+        vigentes = {}
+        for (texto,) in self._conexion().execute("SELECT filas FROM envios ORDER BY id"):
+            for fila in json.loads(texto):
+                if (tema is None or fila['tema'] == tema) and (equipo is None or fila['equipo'] == equipo):
+                    vigentes[tuple(fila[campo] for campo in LLAVE_CALIFICACION)] = fila
+        return list(vigentes.values())
+
+    def descartar(self):
+        # Para BORRAR TODO: los envíos pendientes no deben revivir después del reinicio
+        with self._conexion() as con:
+            con.execute("DELETE FROM envios")
+            con.execute("DELETE FROM rechazados")
+
+    def _subir(self, almacen, envios):
+        # Un upsert con los envíos dados. Regresa (filas subidas o None, error); si el
+        # error es de red o del servidor, los envíos se quedan y se lanza RuntimeError
+        vigentes = {}
+        for _, texto in envios:
+            for fila in json.loads(texto):
+                vigentes[tuple(fila[campo] for campo in LLAVE_CALIFICACION)] = fila
+        filas = list(vigentes.values())
+        ids = [(id_envio,) for id_envio, _ in envios]
+
+        con = self._conexion()
+        resultado = almacen.guardar_lote(filas)
+        if resultado['ok']:
+            with con:
+                con.executemany("DELETE FROM envios WHERE id = ?", ids)
+            return filas, None
+        error = resultado['errores'][0]['error'] if resultado['errores'] else "Error desconocido"
+        if not resultado.get('reintentar'):
+            return None, error
+        with con:
+            con.executemany(
+                "UPDATE envios SET intentos = intentos + 1, ultimo_error = ? WHERE id = ?",
+                [(error, id_envio) for (id_envio,) in ids]
+            )
+            # Se suelta todo el lote para que cualquier proceso lo reintente en orden
+            con.execute("UPDATE envios SET tomado = NULL WHERE tomado = ?", (self._dueno,))
+        raise RuntimeError(error)
+
+    def _tomar(self):
+        # Marca los envíos más viejos como de este proceso, en una transacción que
+        # bloquea a los demás escritores. None si otro proceso tiene un lote tomado
+        con = self._conexion()
+        ahora = time.time()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            ocupado = con.execute(
+                "SELECT 1 FROM envios WHERE tomado IS NOT NULL AND tomado != ? AND tomado_en > ? LIMIT 1",
+                (self._dueno, ahora - self.plazo_tomado)
+            ).fetchone()
+            if ocupado:
+                con.rollback()
+                return None
+            envios = con.execute(
+                "SELECT id, filas FROM envios ORDER BY id LIMIT ?", (self.envios_por_lote,)
+            ).fetchall()
+            con.executemany("UPDATE envios SET tomado = ?, tomado_en = ? WHERE id = ?",
+                            [(self._dueno, ahora, id_envio) for id_envio, _ in envios])
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+        return envios
+
+    def _rechazar(self, id_envio, error):
+        # Saca el envío de la cola: ya no se reintenta, pero queda guardado con su error
+        with self._conexion() as con:
+            con.execute(
+                "INSERT INTO rechazados (id, juez, filas, creado, rechazado, error) "
+                "SELECT id, juez, filas, creado, ?, ? FROM envios WHERE id = ?",
+                (time.time(), error, id_envio)
+            )
+            con.execute("DELETE FROM envios WHERE id = ?", (id_envio,))
+
+    def vaciar(self, almacen):
+        """Sube al almacén los envíos más viejos en un solo lote.
+
+        Si un criterio aparece en varios envíos gana el más reciente (un
+        upsert no puede tocar la misma llave dos veces). Regresa las filas
+        sincronizadas; si el almacén falla por la red, deja los envíos en el
+        diario y lanza RuntimeError. Si rechaza el lote por sus datos, los
+        envíos se suben uno por uno (en orden, así el más reciente sigue
+        ganando) y los que vuelven a fallar pasan a rechazados. Regresa None
+        si otro proceso está subiendo su lote.
+        """
+        envios = self._tomar()
+        if not envios:
+            return envios
+        filas, error = self._subir(almacen, envios)
+        if filas is not None:
+            return filas
+        if len(envios) == 1:
+            self._rechazar(envios[0][0], error)
+            return []
+        subidas = []
+        for envio in envios:
+            try:
+                filas, error = self._subir(almacen, [envio])
+            except RuntimeError:
+                # La red falló a medio camino: lo ya subido se reporta y el resto se reintenta
+                if subidas:
+                    return subidas
+                raise
+            if filas is None:
+                self._rechazar(envio[0], error)
+            else:
+                subidas.extend(filas)
+        return subidas
+
+    def iniciar(self, almacen, al_sincronizar=None):
+        # Hilo daemon que vacía el diario; al_sincronizar(filas) corre tras cada lote exitoso
+        if self._hilo is not None:
+            return
+
+        def ciclo():
+            fallos = 0
+            while True:
+                try:
+                    filas = self.vaciar(almacen)
+                except Exception as e:
+                    fallos += 1
+                    self.ultimo_error = str(e)
+                    # Espera exponencial con jitter para no saturar la red de la sede al volver
+                    time.sleep(min(self.espera_max, 2 ** fallos) * random.uniform(0.5, 1.0))
+                    continue
+                fallos = 0
+                self.ultimo_error = None
+                if filas is None:
+                    # Otro proceso con el mismo diario está subiendo; se espera su turno
+                    self._hay_pendientes.wait(timeout=5)
+                    self._hay_pendientes.clear()
+                    continue
+                if filas:
+                    self.ultima_sincronizacion = time.time()
+                    if al_sincronizar is not None:
+                        try:
+                            al_sincronizar(filas)
+                        except Exception as e:
+                            # Las filas ya están en el almacén; lo que se pierde es el aviso
+                            # (cache y ranking), así que se reporta como error del diario
+                            self.ultimo_error = f"Error al aplicar lo sincronizado: {e}"
+                            self.fallos_al_sincronizar += 1
+                    continue
+                if self.pendientes():
+                    # Todo el lote fue rechazado: seguir con los envíos que siguen
+                    continue
+                self._hay_pendientes.wait(timeout=5)
+                self._hay_pendientes.clear()
+
+        self._hilo = threading.Thread(target=ciclo, daemon=True)
+        self._hilo.start()
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+
+from puntajes import LLAVE_CALIFICACION, validar_calificaciones
+from rubrica import TEMAS, CRITERIOS
+
+# Esquema compacto de calificaciones: en lugar de repetir en cada fila el
+# tema, la categoría y la frase completa del criterio, se guardan ids
+# enteros pequeños y los puntos como medios puntos enteros (el paso de la
+# UI es 0.5), así las sumas son exactas.
+#
+# Temas y criterios tienen id fijo por su posición en rubrica.py (solo se
+# deben agregar al final); equipos y jueces se registran en un catálogo.
+
+LLAVE_COMPACTA = ('tema_id', 'equipo_id', 'juez_id', 'criterio_id')
+COLUMNAS_COMPACTAS = LLAVE_COMPACTA + ('cumple', 'medios')
+
+TEMA_ID = {tema: i for i, tema in enumerate(TEMAS, start=1)}
+TEMA_POR_ID = {i: tema for tema, i in TEMA_ID.items()}
+CRITERIO_ID = {}
+CRITERIO_POR_ID = {}
+for _categoria, _criterios in CRITERIOS.items():
+    for _criterio in _criterios:
+        CRITERIO_ID[(_categoria, _criterio)] = len(CRITERIO_ID) + 1
+        CRITERIO_POR_ID[len(CRITERIO_ID)] = (_categoria, _criterio)
+
+TIPOS = ('equipo', 'juez')
+
+
+def a_medios(puntos):
+    return int(round(float(puntos) * 2))
+
+
+class Catalogo:
+    """Ids de equipos y jueces, en ambos sentidos."""
+
+    def __init__(self, nombres=()):
+        # nombres: iterable de (tipo, id, nombre), como las filas de la tabla nombres
+        self._ids = {tipo: {} for tipo in TIPOS}
+        self._nombres = {tipo: {} for tipo in TIPOS}
+        for tipo, id_nombre, nombre in nombres:
+            self.registrar(tipo, int(id_nombre), nombre)
+
+    def registrar(self, tipo, id_nombre, nombre):
+        self._ids[tipo][nombre] = id_nombre
+        self._nombres[tipo][id_nombre] = nombre
+
+    def id(self, tipo, nombre):
+        return self._ids[tipo].get(nombre)
+
+    def nombre(self, tipo, id_nombre):
+        return self._nombres[tipo].get(id_nombre)
+
+    def faltantes(self, tipo, nombres):
+        # (tipo, id, nombre) para los nombres aún sin id, con ids consecutivos
+        siguiente = max(self._nombres[tipo], default=0) + 1
+        nuevos = []
+        for nombre in dict.fromkeys(nombres):
+            if nombre not in self._ids[tipo]:
+                nuevos.append((tipo, siguiente, nombre))
+                siguiente += 1
+        return nuevos
+
+    def nombres(self, tipo):
+        return [self._nombres[tipo][i] for i in sorted(self._nombres[tipo])]
+
+
+def codificar(calificaciones, catalogo):
+    # Valida igual que los demás almacenes y regresa (filas compactas, errores por fila)
+    filas, errores = validar_calificaciones(calificaciones)
+    if errores:
+        return [], errores
+    compactas = []
+    for i, f in enumerate(filas):
+        ids = (
+            TEMA_ID.get(f['tema']),
+            catalogo.id('equipo', f['equipo']),
+            catalogo.id('juez', f['juez']),
+            CRITERIO_ID.get((f['categoria'], f['criterio']))
+        )
+        if None in ids:
+            campo = ('tema', 'equipo', 'juez', 'criterio')[ids.index(None)]
+            errores.append({'fila': i, 'criterio': f['criterio'], 'error': f"{campo.capitalize()} no registrado"})
+            continue
+        compactas.append(dict(zip(LLAVE_COMPACTA, ids), cumple=f['cumple'], medios=a_medios(f['puntos'])))
+    return (compactas, errores) if not errores else ([], errores)
+
+
+def decodificar(df, catalogo, columnas=None):
+    """Convierte filas compactas al DataFrame de siempre, sin crear strings por fila.
+
+    Las llaves salen como Categorical (códigos enteros más un solo
+    diccionario de nombres por columna) y los puntos se calculan desde los
+    medios puntos int16.
+    """
+    columnas = list(columnas) if columnas else list(LLAVE_CALIFICACION) + ['cumple', 'puntos']
+    datos = {}
+    n = len(df)
+
+    def categorica(ids, por_id):
+        categorias = list(dict.fromkeys(por_id.values()))
+        posicion = {i: categorias.index(nombre) for i, nombre in por_id.items()}
+        codigos = np.fromiter((posicion.get(i, -1) for i in ids), dtype=np.int16, count=len(ids))
+        return pd.Categorical.from_codes(codigos, categories=categorias)
+
+    criterios = df['criterio_id'].to_numpy() if 'criterio_id' in df else np.zeros(n, dtype=int)
+    for columna in columnas:
+        if columna == 'tema':
+            datos[columna] = categorica(df['tema_id'].to_numpy(), TEMA_POR_ID)
+        elif columna in TIPOS:
+            datos[columna] = categorica(df[f'{columna}_id'].to_numpy(), catalogo._nombres[columna])
+        elif columna == 'categoria':
+            datos[columna] = categorica(criterios, {i: c for i, (c, _) in CRITERIO_POR_ID.items()})
+        elif columna == 'criterio':
+            datos[columna] = categorica(criterios, {i: c for i, (_, c) in CRITERIO_POR_ID.items()})
+        elif columna == 'cumple':
+            datos[columna] = df['cumple'].astype(bool).to_numpy()
+        elif columna == 'medios':
+            datos[columna] = df['medios'].to_numpy().astype(np.int16)
+        elif columna == 'puntos':
+            datos[columna] = df['medios'].to_numpy().astype(np.int16) / 2
+        else:
+            raise ValueError(f"Columna desconocida: {columna}")
+    return pd.DataFrame(datos, columns=columnas)
+
+
+def decodificar_registro(registro, catalogo):
+    # Para un registro suelto de Realtime; los campos que no vengan se omiten
+    if not registro:
+        return registro
+    fila = {}
+    if 'tema_id' in registro:
+        fila['tema'] = TEMA_POR_ID.get(registro['tema_id'])
+    for tipo in TIPOS:
+        if f'{tipo}_id' in registro:
+            fila[tipo] = catalogo.nombre(tipo, registro[f'{tipo}_id'])
+    if 'criterio_id' in registro and registro['criterio_id'] in CRITERIO_POR_ID:
+        fila['categoria'], fila['criterio'] = CRITERIO_POR_ID[registro['criterio_id']]
+    if 'cumple' in registro:
+        fila['cumple'] = bool(registro['cumple'])
+    if 'medios' in registro:
+        fila['puntos'] = registro['medios'] / 2
+    return fila
+
+
+def columnas_compactas(columnas):
+    # Columnas compactas que hay que pedir para armar las columnas normales pedidas
+    columnas = list(columnas) if columnas else list(LLAVE_CALIFICACION) + ['cumple', 'puntos']
+    necesarias = []
+    for columna in columnas:
+        if columna in ('categoria', 'criterio'):
+            necesarias.append('criterio_id')
+        elif columna in ('tema',) + TIPOS:
+            necesarias.append(f'{columna}_id')
+        elif columna in ('puntos', 'medios'):
+            necesarias.append('medios')
+        else:
+            necesarias.append(columna)
+    return list(dict.fromkeys(necesarias))
@@ -0,0 +1,47 @@
+import hashlib
+from io import BytesIO
+
+import pandas as pd
+
+from ranking import calcular_ranking_df
+
+
+def version_datos(df):
+    # Huella del contenido: cambia si cambia cualquier fila o columna
+    huella = hashlib.sha1(','.join(map(str, df.columns)).encode())
+    if not df.empty:
+        huella.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return huella.hexdigest()
+
+
+def _escribir_hoja(wb, titulo, df):
+    ws = wb.create_sheet(title=titulo)
+    ws.append([str(c) for c in df.columns])
+    valores = df.astype(object).where(df.notna(), None)
+    for fila in valores.itertuples(index=False, name=None):
+        ws.append(list(fila))
+
+
+def generar_excel(df, temas):
+    """Arma el Excel a partir de una sola foto de los datos.
+
+    Los rankings y el detalle salen del mismo DataFrame, así que todas las
+    hojas son consistentes aunque un juez guarde durante la exportación.
+    openpyxl en modo write-only escribe fila por fila sin armar cada hoja
+    completa en memoria.
+    """
+    from openpyxl import Workbook  # solo quien exporta paga la importación
+
+    wb = Workbook(write_only=True)
+    if not df.empty:
+        for tema in temas:
+            ranking = calcular_ranking_df(df, tema)
+            if not ranking.empty:
+                _escribir_hoja(wb, tema.split('.')[1].strip()[:31], ranking)
+        _escribir_hoja(wb, 'Detalle Completo', df)
+    else:
+        wb.create_sheet(title='Detalle Completo')
+
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+from ranking import seleccionar_top
+from rubrica import TEMAS, CRITERIOS
+
+# Calificaciones de app.py como arreglos densos indexados por
+# [tema, equipo, juez, criterio]. Los temas con menos equipos dejan ceros al
+# final del eje de equipos; `calificado` marca las celdas que el juez ya vio
+# en el formulario (las que salen en la hoja de detalle).
+
+LISTA_CRITERIOS = [(categoria, criterio) for categoria, criterios in CRITERIOS.items() for criterio in criterios]
+_CATEGORIAS = np.array([categoria for categoria, _ in LISTA_CRITERIOS], dtype=object)
+_CRITERIOS = np.array([criterio for _, criterio in LISTA_CRITERIOS], dtype=object)
+
+
+class MatrizCalificaciones:
+    def __init__(self, jueces, equipos_por_tema):
+        self.jueces = list(jueces)
+        self.equipos_por_tema = {tema: list(equipos_por_tema.get(tema, [])) for tema in TEMAS}
+        self._tema = {tema: i for i, tema in enumerate(TEMAS)}
+        self._juez = {}
+        for i, juez in enumerate(self.jueces):
+            self._juez.setdefault(juez, i)
+        self._equipo = {}
+        for tema, equipos in self.equipos_por_tema.items():
+            indices = self._equipo[tema] = {}
+            for i, equipo in enumerate(equipos):
+                indices.setdefault(equipo, i)
+        self._criterio = {llave: i for i, llave in enumerate(LISTA_CRITERIOS)}
+
+        n_equipos = max((len(e) for e in self.equipos_por_tema.values()), default=0)
+        forma = (len(TEMAS), n_equipos, len(self.jueces), len(LISTA_CRITERIOS))
+        self.puntos = np.zeros(forma, dtype=np.float32)
+        self.cumple = np.zeros(forma, dtype=bool)
+        self.calificado = np.zeros(forma, dtype=bool)
+        # Nombre de cada equipo por [tema, equipo]; None en el relleno
+        self._nombres_equipo = np.full(forma[:2], None, dtype=object)
+        for tema, equipos in self.equipos_por_tema.items():
+            self._nombres_equipo[self._tema[tema], :len(equipos)] = equipos
+
+    def indice(self, tema, equipo, juez, categoria, criterio):
+        # Tupla de índices o None si algún nombre no está en la configuración
+        try:
+            return (self._tema[tema], self._equipo[tema][equipo], self._juez[juez],
+                    self._criterio[(categoria, criterio)])
+        except KeyError:
+            return None
+
+    def asignar(self, filas):
+        # filas: dicts ya validados. Si alguna no cabe en la matriz no se escribe
+        # nada (como los demás almacenes) y se regresan sus posiciones
+        indices, cumple, puntos, fuera = [], [], [], []
+        for n, f in enumerate(filas):
+            i = self.indice(f['tema'], f['equipo'], f['juez'], f['categoria'], f['criterio'])
+            if i is None:
+                fuera.append(n)
+                continue
+            indices.append(i)
+            cumple.append(f['cumple'])
+            puntos.append(f['puntos'])
+        if indices and not fuera:
+            celdas = tuple(np.array(indices).T)
+            self.cumple[celdas] = cumple
+            self.puntos[celdas] = puntos
+            self.calificado[celdas] = True
+        return fuera
+
+    def copiar_de(self, otra):
+        # Celdas de otra matriz cuyos tema, equipo y juez también están en esta
+        pares_juez = [(i, otra._juez[juez]) for juez, i in self._juez.items() if juez in otra._juez]
+        if not pares_juez:
+            return
+        jueces_aqui, jueces_alla = map(list, zip(*pares_juez))
+        for tema, t in self._tema.items():
+            pares_equipo = [(i, otra._equipo[tema][equipo]) for equipo, i in self._equipo[tema].items()
+                            if equipo in otra._equipo[tema]]
+            if not pares_equipo:
+                continue
+            equipos_aqui, equipos_alla = map(list, zip(*pares_equipo))
+            aqui = np.ix_([t], equipos_aqui, jueces_aqui, range(len(LISTA_CRITERIOS)))
+            alla = np.ix_([otra._tema[tema]], equipos_alla, jueces_alla, range(len(LISTA_CRITERIOS)))
+            self.puntos[aqui] = otra.puntos[alla]
+            self.cumple[aqui] = otra.cumple[alla]
+            self.calificado[aqui] = otra.calificado[alla]
+
+    def valor(self, tema, equipo, juez, categoria, criterio):
+        # (cumple, puntos) para los valores por defecto del formulario
+        i = self.indice(tema, equipo, juez, categoria, criterio)
+        if i is None:
+            return False, 0.0
+        return bool(self.cumple[i]), float(self.puntos[i])
+
+    def totales(self):
+        # [tema, equipo, juez]: suma de los criterios que cumplen
+        return np.where(self.cumple, self.puntos, 0).sum(axis=3, dtype=np.float64)
+
+    def ranking(self, tema, totales=None, k=None, inicio=0, incluir=()):
+        # Mismas columnas que ranking.ranking_desde_totales, con todos los equipos y jueces;
+        # con k solo los lugares inicio+1 .. inicio+k y los equipos de incluir
+        equipos = self.equipos_por_tema[tema]
+        if not equipos:
+            return pd.DataFrame()
+        totales = self.totales() if totales is None else totales
+        indices = [self._equipo[tema][equipo] for equipo in equipos]
+        por_juez = totales[self._tema[tema]][indices][:, [self._juez[j] for j in self.jueces]]
+        promedio = por_juez.mean(axis=1) if self.jueces else np.zeros(len(equipos))
+        if k is None:
+            orden = np.argsort(-promedio, kind='stable')
+            posiciones = np.arange(1, len(equipos) + 1)
+        else:
+            orden, posiciones = seleccionar_top(promedio, k, inicio,
+                                                [equipos.index(e) for e in incluir if e in self._equipo[tema]])
+
+        df = pd.DataFrame(por_juez[orden], columns=self.jueces)
+        df.insert(0, 'equipo', np.array(equipos, dtype=object)[orden])
+        df.insert(0, 'Posición', posiciones)
+        df['Promedio'] = promedio[orden]
+        return df
+
+    def rankings(self):
+        # Todos los temas con una sola reducción
+        totales = self.totales()
+        return {tema: self.ranking(tema, totales) for tema in TEMAS}
+
+    def filas(self, solo_calificadas=True, puntos_guardados=False):
+        # Celdas como DataFrame largo (tema, equipo, juez, categoria, criterio, cumple, puntos).
+        # Los puntos salen en 0 donde no cumple, como los suma el ranking; con puntos_guardados
+        # salen tal cual los guardó el formulario (la hoja de detalle del Excel)
+        existe = (self._nombres_equipo != None)[:, :, None, None]  # noqa: E711
+        mascara = (self.calificado if solo_calificadas else True) & existe
+        t, e, j, c = np.nonzero(np.broadcast_to(mascara, self.calificado.shape))
+        cumple = self.cumple[t, e, j, c]
+        return pd.DataFrame({
+            'tema': np.array(TEMAS, dtype=object)[t],
+            'equipo': self._nombres_equipo[t, e],
+            'juez': np.array(self.jueces, dtype=object)[j],
+            'categoria': _CATEGORIAS[c],
+            'criterio': _CRITERIOS[c],
+            'cumple': cumple,
+            'puntos': (self.puntos[t, e, j, c] if puntos_guardados
+                       else np.where(cumple, self.puntos[t, e, j, c], 0)).astype(np.float64)
+        }, columns=['tema', 'equipo', 'juez', 'categoria', 'criterio', 'cumple', 'puntos'])
+
+    def limpiar(self):
+        self.puntos[:] = 0
+        self.cumple[:] = False
+        self.calificado[:] = False
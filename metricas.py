@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+# Métricas del proceso: histogramas de duración por operación y contadores.
+# El registro vive a nivel de módulo, así que lo comparten todas las sesiones
+# de Streamlit del mismo proceso y sobrevive a los reruns.
+
+# Límites de los buckets del histograma, en milisegundos
+LIMITES_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class _Histograma:
+    def __init__(self, muestras):
+        self.n = 0
+        self.suma = 0.0
+        self.buckets = [0] * (len(LIMITES_MS) + 1)
+        self.recientes = deque(maxlen=muestras)  # para los percentiles
+
+    def observar(self, ms):
+        self.n += 1
+        self.suma += ms
+        self.recientes.append(ms)
+        for i, limite in enumerate(LIMITES_MS):
+            if ms <= limite:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+
+class RegistroMetricas:
+    def __init__(self, muestras=1000):
+        self.muestras = muestras
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self._histogramas = {}  # operación -> _Histograma
+            self._contadores = {}   # (nombre, etiquetas) -> valor
+            self.desde = time.time()
+
+    def observar(self, operacion, ms):
+        with self._lock:
+            histograma = self._histogramas.get(operacion)
+            if histograma is None:
+                histograma = self._histogramas[operacion] = _Histograma(self.muestras)
+            histograma.observar(ms)
+
+    def contar(self, nombre, n=1, **etiquetas):
+        llave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._contadores[llave] = self._contadores.get(llave, 0) + n
+
+    @contextmanager
+    def medir(self, operacion):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(operacion, (time.perf_counter() - inicio) * 1000)
+
+    def medido(self, operacion):
+        # Decorador: mide cada llamada a la función como un span
+        def decorador(funcion):
+            @wraps(funcion)
+            def envoltura(*args, **kwargs):
+                with self.medir(operacion):
+                    return funcion(*args, **kwargs)
+            return envoltura
+        return decorador
+
+    def consulta_cache(self, cache):
+        self.contar('cache_consultas', cache=cache)
+
+    def fallo_cache(self, cache):
+        # Se llama desde dentro de la función cacheada: solo corre cuando no hubo acierto
+        self.contar('cache_fallos', cache=cache)
+
+    def instantanea(self):
+        with self._lock:
+            histogramas = {
+                operacion: (h.n, h.suma, list(h.buckets), list(h.recientes))
+                for operacion, h in self._histogramas.items()
+            }
+            contadores = dict(self._contadores)
+
+        operaciones = {}
+        for operacion, (n, suma, buckets, recientes) in sorted(histogramas.items()):
+            p50, p95, p99 = np.percentile(recientes, (50, 95, 99)) if recientes else (0.0, 0.0, 0.0)
+            operaciones[operacion] = {
+                'n': n, 'suma_ms': round(suma, 3), 'promedio_ms': round(suma / n, 3) if n else 0.0,
+                'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3), 'p99_ms': round(float(p99), 3),
+                'buckets': dict(zip([str(l) for l in LIMITES_MS] + ['+Inf'], buckets))
+            }
+
+        caches = {}
+        for (nombre, etiquetas), valor in contadores.items():
+            if nombre in ('cache_consultas', 'cache_fallos'):
+                cache = dict(etiquetas)['cache']
+                caches.setdefault(cache, {'consultas': 0, 'fallos': 0})[nombre.split('_')[1]] = valor
+        for datos in caches.values():
+            # Las funciones cacheadas pueden llamarse sin pasar por el contador (p. ej. desde otra cacheada)
+            datos['aciertos'] = max(0, datos['consultas'] - datos['fallos'])
+            datos['tasa_aciertos'] = round(datos['aciertos'] / datos['consultas'], 3) if datos['consultas'] else None
+
+        return {
+            'desde': self.desde,
+            'operaciones': operaciones,
+            'caches': dict(sorted(caches.items())),
+            'contadores': [
+                {'nombre': nombre, 'etiquetas': dict(etiquetas), 'valor': valor}
+                for (nombre, etiquetas), valor in sorted(contadores.items())
+            ]
+        }
+
+    def a_json(self):
+        return json.dumps(self.instantanea(), ensure_ascii=False, indent=2)
+
+    def a_prometheus(self, prefijo='calificaciones'):
+        # Formato de texto de Prometheus; los histogramas van en segundos, como pide la convención
+        datos = self.instantanea()
+        lineas = [
+            f"# HELP {prefijo}_duracion_segundos Duración de las operaciones instrumentadas",
+            f"# TYPE {prefijo}_duracion_segundos histogram"
+        ]
+        for operacion, h in datos['operaciones'].items():
+            acumulado = 0
+            for limite, cuenta in h['buckets'].items():
+                acumulado += cuenta
+                le = limite if limite == '+Inf' else repr(int(limite) / 1000)
+                lineas.append(f'{prefijo}_duracion_segundos_bucket{{operacion="{operacion}",le="{le}"}} {acumulado}')
+            lineas.append(f'{prefijo}_duracion_segundos_sum{{operacion="{operacion}"}} {h["suma_ms"] / 1000}')
+            lineas.append(f'{prefijo}_duracion_segundos_count{{operacion="{operacion}"}} {h["n"]}')
+
+        nombres = sorted({c['nombre'] for c in datos['contadores']})
+        for nombre in nombres:
+            lineas.append(f"# TYPE {prefijo}_{nombre}_total counter")
+            for c in datos['contadores']:
+                if c['nombre'] != nombre:
+                    continue
+                etiquetas = ','.join(f'{k}="{v}"' for k, v in c['etiquetas'].items())
+                lineas.append(f"{prefijo}_{nombre}_total{{{etiquetas}}} {c['valor']}" if etiquetas
+                              else f"{prefijo}_{nombre}_total {c['valor']}")
+        return '\n'.join(lineas) + '\n'
+
+    def tabla(self):
+        # Filas listas para st.dataframe en la pestaña de métricas
+        return [
+            {'Operación': operacion, 'Llamadas': h['n'], 'Promedio ms': h['promedio_ms'],
+             'p50 ms': h['p50_ms'], 'p95 ms': h['p95_ms'], 'p99 ms': h['p99_ms']}
+            for operacion, h in self.instantanea()['operaciones'].items()
+        ]
+
+
+registro = RegistroMetricas()
+medir = registro.medir
+medido = registro.medido
+contar = registro.contar
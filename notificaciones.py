@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+# Avisos de cambios en la tabla calificaciones. Un hilo en segundo plano
+# escucha a Supabase Realtime (o al cliente local) y sube la versión del
+# tema afectado; cada sesión compara esa versión para saber si debe
+# volver a dibujarse, sin dormir un hilo ni re-ejecutar el script en vano.
+
+TODOS = '*'
+
+
+class Notificador:
+    def __init__(self, traducir=None):
+        # traducir(registro) -> registro con tema/equipo/... (p. ej. desde el esquema compacto)
+        self.traducir = traducir
+        self._lock = threading.Lock()
+        self._versiones = {}
+        self._oyentes = []
+        self.escuchando = False
+        self.error = None
+
+    def version(self, tema=None):
+        # Los cambios sin tema conocido (p. ej. un DELETE) cuentan para todos;
+        # sin tema es la suma de todos los cambios
+        with self._lock:
+            if tema is None:
+                return sum(self._versiones.values())
+            return self._versiones.get(tema, 0) + self._versiones.get(TODOS, 0)
+
+    def suscribir(self, callback):
+        self._oyentes.append(callback)
+
+    def notificar(self, evento, registro=None, anterior=None):
+        temas = {fila.get('tema') for fila in (registro, anterior) if fila}
+        temas.discard(None)
+        with self._lock:
+            for tema in temas or [TODOS]:
+                self._versiones[tema] = self._versiones.get(tema, 0) + 1
+        for oyente in self._oyentes:
+            oyente(evento, registro, anterior)
+
+    def _recibir(self, payload):
+        datos = payload['data']
+        registro, anterior = datos.get('record'), datos.get('old_record')
+        if self.traducir is not None:
+            registro, anterior = self.traducir(registro), self.traducir(anterior)
+        # realtime manda un enum (RealtimePostgresChangesListenEvent); str() no da 'DELETE'
+        tipo = datos['type']
+        self.notificar(getattr(tipo, 'value', tipo), registro, anterior)
+
+
+def escuchar_supabase(notificador, url, key, tabla='calificaciones', evento=None):
+    # Corre el cliente async de Realtime en su propio hilo y event loop, sin esperarlo:
+    # escuchando pasa a True cuando el canal queda suscrito y, si falla, el error
+    # queda en notificador.error. Con evento, Realtime solo manda los cambios de ese evento
+    from supabase import acreate_client
+
+    async def suscribir():
+        cliente = await acreate_client(url, key)
+        canal = cliente.channel(f'cambios-{tabla}')
+        canal.on_postgres_changes('*', schema='public', table=tabla, callback=notificador._recibir,
+                                  filter=f'evento=eq.{evento}' if evento is not None else None)
+        await canal.subscribe()
+
+    def correr():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(suscribir())
+        except Exception as e:
+            notificador.error = e
+            return
+        notificador.escuchando = True
+        loop.run_forever()
+
+    threading.Thread(target=correr, name=f'escucha-{tabla}', daemon=True).start()
+
+
+def escuchar_local(notificador, cliente, tabla='calificaciones', evento=None):
+    # Misma interfaz que escuchar_supabase, pero con supabase_local.ClienteLocal
+    def recibir(payload):
+        datos = payload['data']
+        if datos['table'] != tabla:
+            return
+        # Como el filtro de Realtime: los DELETE no traen el evento y siempre pasan
+        if evento is not None and datos.get('record') and datos['record'].get('evento') != evento:
+            return
+        notificador._recibir(payload)
+
+    cliente.suscribir_cambios(recibir)
+    notificador.escuchando = True
+    return True
@@ -0,0 +1,73 @@
+import pandas as pd
+
+# Llave de una calificación: (tema, equipo, juez, categoria, criterio)
+LLAVE_CALIFICACION = ('tema', 'equipo', 'juez', 'categoria', 'criterio')
+
+
+def a_booleano(valor):
+    # Supabase regresa bool, Google Sheets regresa "TRUE"/"FALSE" como texto
+    if isinstance(valor, str):
+        return valor.strip().upper() == "TRUE"
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return False
+    return bool(valor)
+
+
+def indexar_calificaciones(df, columnas=LLAVE_CALIFICACION, cumple='cumple', puntos='puntos'):
+    """Convierte un DataFrame de calificaciones en un dict llave -> (cumple, puntos).
+
+    Se construye una vez por generación del cache para que el formulario
+    haga búsquedas O(1) en lugar de filtrar el DataFrame por cada criterio.
+    Si una llave aparece varias veces se conserva la primera fila.
+    """
+    if df.empty:
+        return {}
+    valores_cumple = df[cumple].map(a_booleano)
+    valores_puntos = pd.to_numeric(df[puntos], errors='coerce').fillna(0.0)
+    indice = {}
+    for llave, c, p in zip(zip(*(df[col] for col in columnas)), valores_cumple, valores_puntos):
+        indice.setdefault(llave, (bool(c), float(p)))
+    return indice
+
+
+def _validar_fila(calif):
+    for campo in LLAVE_CALIFICACION:
+        if not calif.get(campo):
+            return f"Falta el campo '{campo}'"
+    try:
+        puntos = float(calif.get('puntos', 0))
+    except (TypeError, ValueError):
+        return f"Puntos inválidos: {calif.get('puntos')!r}"
+    if not 0 <= puntos <= 10:
+        return f"Puntos fuera de rango (0-10): {puntos}"
+    if not (puntos * 2).is_integer():
+        # Se guardan como medios puntos enteros: otro valor se redondearía sin aviso
+        return f"Puntos deben ir en pasos de 0.5: {puntos}"
+    return None
+
+
+def validar_calificaciones(calificaciones):
+    # Regresa (filas limpias, errores por fila); lo usan todos los almacenes antes de escribir
+    filas = []
+    errores = []
+    vistas = set()
+    for i, calif in enumerate(calificaciones):
+        error = _validar_fila(calif)
+        llave = tuple(calif.get(campo) for campo in LLAVE_CALIFICACION)
+        if error is None and llave in vistas:
+            # Postgres rechaza todo el upsert si la misma llave aparece dos veces
+            error = "Criterio duplicado en el mismo envío"
+        if error:
+            errores.append({'fila': i, 'criterio': calif.get('criterio'), 'error': error})
+            continue
+        vistas.add(llave)
+        filas.append({
+            'tema': calif['tema'],
+            'equipo': calif['equipo'],
+            'juez': calif['juez'],
+            'categoria': calif['categoria'],
+            'criterio': calif['criterio'],
+            'cumple': a_booleano(calif.get('cumple', False)),
+            'puntos': float(calif.get('puntos', 0))
+        })
+    return filas, errores
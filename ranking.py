@@ -0,0 +1,242 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+import numpy as np
+import pandas as pd
+
+from puntajes import LLAVE_CALIFICACION
+
+# Las vistas de ranking solo dibujan estos equipos: la gráfica lleva el top
+# más el equipo destacado y la tabla va por páginas
+TOP_GRAFICA = 10
+TAMANO_PAGINA = 25
+
+
+def seleccionar_top(promedios, k, inicio=0, incluir=()):
+    """Índices y posiciones de los lugares inicio+1 .. inicio+k, más los de incluir.
+
+    heapq.nsmallest guarda solo inicio + k candidatos, O(n log k) en lugar
+    de ordenar a todos. Los empates quedan en el orden de entrada, igual que
+    el sort estable del ranking completo. incluir son índices (p. ej. el
+    equipo de quien mira) y salen con su posición real aunque no estén en la
+    página. Regresa (índices, posiciones) ordenados por posición.
+    """
+    valores = np.asarray(promedios, dtype=float)
+    mejores = heapq.nsmallest(inicio + k, range(len(valores)), key=lambda i: (-valores[i], i))[inicio:]
+    seleccion = list(zip(range(inicio + 1, inicio + len(mejores) + 1), mejores))
+    vistos = set(mejores)
+    for i in incluir:
+        if i in vistos or not 0 <= i < len(valores):
+            continue
+        vistos.add(i)
+        posicion = 1 + np.count_nonzero(valores > valores[i]) + np.count_nonzero(valores[:i] == valores[i])
+        seleccion.append((int(posicion), i))
+    seleccion.sort()
+    return [i for _, i in seleccion], [posicion for posicion, _ in seleccion]
+
+
+def ranking_desde_totales(resumen, equipos=None, jueces=None, k=None, inicio=0, incluir=()):
+    # resumen: una fila por (equipo, juez) con la suma de puntos.
+    # equipos/jueces opcionales completan con ceros a quien aún no tiene calificación.
+    # Con k solo regresa los lugares inicio+1 .. inicio+k y los equipos de incluir.
+    if resumen.empty and not equipos:
+        return pd.DataFrame()
+    pivot = resumen.pivot(index='equipo', columns='juez', values='puntos').fillna(0)
+    if equipos is not None or jueces is not None:
+        pivot = pivot.reindex(
+            index=equipos if equipos is not None else pivot.index,
+            columns=jueces if jueces is not None else pivot.columns,
+            fill_value=0
+        )
+        pivot.index.name = 'equipo'
+    pivot['Promedio'] = pivot.mean(axis=1) if len(pivot.columns) else 0.0
+    if k is None:
+        pivot = pivot.sort_values('Promedio', ascending=False, kind='stable')
+        pivot.insert(0, 'Posición', range(1, len(pivot) + 1))
+    else:
+        posiciones_incluir = pivot.index.get_indexer(list(incluir))
+        filas, posiciones = seleccionar_top(pivot['Promedio'].to_numpy(), k, inicio,
+                                            [i for i in posiciones_incluir if i >= 0])
+        pivot = pivot.iloc[filas]
+        pivot.insert(0, 'Posición', posiciones)
+    return pivot.reset_index()
+
+
+def calcular_ranking_df(df, tema, equipos=None, jueces=None, k=None, inicio=0, incluir=()):
+    # Cálculo completo con pandas; es la referencia para verificar el motor incremental
+    df_tema = df[df['tema'] == tema] if 'tema' in df.columns else df
+    if df_tema.empty and not equipos:
+        return pd.DataFrame()
+    resumen = df_tema.groupby(['equipo', 'juez'])['puntos'].sum().reset_index()
+    return ranking_desde_totales(resumen, equipos, jueces, k, inicio, incluir)
+
+
+class MotorRanking:
+    """Ranking por tema que se actualiza con deltas de filas.
+
+    Guarda el puntaje vigente de cada fila (llave de 5 campos), los totales
+    por (tema, equipo, juez) y una lista ordenada por total para cada tema.
+    Como todos los equipos de un tema se promedian entre los mismos jueces,
+    ordenar por suma es lo mismo que ordenar por promedio, y leer un ranking
+    cuesta O(equipos) en lugar de recorrer todas las filas.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._lock_carga = threading.Lock()
+        self.ultima_sincronizacion = None
+        self.generacion = None
+        self._limpiar()
+
+    def _limpiar(self):
+        self._filas = {}      # llave -> puntos
+        self._tocadas = {}    # llave -> número del último aplicar() que la cambió
+        self._aplicados = 0
+        self._totales = {}    # tema -> equipo -> juez -> total
+        self._n_filas = {}    # (tema, equipo, juez) -> número de filas
+        self._conteos = {}    # tema -> juez -> filas de ese juez en el tema
+        self._orden = {}      # tema -> [(-suma, equipo)] ordenada
+        self._sumas = {}      # tema -> equipo -> suma de todos sus jueces
+
+    def _sumar(self, llave, delta, signo_fila):
+        tema, equipo, juez = llave[0], llave[1], llave[2]
+        por_equipo = self._totales.setdefault(tema, {}).setdefault(equipo, {})
+        por_equipo[juez] = por_equipo.get(juez, 0.0) + delta
+
+        if signo_fila:
+            grupo = (tema, equipo, juez)
+            self._n_filas[grupo] = self._n_filas.get(grupo, 0) + signo_fila
+            conteos = self._conteos.setdefault(tema, {})
+            conteos[juez] = conteos.get(juez, 0) + signo_fila
+            if conteos[juez] == 0:
+                del conteos[juez]
+            if self._n_filas[grupo] == 0:
+                del self._n_filas[grupo]
+                del por_equipo[juez]
+
+        sumas = self._sumas.setdefault(tema, {})
+        orden = self._orden.setdefault(tema, [])
+        anterior = sumas.get(equipo)
+        if anterior is not None:
+            del orden[bisect_left(orden, (-anterior, equipo))]
+        if not por_equipo:
+            # El equipo ya no tiene filas: sale del ranking
+            sumas.pop(equipo, None)
+            del self._totales[tema][equipo]
+            return
+        nueva = (anterior or 0.0) + delta
+        sumas[equipo] = nueva
+        insort(orden, (-nueva, equipo))
+
+    def aplicar(self, filas):
+        # Aplica filas nuevas o modificadas (por ejemplo, las de un upsert)
+        with self._lock:
+            self._aplicados += 1
+            for fila in filas:
+                llave = tuple(fila[campo] for campo in LLAVE_CALIFICACION)
+                puntos = float(fila.get('puntos') or 0)
+                anterior = self._filas.get(llave)
+                self._filas[llave] = puntos
+                self._tocadas[llave] = self._aplicados
+                if anterior is None:
+                    self._sumar(llave, puntos, 1)
+                elif anterior != puntos:
+                    self._sumar(llave, puntos - anterior, 0)
+
+    def quitar(self, llaves):
+        with self._lock:
+            for llave in llaves:
+                anterior = self._filas.pop(llave, None)
+                self._tocadas.pop(llave, None)
+                if anterior is not None:
+                    self._sumar(llave, -anterior, -1)
+
+    def sincronizar(self, filas, desde=None):
+        # Compara contra el contenido actual de la tabla y aplica solo las diferencias.
+        # desde: número de aplicar() al empezar a leer las filas; lo aplicado después es
+        # más nuevo que la lectura (que va por páginas) y no se toca
+        with self._lock:
+            vistas = set()
+            cambios = []
+            for fila in filas:
+                llave = tuple(fila[campo] for campo in LLAVE_CALIFICACION)
+                vistas.add(llave)
+                if desde is not None and self._tocadas.get(llave, 0) > desde:
+                    continue
+                if self._filas.get(llave) != float(fila.get('puntos') or 0):
+                    cambios.append(fila)
+            self.aplicar(cambios)
+            self.quitar([llave for llave in self._filas if llave not in vistas
+                         and (desde is None or self._tocadas.get(llave, 0) <= desde)])
+            self.ultima_sincronizacion = time.monotonic()
+
+    def refrescar(self, cargar_filas, ttl):
+        # Vuelve a leer la tabla completa solo si pasó el ttl; una sola sesión carga a la vez
+        if self.ultima_sincronizacion is not None and time.monotonic() - self.ultima_sincronizacion < ttl:
+            return
+        with self._lock_carga:
+            if self.ultima_sincronizacion is not None and time.monotonic() - self.ultima_sincronizacion < ttl:
+                return
+            desde = self._aplicados
+            self.sincronizar(cargar_filas(), desde)
+
+    def invalidar(self):
+        self.ultima_sincronizacion = None
+
+    def reconstruir(self, filas):
+        with self._lock:
+            self._limpiar()
+            self.sincronizar(filas)
+
+    def contar(self, tema):
+        # Equipos con calificaciones en el tema: las filas de ranking(tema)
+        with self._lock:
+            return len(self._orden.get(tema, []))
+
+    def ranking(self, tema, k=None, inicio=0, incluir=()):
+        # Con k solo arma los lugares inicio+1 .. inicio+k y los equipos de incluir:
+        # la lista ya está ordenada, así que cuesta O(k) sin importar cuántos equipos haya
+        with self._lock:
+            orden = self._orden.get(tema, [])
+            if not orden:
+                return pd.DataFrame()
+            if k is None:
+                seleccion = list(enumerate(orden, start=1))
+            else:
+                seleccion = list(enumerate(orden[inicio:inicio + k], start=inicio + 1))
+                en_pagina = {equipo for _, (_, equipo) in seleccion}
+                sumas = self._sumas[tema]
+                for equipo in incluir:
+                    if equipo in sumas and equipo not in en_pagina:
+                        en_pagina.add(equipo)
+                        llave = (-sumas[equipo], equipo)
+                        seleccion.append((bisect_left(orden, llave) + 1, llave))
+                seleccion.sort()
+            jueces = sorted(self._conteos.get(tema, {}))
+            totales = self._totales[tema]
+            registros = []
+            for posicion, (suma_neg, equipo) in seleccion:
+                registro = {'equipo': equipo, 'Posición': posicion}
+                for juez in jueces:
+                    registro[juez] = totales[equipo].get(juez, 0.0)
+                registro['Promedio'] = -suma_neg / len(jueces) if jueces else 0.0
+                registros.append(registro)
+        return pd.DataFrame(registros, columns=['equipo', 'Posición'] + jueces + ['Promedio'])
+
+    def verificar(self, filas):
+        # Compara el estado incremental contra un cálculo completo con pandas
+        df = pd.DataFrame(filas, columns=list(LLAVE_CALIFICACION) + ['puntos'])
+        diferencias = []
+        for tema in set(df['tema']) | set(self._orden):
+            esperado = calcular_ranking_df(df, tema)
+            obtenido = self.ranking(tema)
+            if esperado.empty and obtenido.empty:
+                continue
+            esperado = esperado.set_index('equipo')['Promedio']
+            obtenido = obtenido.set_index('equipo')['Promedio'] if not obtenido.empty else pd.Series(dtype=float)
+            if set(esperado.index) != set(obtenido.index) or \
+                    (esperado - obtenido.reindex(esperado.index)).abs().max() > 1e-9:
+                diferencias.append(tema)
+        return diferencias
@@ -0,0 +1,37 @@
+# Temas y criterios del Solution Challenge 2025-B, compartidos por las tres apps
+
+TEMAS = [
+    "1. SOP - Síndrome de Ovario Poliquístico",
+    "2. Interfaz IA El Castillo de Tequila",
+    "3. Pronóstico de Demanda Grupo Collins",
+    "4. Conflicto Vial López Mateos"
+]
+
+CRITERIOS = {
+    "FORMALIDAD DE LA PRESENTACIÓN": [
+        "Se presentó el día y la hora establecidos",
+        "Se respetó el tiempo de duración de la exposición",
+        "La vestimenta es casual formal"
+    ],
+    "HABILIDADES COMUNICATIVAS": [
+        "Habla de forma natural, sin titubeos, haciendo fluido el mensaje",
+        "Utiliza una postura corporal con la que muestra seguridad de lo que está hablando",
+        "La transmisión del mensaje es efectiva"
+    ],
+    "DOMINIO DEL TEMA": [
+        "Muestra excelente dominio del tema",
+        "Puede contestar con precisión todas las preguntas planteadas"
+    ],
+    "SOLUTION VALUE": [
+        "Identificó con precisión las variables",
+        "El método es claro y consiso",
+        "El razonamiento matemático es claro y congruente",
+        "La interpretación matemática es fiable",
+        "La solution aporta valor agregado, creatividad e innovación"
+    ]
+}
+
+# Equipos por tema que acepta la configuración. Con más de EQUIPOS_EN_CAMPOS
+# los nombres se capturan como lista (uno por línea) en lugar de un campo por equipo
+MAX_EQUIPOS = 500
+EQUIPOS_EN_CAMPOS = 12
@@ -0,0 +1,257 @@
+import random
+import threading
+import time
+
+try:
+    # Realtime manda el tipo de cambio como este enum, no como texto
+    from realtime import RealtimePostgresChangesListenEvent as TipoCambio
+except ImportError:
+    TipoCambio = None
+
+# Cliente en memoria que imita la parte de supabase-py/PostgREST que usa la app.
+# Sirve para correr sin red: respeta on_conflict en los upserts y corta cada
+# respuesta en max_filas igual que el max-rows de PostgREST. Con latencia (en
+# segundos, más una variación aleatoria) cada petición tarda como un viaje de red.
+
+# Vistas de solo lectura: nombre -> (tabla, columnas del GROUP BY, columna sumada)
+VISTAS = {
+    'totales_calificaciones': ('calificaciones', ('evento', 'tema', 'equipo', 'juez'), 'puntos'),
+    'totales_puntajes': ('puntajes', ('evento', 'tema_id', 'equipo_id', 'juez_id'), 'medios')
+}
+
+# Tablas particionadas por evento (ver el README)
+PARTICIONADAS = ('calificaciones', 'puntajes')
+
+
+class Respuesta:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class ClienteLocal:
+    def __init__(self, max_filas=1000, latencia=0.0, variacion=0.0):
+        self.max_filas = max_filas
+        self.latencia = latencia
+        self.variacion = variacion
+        self.tablas = {'calificaciones': [], 'config': []}
+        self.peticiones = 0
+        self.peticiones_por_tipo = {}  # (tabla, operación) -> número de peticiones
+        self._siguiente_id = {}
+        self._oyentes = []
+        self._lock = threading.Lock()
+
+    def table(self, nombre):
+        return _Consulta(self, nombre)
+
+    def rpc(self, nombre, params=None):
+        return _Rpc(self, nombre, params or {})
+
+    def suscribir_cambios(self, callback):
+        # callback recibe un payload con la forma de Supabase Realtime
+        self._oyentes.append(callback)
+
+    def _emitir(self, cambios):
+        for tabla, tipo, registro, anterior in cambios:
+            if TipoCambio is not None:
+                tipo = TipoCambio(tipo)
+            payload = {'data': {'table': tabla, 'type': tipo, 'record': registro, 'old_record': anterior}}
+            for oyente in self._oyentes:
+                oyente(payload)
+
+    def _esperar_red(self):
+        # Fuera del lock: las peticiones concurrentes se traslapan como en un servidor real
+        espera = self.latencia + random.uniform(0, self.variacion) if self.variacion else self.latencia
+        if espera > 0:
+            time.sleep(espera)
+
+    def _nuevo_id(self, tabla):
+        self._siguiente_id[tabla] = self._siguiente_id.get(tabla, 0) + 1
+        return self._siguiente_id[tabla]
+
+
+class _Rpc:
+    # crear_evento, vaciar_evento y archivar_evento, como las funciones del README
+    def __init__(self, cliente, nombre, params):
+        self._cliente = cliente
+        self._nombre = nombre
+        self._evento = params.get('p_evento')
+
+    def execute(self):
+        cliente = self._cliente
+        evento = self._evento
+        cliente._esperar_red()
+        with cliente._lock:
+            cliente.peticiones += 1
+            tipo = ('rpc', self._nombre)
+            cliente.peticiones_por_tipo[tipo] = cliente.peticiones_por_tipo.get(tipo, 0) + 1
+            eventos = cliente.tablas.setdefault('eventos', [])
+            registro = next((f for f in eventos if f['evento'] == evento), None)
+            if self._nombre == 'crear_evento':
+                if registro is None:
+                    eventos.append({'evento': evento, 'archivado': False, 'creado': time.time()})
+            elif self._nombre == 'vaciar_evento':
+                for tabla in PARTICIONADAS + ('config',):
+                    filas = cliente.tablas.get(tabla, [])
+                    filas[:] = [f for f in filas if f.get('evento') != evento]
+            elif self._nombre == 'archivar_evento':
+                # Como DETACH PARTITION: las filas del evento salen a su propia tabla
+                for tabla in PARTICIONADAS:
+                    filas = cliente.tablas.get(tabla, [])
+                    cliente.tablas.setdefault(f'{tabla}_{evento.lower()}', []).extend(
+                        f for f in filas if f.get('evento') == evento)
+                    filas[:] = [f for f in filas if f.get('evento') != evento]
+                if registro is not None:
+                    registro['archivado'] = True
+            else:
+                raise Exception(f"Could not find the function public.{self._nombre}")
+        return Respuesta(None)
+
+
+class _Consulta:
+    def __init__(self, cliente, tabla):
+        self._cliente = cliente
+        self._tabla = tabla
+        self._operacion = 'select'
+        self._columnas = None
+        self._contar = False
+        self._filtros = []
+        self._orden = []
+        self._rango = None
+        self._limite = None
+        self._filas = None
+        self._on_conflict = None
+        self._ignorar_duplicados = False
+
+    # Lecturas
+    def select(self, columnas='*', count=None):
+        self._operacion = 'select'
+        if columnas != '*':
+            self._columnas = [c.strip() for c in columnas.split(',')]
+        self._contar = count == 'exact'
+        return self
+
+    def eq(self, columna, valor):
+        self._filtros.append(lambda fila: fila.get(columna) == valor)
+        return self
+
+    def neq(self, columna, valor):
+        self._filtros.append(lambda fila: fila.get(columna) != valor)
+        return self
+
+    def in_(self, columna, valores):
+        valores = set(valores)
+        self._filtros.append(lambda fila: fila.get(columna) in valores)
+        return self
+
+    def gt(self, columna, valor):
+        self._filtros.append(lambda fila: fila.get(columna) is not None and fila.get(columna) > valor)
+        return self
+
+    def order(self, columna, desc=False):
+        self._orden.append((columna, desc))
+        return self
+
+    def range(self, inicio, fin):
+        self._rango = (inicio, fin)
+        return self
+
+    def limit(self, n):
+        self._limite = n
+        return self
+
+    # Escrituras
+    def insert(self, filas):
+        self._operacion = 'insert'
+        self._filas = filas if isinstance(filas, list) else [filas]
+        return self
+
+    def upsert(self, filas, on_conflict=None, ignore_duplicates=False):
+        self._operacion = 'upsert'
+        self._filas = filas if isinstance(filas, list) else [filas]
+        self._on_conflict = on_conflict.split(',') if on_conflict else ['id']
+        self._ignorar_duplicados = ignore_duplicates
+        return self
+
+    def delete(self):
+        self._operacion = 'delete'
+        return self
+
+    def execute(self):
+        cliente = self._cliente
+        cambios = []
+        cliente._esperar_red()
+        with cliente._lock:
+            cliente.peticiones += 1
+            tipo = (self._tabla, self._operacion)
+            cliente.peticiones_por_tipo[tipo] = cliente.peticiones_por_tipo.get(tipo, 0) + 1
+            if self._tabla in VISTAS:
+                return self._ejecutar_select(self._agregar_vista())
+            tabla = cliente.tablas.setdefault(self._tabla, [])
+            if self._operacion == 'select':
+                return self._ejecutar_select(tabla)
+            if self._operacion == 'insert':
+                nuevas = []
+                for fila in self._filas:
+                    fila = dict(fila, id=fila.get('id') or cliente._nuevo_id(self._tabla))
+                    tabla.append(fila)
+                    nuevas.append(dict(fila))
+                    cambios.append((self._tabla, 'INSERT', dict(fila), None))
+                respuesta = Respuesta(nuevas)
+            elif self._operacion == 'upsert':
+                respuesta = self._ejecutar_upsert(tabla, cambios)
+            else:
+                borradas = [f for f in tabla if all(filtro(f) for filtro in self._filtros)]
+                tabla[:] = [f for f in tabla if not all(filtro(f) for filtro in self._filtros)]
+                # Como en Postgres sin REPLICA IDENTITY FULL, old_record solo trae el id
+                cambios.extend((self._tabla, 'DELETE', None, {'id': f['id']}) for f in borradas)
+                respuesta = Respuesta(borradas)
+        # Los avisos salen fuera del lock, como llegarían por Realtime
+        cliente._emitir(cambios)
+        return respuesta
+
+    def _agregar_vista(self):
+        tabla, grupo, columna = VISTAS[self._tabla]
+        totales = {}
+        for fila in self._cliente.tablas.get(tabla, []):
+            llave = tuple(fila.get(c) for c in grupo)
+            totales[llave] = totales.get(llave, 0) + (fila.get(columna) or 0)
+        return [dict(zip(grupo, llave), **{columna: total}) for llave, total in totales.items()]
+
+    def _ejecutar_select(self, tabla):
+        filas = [f for f in tabla if all(filtro(f) for filtro in self._filtros)]
+        for columna, desc in reversed(self._orden):
+            filas.sort(key=lambda f: f.get(columna), reverse=desc)
+        total = len(filas)
+        if self._rango:
+            filas = filas[self._rango[0]:self._rango[1] + 1]
+        if self._limite is not None:
+            filas = filas[:self._limite]
+        filas = filas[:self._cliente.max_filas]
+        if self._columnas:
+            filas = [{c: f.get(c) for c in self._columnas} for f in filas]
+        else:
+            filas = [dict(f) for f in filas]
+        return Respuesta(filas, total if self._contar else None)
+
+    def _ejecutar_upsert(self, tabla, cambios):
+        llaves = [tuple(f.get(c) for c in self._on_conflict) for f in self._filas]
+        if len(set(llaves)) != len(llaves):
+            raise Exception("ON CONFLICT DO UPDATE command cannot affect row a second time")
+        indice = {tuple(f.get(c) for c in self._on_conflict): f for f in tabla}
+        guardadas = []
+        for llave, fila in zip(llaves, self._filas):
+            existente = indice.get(llave)
+            if existente is not None and self._ignorar_duplicados:
+                # ON CONFLICT DO NOTHING: la fila existente no cambia ni se regresa
+                continue
+            if existente is not None:
+                existente.update(fila)
+                cambios.append((self._tabla, 'UPDATE', dict(existente), {'id': existente['id']}))
+            else:
+                existente = dict(fila, id=fila.get('id') or self._cliente._nuevo_id(self._tabla))
+                tabla.append(existente)
+                indice[llave] = existente
+                cambios.append((self._tabla, 'INSERT', dict(existente), None))
+            guardadas.append(dict(existente))
+        return Respuesta(guardadas)
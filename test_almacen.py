@@ -0,0 +1,104 @@
+import pandas as pd
+import pytest
+
+from almacen import SheetsStore, SQLiteStore, _ultima_por_llave
+
+ENCABEZADO = ['Tema', 'Equipo', 'Juez', 'Categoria', 'Criterio', 'Cumple', 'Puntos', 'Timestamp']
+
+
+class Hoja:
+    # Lo mínimo de un worksheet de gspread que usa SheetsStore; anota desde qué fila se lee
+    def __init__(self, filas):
+        self.filas = [ENCABEZADO] + [list(f) for f in filas]
+        self.lecturas = []
+
+    def append_rows(self, filas):
+        self.filas.extend(list(f) for f in filas)
+
+    def get(self, rango, value_render_option=None):
+        inicio = int(rango.split(':')[0][1:])
+        self.lecturas.append(inicio)
+        return [list(f) for f in self.filas[inicio - 1:]] or [[]]
+
+    def batch_update(self, cambios):
+        for cambio in cambios:
+            inicio = int(cambio['range'].split(':')[0][1:])
+            for i, valores in enumerate(cambio['values']):
+                self.filas[inicio - 1 + i] = list(valores)
+
+
+def fila(equipo, puntos, timestamp, criterio='x'):
+    return ['T1', equipo, 'J1', 'C', criterio, True, puntos, timestamp]
+
+
+def almacen_con(hoja):
+    return SheetsStore(lambda: (None, hoja), resync_cada=3600)
+
+
+def puntos(almacen):
+    df = almacen.consultar()
+    return dict(zip(df['equipo'], df['puntos']))
+
+
+def test_lectura_por_cola_deduplica_lo_sobrescrito():
+    hoja = Hoja([fila('A', 5.0, '2024-05-01 10:00:00'), fila('B', 3.0, '2024-05-01 10:00:01')])
+    almacen = almacen_con(hoja)
+    assert puntos(almacen) == {'A': 5.0, 'B': 3.0}
+
+    # Un juez vuelve a guardar A: solo se piden las filas desde la última consumida
+    hoja.append_rows([fila('A', 8.0, '2024-05-01 10:05:00')])
+    assert puntos(almacen) == {'A': 8.0, 'B': 3.0}
+    assert hoja.lecturas == [2, 3]
+
+
+def test_lectura_por_cola_relee_si_la_ultima_fila_cambio():
+    hoja = Hoja([fila('A', 5.0, '2024-05-01 10:00:00'), fila('B', 3.0, '2024-05-01 10:00:01')])
+    almacen = almacen_con(hoja)
+    puntos(almacen)
+
+    # Edición a mano de la última fila consumida: la comprobación falla y se relee completa
+    hoja.filas[2] = fila('B', 4.0, '2024-05-01 10:00:01')
+    assert puntos(almacen) == {'A': 5.0, 'B': 4.0}
+    assert hoja.lecturas == [2, 3, 2]
+
+
+def test_despues_de_compactar_la_cola_sigue_en_la_fila_correcta():
+    hoja = Hoja([
+        fila('A', 1.0, '2024-05-01 10:00:00'),
+        fila('A', 2.0, '2024-05-01 10:01:00'),
+        fila('B', 3.0, '2024-05-01 10:02:00'),
+        fila('A', 4.0, '2024-05-01 10:03:00'),
+    ])
+    almacen = almacen_con(hoja)
+    assert almacen.compactar() == 2
+    assert [f[:7] for f in hoja.filas[1:3]] == [fila('B', 3.0, '')[:7], fila('A', 4.0, '')[:7]]
+    assert hoja.filas[3:] == [[''] * 8] * 2
+
+    # La siguiente guardada cae después del rango compactado; la cola parte de la
+    # última fila vigente (la 3) y salta las vacías sin releer toda la hoja
+    hoja.append_rows([fila('B', 9.0, '2024-05-01 10:04:00')])
+    assert puntos(almacen) == {'A': 4.0, 'B': 9.0}
+    assert hoja.lecturas == [2, 3]
+
+
+def test_gana_el_timestamp_mas_reciente_aunque_cambie_el_formato():
+    # La fila nueva quedó arriba y con microsegundos; la vieja, abajo y en ISO con 'T'.
+    # Comparando texto ganaría la vieja ('T' > ' '), y por posición también
+    df = pd.DataFrame([
+        {'tema': 'T1', 'equipo': 'A', 'juez': 'J1', 'categoria': 'C', 'criterio': 'x',
+         'puntos': 8.0, 'timestamp': '2024-05-01 10:00:00.250000'},
+        {'tema': 'T1', 'equipo': 'A', 'juez': 'J1', 'categoria': 'C', 'criterio': 'x',
+         'puntos': 5.0, 'timestamp': '2024-05-01T09:59:59'},
+    ])
+    vigentes = _ultima_por_llave(df)
+    assert vigentes['puntos'].tolist() == [8.0]
+    assert vigentes.index.tolist() == [0]
+
+
+def test_evento_que_solo_cambia_mayusculas_se_rechaza(tmp_path):
+    # En SQLite puntajes_Final y puntajes_final son la misma tabla
+    ruta = str(tmp_path / 'puntajes.db')
+    SQLiteStore(ruta, evento='Final').guardar_config(['Juez 1'], {'T1': ['Equipo 1']})
+    with pytest.raises(ValueError, match='choca'):
+        SQLiteStore(ruta, evento='final')
+    assert SQLiteStore(ruta, evento='Final').eventos() == [{'evento': 'Final', 'archivado': False}]
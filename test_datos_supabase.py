@@ -0,0 +1,33 @@
+import pytest
+
+from datos_supabase import consultar_calificaciones
+from supabase_local import ClienteLocal
+
+N_FILAS = 3125
+
+
+def cliente_con_filas(max_filas, n=N_FILAS):
+    cliente = ClienteLocal(max_filas=max_filas)
+    cliente.table('calificaciones').insert([
+        {'tema': f'T{i % 4}', 'equipo': f'Equipo {i % 25}', 'juez': f'Juez {i % 5}',
+         'categoria': 'C', 'criterio': f'c{i}', 'cumple': True, 'puntos': 1.0}
+        for i in range(n)
+    ]).execute()
+    return cliente
+
+
+@pytest.mark.parametrize('max_filas', [1000, 300])
+def test_trae_cada_fila_una_sola_vez(max_filas):
+    # Con max-rows menor que la página pedida, las páginas se ajustan al límite del servidor
+    cliente = cliente_con_filas(max_filas)
+    filas = consultar_calificaciones(cliente, tamano_pagina=1000)
+    ids = [f['id'] for f in filas]
+    assert len(ids) == N_FILAS
+    assert len(set(ids)) == N_FILAS
+
+
+def test_paginas_con_filtro():
+    cliente = cliente_con_filas(300)
+    filas = consultar_calificaciones(cliente, tema='T1', columnas=('id', 'tema'))
+    assert sorted(f['id'] for f in filas) == [i + 1 for i in range(N_FILAS) if i % 4 == 1]
+    assert {f['tema'] for f in filas} == {'T1'}
@@ -0,0 +1,74 @@
+import pytest
+
+from almacen import SupabaseStore
+from diario import DiarioEscrituras
+from rubrica import TEMAS, CRITERIOS
+from supabase_local import ClienteLocal
+
+CATEGORIA, CRITERIOS_CATEGORIA = next(iter(CRITERIOS.items()))
+
+
+def envio(equipo, juez, puntos=5.0):
+    return [{'tema': TEMAS[0], 'equipo': equipo, 'juez': juez, 'categoria': CATEGORIA,
+             'criterio': CRITERIOS_CATEGORIA[0], 'cumple': True, 'puntos': puntos}]
+
+
+@pytest.fixture
+def almacen():
+    almacen = SupabaseStore(ClienteLocal(), compacto=True)
+    almacen.guardar_config(['Juez 1', 'Juez 2'], {TEMAS[0]: ['Equipo 1']})
+    return almacen
+
+
+def test_envio_invalido_no_detiene_a_los_demas(tmp_path, almacen):
+    diario = DiarioEscrituras(str(tmp_path / 'diario.db'))
+    diario.anotar(envio('Equipo 1', 'Juez 1', 3.0))
+    diario.anotar(envio('Equipo X', 'Juez 2'))   # equipo no registrado en el catálogo
+    diario.anotar(envio('Equipo 1', 'Juez 1', 7.0))
+
+    filas = diario.vaciar(almacen)
+
+    assert [f['puntos'] for f in filas] == [3.0, 7.0]
+    assert diario.pendientes() == {}
+    n, error = diario.rechazados()['Juez 2']
+    assert n == 1 and 'no registrado' in error
+    guardadas = almacen.consultar()
+    assert guardadas['puntos'].tolist() == [7.0]
+
+
+class AlmacenSinRed:
+    def guardar_lote(self, calificaciones):
+        return {'ok': False, 'guardadas': 0, 'errores': [{'fila': 0, 'criterio': 'x', 'error': 'timeout'}],
+                'latencia_ms': 0.0, 'reintentar': True}
+
+
+def test_error_de_red_deja_los_envios_para_reintentar(tmp_path):
+    diario = DiarioEscrituras(str(tmp_path / 'diario.db'))
+    diario.anotar(envio('Equipo 1', 'Juez 1'))
+    with pytest.raises(RuntimeError):
+        diario.vaciar(AlmacenSinRed())
+    assert diario.pendientes() == {'Juez 1': 1}
+    assert diario.rechazados() == {}
+
+
+def test_un_solo_proceso_sube_a_la_vez(tmp_path, almacen):
+    # Dos workers con el mismo archivo: mientras uno tiene su lote tomado el otro no sube
+    ruta = str(tmp_path / 'diario.db')
+    uno, otro = DiarioEscrituras(ruta), DiarioEscrituras(ruta)
+    uno.anotar(envio('Equipo 1', 'Juez 1', 3.0))
+    uno.anotar(envio('Equipo 1', 'Juez 1', 7.0))
+    assert [id_envio for id_envio, _ in uno._tomar()] == [1, 2]
+
+    assert otro.vaciar(almacen) is None
+    assert [f['puntos'] for f in uno.vaciar(almacen)] == [7.0]
+    assert otro.vaciar(almacen) == []
+    assert almacen.consultar()['puntos'].tolist() == [7.0]
+
+
+def test_error_de_red_suelta_el_lote(tmp_path, almacen):
+    ruta = str(tmp_path / 'diario.db')
+    uno, otro = DiarioEscrituras(ruta), DiarioEscrituras(ruta)
+    uno.anotar(envio('Equipo 1', 'Juez 1'))
+    with pytest.raises(RuntimeError):
+        uno.vaciar(AlmacenSinRed())
+    assert [f['puntos'] for f in otro.vaciar(almacen)] == [5.0]
@@ -0,0 +1,30 @@
+import pandas as pd
+
+from esquema import Catalogo, codificar, decodificar
+from rubrica import TEMAS, CRITERIOS
+
+CATEGORIA, CRITERIOS_CATEGORIA = next(iter(CRITERIOS.items()))
+
+
+def fila(criterio, puntos, cumple=True):
+    return {'tema': TEMAS[0], 'equipo': 'Equipo 1', 'juez': 'Juez 1', 'categoria': CATEGORIA,
+            'criterio': criterio, 'cumple': cumple, 'puntos': puntos}
+
+
+def catalogo():
+    return Catalogo([('equipo', 1, 'Equipo 1'), ('juez', 1, 'Juez 1')])
+
+
+def test_codificar_y_decodificar_regresan_lo_mismo():
+    filas = [fila(CRITERIOS_CATEGORIA[0], 7.5), fila(CRITERIOS_CATEGORIA[1], 0.0, cumple=False),
+             fila(CRITERIOS_CATEGORIA[2], 10.0)]
+    compactas, errores = codificar(filas, catalogo())
+    assert errores == []
+    df = decodificar(pd.DataFrame(compactas), catalogo())
+    assert df.astype({c: str for c in ('tema', 'equipo', 'juez', 'categoria', 'criterio')}).to_dict('records') == filas
+
+
+def test_puntos_fuera_del_paso_de_medio_se_rechazan():
+    compactas, errores = codificar([fila(CRITERIOS_CATEGORIA[0], 7.3)], catalogo())
+    assert compactas == []
+    assert errores == [{'fila': 0, 'criterio': CRITERIOS_CATEGORIA[0], 'error': "Puntos deben ir en pasos de 0.5: 7.3"}]
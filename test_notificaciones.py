@@ -0,0 +1,36 @@
+from notificaciones import Notificador, escuchar_local
+from supabase_local import ClienteLocal
+
+
+def fila(tema, equipo='Equipo 1'):
+    return {'tema': tema, 'equipo': equipo, 'juez': 'Juez 1', 'categoria': 'C', 'criterio': 'x',
+            'cumple': True, 'puntos': 5.0}
+
+
+def test_cambio_solo_sube_la_version_de_su_tema():
+    cliente = ClienteLocal()
+    notificador = Notificador()
+    escuchar_local(notificador, cliente)
+
+    cliente.table('calificaciones').insert([fila('T1')]).execute()
+    assert (notificador.version('T1'), notificador.version('T2'), notificador.version()) == (1, 0, 1)
+
+    # Un DELETE no trae el tema: cuenta para todos
+    cliente.table('calificaciones').delete().eq('tema', 'T1').execute()
+    assert (notificador.version('T1'), notificador.version('T2'), notificador.version()) == (2, 1, 2)
+
+
+def test_tipo_de_cambio_llega_como_texto():
+    # El cliente local, como Realtime, manda el tipo como enum; los oyentes reciben 'INSERT', 'DELETE'...
+    cliente = ClienteLocal()
+    notificador = Notificador()
+    recibidos = []
+    notificador.suscribir(lambda evento, registro, anterior: recibidos.append(evento))
+    escuchar_local(notificador, cliente)
+
+    cliente.table('calificaciones').upsert([fila('T1')], on_conflict='tema,equipo,juez,categoria,criterio').execute()
+    cliente.table('calificaciones').upsert([dict(fila('T1'), puntos=6.0)],
+                                           on_conflict='tema,equipo,juez,categoria,criterio').execute()
+    cliente.table('calificaciones').delete().eq('tema', 'T1').execute()
+    assert recibidos == ['INSERT', 'UPDATE', 'DELETE']
+    assert all(type(evento) is str for evento in recibidos)
@@ -0,0 +1,31 @@
+from ranking import MotorRanking
+
+
+def fila(equipo, juez, puntos, tema='T1'):
+    return {'tema': tema, 'equipo': equipo, 'juez': juez, 'categoria': 'C', 'criterio': 'x', 'puntos': puntos}
+
+
+def promedios(motor, tema='T1'):
+    df = motor.ranking(tema)
+    return dict(zip(df['equipo'], df['Promedio']))
+
+
+def test_refrescar_conserva_lo_guardado_durante_la_lectura():
+    motor = MotorRanking()
+    motor.reconstruir([fila('A', 'J1', 5.0)])
+
+    def cargar_filas():
+        # Un juez guarda mientras la lectura por páginas ya empezó: la foto no trae
+        # la fila nueva de B y todavía tiene el valor viejo de A
+        motor.aplicar([fila('B', 'J1', 7.0), fila('A', 'J1', 9.0)])
+        return [fila('A', 'J1', 5.0)]
+
+    motor.refrescar(cargar_filas, ttl=0)
+    assert promedios(motor) == {'A': 9.0, 'B': 7.0}
+
+
+def test_refrescar_quita_lo_que_ya_no_esta_en_la_tabla():
+    motor = MotorRanking()
+    motor.reconstruir([fila('A', 'J1', 5.0), fila('B', 'J1', 3.0)])
+    motor.refrescar(lambda: [fila('A', 'J1', 6.0)], ttl=0)
+    assert promedios(motor) == {'A': 6.0}